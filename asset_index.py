@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Indice persistente dei file del progetto, condiviso dagli script di rilascio.
+
+L'albero viene visitato una sola volta con os.scandir; per ogni cartella si
+salvano su disco il suo mtime e, per ogni file, dimensione e mtime. Alle
+esecuzioni successive vengono rilette solo le cartelle il cui mtime è
+cambiato (aggiunta, rimozione o rinomina di file); le altre vengono prese
+dalla cache.
+
+Uso:
+  python3 asset_index.py [--root DIR] [--cache FILE] [--rebuild]
+"""
+
+import os
+import json
+import time
+import argparse
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+CACHE_DIR = PROJECT_ROOT / '.cache'
+DEFAULT_CACHE = CACHE_DIR / 'asset_index.json'
+CACHE_VERSION = 2
+
+# Cartella delle immagini derivate (miniature/WebP, vedi generate_thumbnails.py):
+# sono prodotti del rilascio, non sorgenti, e non vanno contate come immagini.
+DERIVED_DIR = 'thumbs'
+
+# Cartelle mai indicizzate (metadati, cache, ambienti locali e derivate)
+SKIP_DIRS = {'.git', '.cache', '__pycache__', '.pytest_cache', '.mypy_cache', '.ruff_cache', '.venv', 'venv', DERIVED_DIR}
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".bmp", ".tiff", ".tif"}
+
+# Una cartella modificata in questo intervallo prima della scansione potrebbe
+# cambiare ancora senza che il suo mtime si sposti: non la si mette in cache.
+RACY_WINDOW_NS = 2_000_000_000
+
+
+def _scan_dir(abs_path):
+    files = {}
+    subdirs = []
+    with os.scandir(abs_path) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in SKIP_DIRS:
+                    subdirs.append(entry.name)
+            elif entry.is_file():
+                st = entry.stat()
+                files[entry.name] = [st.st_size, st.st_mtime_ns]
+    return {'files': files, 'dirs': sorted(subdirs)}
+
+
+def _load_cache(root, cache_path):
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if cached.get('version') != CACHE_VERSION or cached.get('root') != str(root):
+        return {}
+    return cached.get('dirs', {})
+
+
+def _save_cache(index, cache_path):
+    cache_path = Path(cache_path)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cache_path.with_name(f'{cache_path.name}.{os.getpid()}.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp, cache_path)
+
+
+def build_asset_index(root=PROJECT_ROOT, cache_path=DEFAULT_CACHE, rebuild=False, previous=None):
+    """Ritorna l'indice dei file sotto `root`, aggiornando la cache su disco.
+
+    L'indice è un dict con chiave 'dirs': path relativo (Posix, '' per la
+    radice) -> {'mtime': int, 'files': {nome: [size, mtime]}, 'dirs': [nomi]}.
+    Con cache_path=None non legge né scrive alcuna cache. `previous` (un
+    indice già in memoria) sostituisce la cache su disco come base: le
+    cartelle non cambiate sono riprese con lo stesso oggetto.
+    """
+    root = Path(root).resolve()
+    if previous is not None and not rebuild:
+        old = previous['dirs'] if previous.get('root') == str(root) else {}
+    else:
+        old = {} if (rebuild or cache_path is None) else _load_cache(root, cache_path)
+    now = time.time_ns()
+    dirs = {}
+    rescanned = 0
+    stack = ['']
+    while stack:
+        rel = stack.pop()
+        abs_path = os.path.join(root, rel)
+        try:
+            mtime = os.stat(abs_path).st_mtime_ns
+        except OSError:
+            continue
+        cached = old.get(rel)
+        if cached is not None and cached.get('mtime') == mtime:
+            entry = cached
+        else:
+            try:
+                entry = _scan_dir(abs_path)
+            except OSError:
+                continue
+            entry['mtime'] = mtime if now - mtime > RACY_WINDOW_NS else None
+            rescanned += 1
+        dirs[rel] = entry
+        stack.extend(f'{rel}/{d}' if rel else d for d in entry['dirs'])
+
+    index = {'version': CACHE_VERSION, 'root': str(root), 'dirs': dirs, 'rescanned': rescanned}
+    if cache_path is not None and (rescanned or dirs.keys() != old.keys()):
+        _save_cache({k: v for k, v in index.items() if k != 'rescanned'}, cache_path)
+    return index
+
+
+def iter_files(index, suffixes=None):
+    """Genera i path relativi (Posix) dei file indicizzati, in ordine stabile.
+    `suffixes` (opzionale) filtra per estensione, confrontata in minuscolo.
+    """
+    for rel in sorted(index['dirs']):
+        prefix = f'{rel}/' if rel else ''
+        for name in sorted(index['dirs'][rel]['files']):
+            if suffixes is not None and os.path.splitext(name)[1].lower() not in suffixes:
+                continue
+            yield prefix + name
+
+
+def list_dir(index, rel):
+    """Nomi dei file contenuti direttamente nella cartella `rel` (vuoto se assente)."""
+    key = Path(rel).as_posix().strip('/')
+    entry = index['dirs'].get('' if key == '.' else key)
+    return list(entry['files']) if entry else []
+
+
+def file_set(index, dirs):
+    """Path relativi (Posix) dei file contenuti direttamente nelle cartelle
+    `dirs`, come set: l'esistenza di molti riferimenti si controlla con una
+    ricerca nel set invece che con una chiamata al filesystem ciascuno."""
+    out = set()
+    for rel in dirs:
+        key = Path(rel).as_posix().strip('/')
+        out.update(f'{key}/{name}' for name in list_dir(index, key))
+    return out
+
+
+def relative_to_root(index, path):
+    """Converte un path (assoluto o relativo alla cwd) in path relativo alla
+    radice dell'indice; ritorna None se è fuori dall'albero indicizzato.
+    """
+    rel = os.path.relpath(os.path.abspath(path), index['root'])
+    if rel == os.curdir:
+        return ''
+    if rel.startswith(os.pardir):
+        return None
+    return Path(rel).as_posix()
+
+
+def main():
+    p = argparse.ArgumentParser(description="Aggiorna l'indice dei file del progetto")
+    p.add_argument('--root', default=str(PROJECT_ROOT), help='Radice da indicizzare (default: cartella del progetto)')
+    p.add_argument('--cache', default=str(DEFAULT_CACHE), help='File di cache (default: .cache/asset_index.json)')
+    p.add_argument('--rebuild', action='store_true', help='Ignora la cache e rilegge tutte le cartelle')
+    args = p.parse_args()
+
+    t0 = time.perf_counter()
+    index = build_asset_index(args.root, args.cache, rebuild=args.rebuild)
+    elapsed = (time.perf_counter() - t0) * 1000
+    n_files = sum(len(d['files']) for d in index['dirs'].values())
+    print(f"✓ Indice: {len(index['dirs'])} cartelle, {n_files} file "
+          f"({index['rescanned']} cartelle rilette) in {elapsed:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Benchmark ripetibili degli script di rilascio su un catalogo sintetico
+(vedi synthetic_catalog.py).
+
+Per ogni funzione misura il tempo (migliore di --repeat esecuzioni) e il picco
+di memoria allocata (tracemalloc, in un'esecuzione separata per non falsare i
+tempi). I risultati si confrontano con un riferimento salvato in
+.cache/benchmarks/baseline.json, per numero di record: se tempo o memoria
+superano il riferimento di oltre --threshold lo script termina con codice 1.
+Il riferimento dipende dalla macchina e non va committato.
+
+Uso:
+  python3 benchmarks/run_benchmarks.py [--records 10k] [--repeat 3] [--threshold 0.25]
+                                       [--only NOME ...] [--save-baseline] [--json FILE]
+"""
+
+import gc
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+from pathlib import Path
+from contextlib import redirect_stdout
+from io import StringIO
+
+BENCH_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = BENCH_DIR.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(PROJECT_ROOT / 'static' / 'statistics'))
+sys.path.insert(0, str(BENCH_DIR))
+import catalog_stream  # noqa: E402
+import check_missing_images  # noqa: E402
+import duplicate_images  # noqa: E402
+import facet_bitsets  # noqa: E402
+import generate_destinazioni  # noqa: E402
+import search_index  # noqa: E402
+from asset_index import build_asset_index  # noqa: E402
+from site_stats import build_image_index, compute_section_stats  # noqa: E402
+from synthetic_catalog import DEFAULT_OUT, generate, parse_count  # noqa: E402
+
+BASELINE_FILE = DEFAULT_OUT / 'baseline.json'
+
+# Sotto questa durata le differenze sono rumore e non contano come regressione
+MIN_TIME_S = 0.005
+
+
+def _check_missing(root):
+    argv = sys.argv
+    sys.argv = ['check_missing_images.py', '--json', str(root / 'regno' / 'targhetteRegno.json'),
+                '--img-dir', str(root / 'regno' / 'jpg'), '--try-exts',
+                '--out', str(root / 'missing_images.csv')]
+    try:
+        check_missing_images.main()
+    finally:
+        sys.argv = argv
+
+
+def _destinazioni(names):
+    for name in names:
+        paese, citta = generate_destinazioni.parse_filename(name)
+        generate_destinazioni.get_coordinate(paese, citta)
+
+
+def _duplicate_entries(n, seed=1):
+    """Hash casuali per group_duplicates (le immagini sintetiche sono file vuoti):
+    ogni 50 immagini una copia identica e una quasi uguale (pochi bit diversi)."""
+    rng = random.Random(seed)
+    bits = duplicate_images.HASH_BITS
+    entries = {}
+    for i in range(n):
+        dh, sha = rng.getrandbits(bits), f'{i:064x}'
+        if i % 50 == 1:
+            dh, sha = prev_dh, prev_sha
+        elif i % 50 == 2:
+            dh = prev_dh ^ (rng.getrandbits(bits) & rng.getrandbits(bits) & rng.getrandbits(bits) & rng.getrandbits(bits))
+        entries[f'img/{i}.jpeg'] = {'bytes': 1, 'sha256': sha, 'dhash': f'{dh:0{bits // 4}x}'}
+        prev_dh, prev_sha = dh, sha
+    return entries
+
+
+def _clusters(names):
+    destinazioni = []
+    for name in names:
+        coords = generate_destinazioni.get_coordinate(*generate_destinazioni.parse_filename(name))
+        if coords:
+            destinazioni.append({'coords': list(coords)})
+    return lambda: generate_destinazioni.build_clusters(destinazioni)
+
+
+def cases(root):
+    """(nome, funzione senza argomenti) nell'ordine di esecuzione."""
+    asset_index = build_asset_index(root, cache_path=None)
+    image_index = build_image_index(root, asset_index=asset_index)
+    dup_entries = _duplicate_entries(2000)
+    dest_names = sorted(p.name for p in (root / 'static' / 'jpeg' / 'destinazioni').iterdir())
+    with open(root / 'regno' / 'targhetteRegno.json', 'r', encoding='utf-8') as f:
+        regno = json.load(f)
+    return [
+        ('build_asset_index', lambda: build_asset_index(root, cache_path=None)),
+        ('build_image_index', lambda: build_image_index(root, asset_index=asset_index)),
+        ('compute_section_stats[Regno]',
+         lambda: compute_section_stats(root, 'regno', 'targhetteRegno.json', image_index=image_index)),
+        ('compute_section_stats[Trieste A]',
+         lambda: compute_section_stats(root, 'triestea', 'targhetteTriesteA.json', image_index=image_index)),
+        ('compute_section_stats[Libia]',
+         lambda: compute_section_stats(root, 'colonie/libia', 'targhetteLibia.json', image_index=image_index)),
+        ('check_missing_images.main', lambda: _check_missing(root)),
+        ('catalog_stream.iter_records[Regno]',
+         lambda: sum(1 for _ in catalog_stream.iter_records(root / 'regno' / 'targhetteRegno.json'))),
+        ('search_index.build_index[Regno]', lambda: search_index.build_index(regno)),
+        ('facet_bitsets.encode[Regno]', lambda: facet_bitsets.encode(regno)),
+        ('generate_destinazioni.parse_filename+get_coordinate', lambda: _destinazioni(dest_names)),
+        ('generate_destinazioni.build_clusters', _clusters(dest_names)),
+        ('duplicate_images.group_duplicates[2k]',
+         lambda: duplicate_images.group_duplicates(dup_entries, duplicate_images.DEFAULT_THRESHOLD)),
+    ]
+
+
+def measure(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        with redirect_stdout(StringIO()):
+            fn()
+        best = min(best, time.perf_counter() - t0)
+    gc.collect()
+    tracemalloc.start()
+    with redirect_stdout(StringIO()):
+        fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'time': best, 'peak': peak}
+
+
+def regressions(result, base, threshold):
+    """Elenco delle metriche peggiorate oltre la soglia rispetto al riferimento."""
+    out = []
+    if base is None:
+        return out
+    if result['time'] > MIN_TIME_S and result['time'] > base['time'] * (1 + threshold):
+        out.append('tempo')
+    if result['peak'] > base['peak'] * (1 + threshold):
+        out.append('memoria')
+    return out
+
+
+def load_baselines():
+    try:
+        with open(BASELINE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def main():
+    p = argparse.ArgumentParser(description='Benchmark degli script di rilascio su un catalogo sintetico')
+    p.add_argument('--records', default='10k', help='Dimensione del catalogo (es. 10k, 100k, 1M; default: 10k)')
+    p.add_argument('--seed', type=int, default=1, help='Seme del catalogo sintetico (default: 1)')
+    p.add_argument('--repeat', type=int, default=3, help='Esecuzioni per misura del tempo (default: 3)')
+    p.add_argument('--threshold', type=float, default=0.25,
+                   help='Peggioramento massimo tollerato rispetto al riferimento (default: 0.25 = 25%%)')
+    p.add_argument('--only', nargs='+', metavar='NOME', help='Esegue solo i benchmark il cui nome contiene NOME')
+    p.add_argument('--save-baseline', action='store_true', help='Salva i risultati come nuovo riferimento')
+    p.add_argument('--json', help='Scrive i risultati anche in questo file JSON')
+    args = p.parse_args()
+
+    n = parse_count(args.records)
+    t0 = time.perf_counter()
+    root = generate(DEFAULT_OUT / f'data-{n}-{args.seed}', n, seed=args.seed)
+    print(f"ℹ Catalogo sintetico: {n} record in {root} ({time.perf_counter() - t0:.1f} s)")
+
+    key = f'{n}-{args.seed}'
+    baselines = load_baselines()
+    baseline = baselines.get(key, {})
+    results = {}
+    failed = []
+    print(f"{'benchmark':<54}{'tempo ms':>12}{'picco MB':>12}  confronto")
+    for name, fn in cases(root):
+        if args.only and not any(o in name for o in args.only):
+            continue
+        res = results[name] = measure(fn, max(1, args.repeat))
+        base = baseline.get(name)
+        worse = regressions(res, base, args.threshold)
+        if base is None:
+            note = 'nessun riferimento'
+        else:
+            note = f"{res['time'] / base['time'] - 1:+.0%} tempo, {res['peak'] / max(base['peak'], 1) - 1:+.0%} memoria"
+        if worse:
+            failed.append(name)
+            note += f"  ✗ regressione ({', '.join(worse)})"
+        print(f"{name:<54}{res['time'] * 1000:12.1f}{res['peak'] / 2**20:12.2f}  {note}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'records': n, 'seed': args.seed, 'results': results}, f, indent=2)
+    if args.save_baseline:
+        baselines[key] = {**baseline, **results}
+        BASELINE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(baselines, f, indent=2)
+        print(f"✓ Riferimento salvato in {BASELINE_FILE}")
+        return 0
+    if failed:
+        print(f"✗ {len(failed)} benchmark oltre la soglia del {args.threshold:.0%}")
+        return 1
+    print("✓ Nessuna regressione")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Genera un catalogo sintetico per i benchmark: JSON delle sezioni e alberi di
+immagini prev_* (file vuoti) con la stessa struttura del sito.
+
+  <out>/regno/targhetteRegno.json            + regno/jpg/prev_<uff>[_<extra>].jpeg
+  <out>/triestea/targhetteTriesteA.json      + triestea/img/prev_trieste_<uff>[_<extra>].jpeg
+  <out>/colonie/libia/targhetteLibia.json    + colonie/libia/img/prev_tripoli_|prev_libia_<uff>.jpeg
+  <out>/static/jpeg/destinazioni/<Paese>_<Città>.jpeg
+
+Le proporzioni ricalcano il catalogo reale: extra (A, R, B, ...) con la stessa
+frequenza, una quota di immagini mancanti, qualche scansione .jpg al posto di
+.jpeg, varianti Trieste con solo il suffisso (prev_trieste_2_A senza
+prev_trieste_2), Libia con entrambi i prefissi e immagini non referenziate.
+A parità di parametri l'output è identico; se la cartella contiene già un
+catalogo generato con gli stessi parametri non viene rigenerata.
+
+Uso:
+  python3 benchmarks/synthetic_catalog.py --records 100k [--out DIR] [--seed N] [--missing 0.4]
+"""
+
+import os
+import sys
+import json
+import shutil
+import random
+import argparse
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+from asset_index import CACHE_DIR  # noqa: E402
+from generate_destinazioni import COORDINATE_DB  # noqa: E402
+
+DEFAULT_OUT = CACHE_DIR / 'benchmarks'
+MARKER = '.synthetic.json'
+
+LOCALITA = ['Roma', 'Milano', 'Napoli', 'Torino', 'Genova', 'Palermo', 'Firenze', 'Bologna', 'Venezia',
+            'Bari', 'Verona', 'Trieste', 'Brescia', 'Catania', 'Messina', 'Padova', 'Ancona', 'Livorno',
+            'Modena', 'Parma', 'Cagliari', 'Bergamo', 'Foggia', 'Caserta', 'Novara', 'Cuneo', 'Pavia',
+            'La Spezia', 'Monza', 'Alessandria', 'Città di Castello', 'Forlì']
+UFFICI = ['Ferrovia', 'Centro', 'Ferr. Ordinarie', 'Corrispondenze', 'Arrivi', 'Partenze', 'Succ. 1',
+          'Succ. 2', 'Raccomandate', 'Corrisp. Pacchi', 'Stampe', 'Espressi']
+DESCRIZIONI = ['Bandiera VEIII', 'Pregate i vostri corrispondenti', 'Votate la lista nazionale', 'Mata hari',
+               'Montecatini - stomaco fegato intestino', 'Usate i pacchi postali urgenti',
+               'Preferite le sigarette Eja Savoia Eva', 'Salsomaggiore - Le piu belle terme del Mondo']
+# frequenze degli extra nel catalogo del Regno
+EXTRA_WEIGHTS = [('', 3727), ('A', 313), ('R', 56), ('B', 51), ('C', 10), ('AR', 2), ('CR', 1), ('D', 1)]
+
+SECTION_SHARE = 0.01   # quota di record per Trieste A e per Libia
+
+
+def parse_count(text):
+    """'10k' -> 10000, '1M' -> 1000000, '2500' -> 2500."""
+    text = str(text).strip().lower()
+    mult = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if mult > 1 else text) * mult)
+
+
+def _record(rng, tipo, uff, extra, anno, localita, ufficio):
+    return {
+        'Targhetta Tipo': tipo,
+        'Targhetta Ufficio': uff,
+        'extra': extra,
+        'Descrizione': rng.choice(DESCRIZIONI),
+        'linkTarghetta': '',
+        'Anno': anno,
+        'Località': localita,
+        'Denominazione ufficio': ufficio,
+        'Denominazione ufficio breve': '',
+        'Datario': '',
+        'linkDatario': '',
+    }
+
+
+def generate_sections(n_records, seed=1, missing=0.4):
+    """Ritorna {cartella: (json, record, sottocartella immagini, [nomi])}, senza scrivere nulla."""
+    rng = random.Random(seed)
+    extras, weights = zip(*EXTRA_WEIGHTS)
+    n_small = max(20, int(n_records * SECTION_SHARE))
+    n_regno = max(0, n_records - 2 * n_small)
+
+    regno, regno_img = [], []
+    for i in range(n_regno):
+        # qualche ufficio ripetuto con un altro extra (o duplicato, come nel catalogo reale)
+        uff = regno[-1]['Targhetta Ufficio'] if regno and rng.random() < 0.1 else i + 1
+        extra = rng.choices(extras, weights)[0]
+        rec = _record(rng, uff // 8 + 1, uff, extra, rng.randint(1901, 1943),
+                      rng.choice(LOCALITA), rng.choice(UFFICI))
+        regno.append(rec)
+        if rng.random() >= missing:
+            ext = '.jpg' if rng.random() < 0.02 else '.jpeg'
+            regno_img.append(f"prev_{uff}{'_' + extra if extra else ''}{ext}")
+    # scansioni senza record
+    regno_img += [f'prev_{n_regno + k + 1}_X.jpeg' for k in range(max(1, n_regno // 100))]
+
+    trieste, trieste_img = [], []
+    for uff in range(1, n_small + 1):
+        trieste.append(_record(rng, uff // 3 + 1, uff, '', rng.randint(1947, 1954), 'Trieste', 'Corrisp. Pacchi'))
+        r = rng.random()
+        if r < missing:
+            continue
+        if r < missing + 0.1:
+            # solo varianti con suffisso: richiede il confronto per prefisso
+            trieste_img += [f'prev_trieste_{uff}_{s}.jpeg' for s in ('A', 'B')]
+        else:
+            trieste_img.append(f'prev_trieste_{uff}.jpeg')
+
+    libia, libia_img = [], []
+    for uff in range(1, n_small + 1):
+        libia.append(_record(rng, uff // 4 + 1, uff, '', rng.randint(1927, 1940), 'Tripoli', 'Corrispondenze'))
+        if rng.random() >= missing:
+            prefix = 'prev_libia_' if rng.random() < 0.2 else 'prev_tripoli_'
+            libia_img.append(f'{prefix}{uff}.jpeg')
+
+    return {
+        'regno': ('targhetteRegno.json', regno, 'jpg', sorted(set(regno_img))),
+        'triestea': ('targhetteTriesteA.json', trieste, 'img', sorted(set(trieste_img))),
+        'colonie/libia': ('targhetteLibia.json', libia, 'img', sorted(set(libia_img))),
+    }
+
+
+def destination_names(n, seed=1):
+    """Nomi di file nello stile di static/jpeg/destinazioni, anche senza coordinate."""
+    rng = random.Random(seed)
+    known = sorted(COORDINATE_DB)
+    names = set()
+    while len(names) < n:
+        paese = rng.choice(known + ['Atlantide', 'Lilliput'])
+        r = rng.random()
+        if r < 0.4:
+            stem = paese
+        elif r < 0.8:
+            stem = f'{paese}_{rng.choice(known)}'
+        else:
+            stem = f'{rng.randint(1920, 1940)}_{paese}_{rng.choice(known)}{rng.randint(1, 9)}'
+        names.add(f'{stem}_{len(names)}.jpeg' if f'{stem}.jpeg' in names else f'{stem}.jpeg')
+    return sorted(names)
+
+
+def generate(out_dir, n_records, seed=1, missing=0.4, force=False):
+    """Scrive il catalogo sintetico in `out_dir` e ritorna il path."""
+    out_dir = Path(out_dir)
+    params = {'records': n_records, 'seed': seed, 'missing': missing}
+    marker = out_dir / MARKER
+    if not force and marker.exists():
+        try:
+            if json.loads(marker.read_text(encoding='utf-8')) == params:
+                return out_dir
+        except ValueError:
+            pass
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+
+    for folder, (json_name, records, img_sub, images) in generate_sections(n_records, seed, missing).items():
+        img_dir = out_dir / folder / img_sub
+        img_dir.mkdir(parents=True)
+        with open(out_dir / folder / json_name, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+        for name in images:
+            open(img_dir / name, 'wb').close()
+
+    dest_dir = out_dir / 'static' / 'jpeg' / 'destinazioni'
+    dest_dir.mkdir(parents=True)
+    for name in destination_names(max(100, n_records // 10), seed):
+        open(dest_dir / name, 'wb').close()
+
+    marker.write_text(json.dumps(params), encoding='utf-8')
+    return out_dir
+
+
+def main():
+    p = argparse.ArgumentParser(description='Genera un catalogo sintetico per i benchmark')
+    p.add_argument('--records', default='10k', help='Numero di record (es. 10k, 100k, 1M; default: 10k)')
+    p.add_argument('--out', help='Cartella di destinazione (default: .cache/benchmarks/data-<record>-<seed>)')
+    p.add_argument('--seed', type=int, default=1, help='Seme del generatore casuale (default: 1)')
+    p.add_argument('--missing', type=float, default=0.4, help='Quota di immagini mancanti (default: 0.4)')
+    p.add_argument('--force', action='store_true', help='Rigenera anche se già presente')
+    args = p.parse_args()
+
+    n = parse_count(args.records)
+    out = Path(args.out) if args.out else DEFAULT_OUT / f'data-{n}-{args.seed}'
+    generate(out, n, args.seed, args.missing, force=args.force)
+    n_files = sum(len(files) for _, _, files in os.walk(out))
+    print(f"✓ Catalogo sintetico: {n} record, {n_files} file in {out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
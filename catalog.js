@@ -10,6 +10,30 @@
  *       getImgPath: function(r) {
  *         return `jpg/prev_${r["Targhetta Ufficio"]}${(r["extra"]) ? ('_' + (r["extra"]).toString().trim()) : ''}.jpeg`;
  *       },
+ *       // (opzionale) Rappresentanti precalcolati per Targhetta Tipo, generati da
+ *       // static/statistics/site_stats.py: evitano di sondare le immagini nella
+ *       // vista "Ornaghi Tipo".
+ *       tipoFile: "targhetteRegno.tipo.json",
+ *       // (opzionale) Versione colonnare compatta del catalogo, generata da
+ *       // catalog_columnar.py; se non disponibile si usa jsonFile.
+ *       columnarFile: "targhetteRegno.cols.json",
+ *       // (opzionale) Manifest delle miniature generate da generate_thumbnails.py:
+ *       // dimensioni in pixel (spazio riservato) e srcset WebP per card e lista.
+ *       thumbsManifest: "jpg/thumbs/manifest.json",
+ *       // (opzionale) Immagine risolta per ogni record (chiave Tipo/Ufficio/extra ->
+ *       // path o null), generata da static/statistics/site_stats.py: le immagini
+ *       // mancanti non vengono richieste e il lightbox le salta.
+ *       imagesFile: "targhetteRegno.images.json",
+ *       // (opzionale) Cubo di aggregazione (conteggi per Anno, Località, ufficio e
+ *       // Targhetta Tipo), generato da static/statistics/site_stats.py: il grafico
+ *       // per anno si calcola dalle celle invece che dai record.
+ *       cubeFile: "targhetteRegno.cube.json",
+ *       // (opzionale) Manifest delle versioni del JSON, generato da catalog_delta.py:
+ *       // i record restano nella Cache API del browser e a un nuovo rilascio si
+ *       // scaricano solo le patch dalla versione già presente.
+ *       deltaManifest: "delta/targhetteRegno.versions.json",
+ *       // (opzionale) Service worker da registrare (precache dei file con hash).
+ *       serviceWorker: "/sw.js",
  *       // (opzionale) Funzione extra per personalizzare le celle della tabella.
  *       // Riceve (td, campo, valore, record). Ritorna true se ha gestito la cella,
  *       // false per usare il comportamento di default.
@@ -17,6 +41,14 @@
  *     };
  *   </script>
  *   <script src="/catalog.js"></script>
+ *
+ * I file derivati dal catalogo (tipoFile, imagesFile, cubeFile, facetsFile,
+ * searchIndex e i suoi shard) hanno URL fissi e riportano in "catalog" la
+ * versione del JSON da cui sono generati (catalog_stream.catalog_version).
+ * Si usano solo se coincide con la versione dei record caricati; altrimenti
+ * vengono riscaricati una volta dalla rete e, se non coincide ancora, la
+ * pagina ne fa a meno (calcolo dai record). Dopo il caricamento la versione
+ * è anche in CATALOG_CONFIG.versione (null se non nota).
  */
 
 (function () {
@@ -33,9 +65,16 @@
   }
 
   let data = [],
+    miniature = null,
+    immaginiRecord = null,
     immagini = [],
     lightboxIndex = 0,
-    currentPage = 1;
+    currentPage = 1,
+    posizioni = null,
+    risultatiRicerca = null,
+    facette = null,
+    cubo = null,
+    versioneCatalogo = null;
 
   // ── Utilità ──────────────────────────────────────────────────────────
 
@@ -58,10 +97,319 @@
 
   // ── Caricamento JSON ─────────────────────────────────────────────────
 
-  fetch(CFG.jsonFile)
-    .then((res) => res.json())
-    .then((json) => {
+  // Ricostruisce i record dal formato colonnare (contratto in catalog_columnar.py)
+  function decodificaColonnare(c) {
+    if (c.format !== "columnar-v1") throw new Error("formato non supportato");
+    const colonne = c.fields.map((f) => {
+      const col = c.columns[f];
+      return col.dict ? col.codes.map((k) => col.dict[k]) : col.values;
+    });
+    const records = new Array(c.count);
+    for (let i = 0; i < c.count; i++) {
+      const shape = c.shapes[c.shapeCodes ? c.shapeCodes[i] : 0];
+      const r = {};
+      shape.forEach((j) => (r[c.fields[j]] = colonne[j][i]));
+      records[i] = r;
+    }
+    return records;
+  }
+
+  function caricaJson(url, opzioni) {
+    return fetch(url, opzioni).then((res) => {
+      if (!res.ok) throw new Error(res.status);
+      return res.json();
+    });
+  }
+
+  // Applica una patch di catalog_delta.py (contratto nel suo docstring):
+  // [inizio, lunghezza] copia record della versione precedente, un oggetto è un record
+  function applicaPatch(records, patch) {
+    if (patch.format !== "delta-v1" || records.length !== patch.fromCount)
+      throw new Error("patch non applicabile");
+    const out = [];
+    patch.ops.forEach((op) => {
+      if (Array.isArray(op)) {
+        for (let i = op[0]; i < op[0] + op[1]; i++) out.push(records[i]);
+      } else out.push(op);
+    });
+    if (out.length !== patch.count) throw new Error("patch non coerente");
+    return out;
+  }
+
+  // Record del file colonnare se è della versione indicata (campo catalog);
+  // una copia vecchia nella cache HTTP si riscarica una volta
+  function colonnareDellaVersione(versione) {
+    if (!CFG.columnarFile) return Promise.reject(new Error("file colonnare non configurato"));
+    const carica = (opzioni) =>
+      caricaJson(CFG.columnarFile, opzioni).then((c) => (c.catalog === versione ? c : null));
+    return carica()
+      .then((c) => c || carica({ cache: "reload" }))
+      .then((c) => {
+        if (!c) throw new Error("file colonnare di un'altra versione");
+        return decodificaColonnare(c);
+      });
+  }
+
+  // Record della versione corrente secondo CFG.deltaManifest: dalla copia
+  // nella Cache API più le patch mancanti; senza copia o senza catena di patch
+  // dal file colonnare (il più piccolo da scaricare) se è di quella versione,
+  // altrimenti dal JSON completo con hash (contenuto garantito per quella
+  // versione). I record vengono poi salvati per la visita dopo.
+  function caricaVersione() {
+    const chiave = new URL(CFG.deltaManifest, location.href).href;
+    return Promise.all([
+      caricaJson(CFG.deltaManifest, { cache: "no-cache" }),
+      caches.open("catalogo-dati"),
+    ]).then(([versioni, cache]) => {
+      if (versioni.format !== "versions-v1") throw new Error("formato non supportato");
+      return cache
+        .match(chiave)
+        .then((res) => (res ? res.json() : null))
+        .then((salvato) => {
+          const patch = [];
+          let v = salvato && salvato.version;
+          while (v && v !== versioni.current && versioni.patches[v] && patch.length < 100) {
+            patch.push(versioni.patches[v].file);
+            v = versioni.patches[v].to;
+          }
+          let records;
+          if (salvato && v === versioni.current) {
+            records = patch.reduce(
+              (p, file) => p.then((recs) => caricaJson(file).then((pt) => applicaPatch(recs, pt))),
+              Promise.resolve(salvato.records),
+            );
+          } else records = colonnareDellaVersione(versioni.current).catch(() => caricaJson(versioni.url));
+          return records.then((recs) => {
+            if (recs.length !== versioni.count) throw new Error("versione non coerente");
+            if (!salvato || salvato.version !== versioni.current) {
+              const copia = JSON.stringify({ version: versioni.current, records: recs });
+              cache.put(chiave, new Response(copia)).catch(() => {});
+            }
+            return { records: recs, versione: versioni.current };
+          });
+        });
+    });
+  }
+
+  // Versione di un JSON di sezione come catalog_stream.catalog_version: primi
+  // 10 caratteri dello SHA-256 del contenuto (null senza Web Crypto)
+  function versioneDi(buffer) {
+    if (!window.crypto || !crypto.subtle) return Promise.resolve(null);
+    return crypto.subtle
+      .digest("SHA-256", buffer)
+      .then((h) => Array.from(new Uint8Array(h), (b) => b.toString(16).padStart(2, "0")).join("").slice(0, 10))
+      .catch(() => null);
+  }
+
+  // Record del catalogo e loro versione: { records, versione }
+  function caricaDati() {
+    const completo = () =>
+      fetch(CFG.jsonFile)
+        .then((res) => res.arrayBuffer())
+        .then((buf) =>
+          versioneDi(buf).then((versione) => ({ records: JSON.parse(new TextDecoder().decode(buf)), versione })),
+        );
+    const colonnare = () =>
+      CFG.columnarFile
+        ? caricaJson(CFG.columnarFile)
+            .then((c) => ({ records: decodificaColonnare(c), versione: c.catalog || null }))
+            .catch(completo)
+        : completo();
+    if (CFG.deltaManifest && window.caches) return caricaVersione().catch(colonnare);
+    return colonnare();
+  }
+
+  // Manifest delle miniature: { base, widths, images: { nome: [w, h] } }
+  function caricaMiniature() {
+    if (!CFG.thumbsManifest) return Promise.resolve(null);
+    return fetch(CFG.thumbsManifest)
+      .then((res) => (res.ok ? res.json() : null))
+      .then((m) => {
+        if (!m) return null;
+        m.base = CFG.thumbsManifest.replace(/\/[^/]*$/, "");
+        return m;
+      })
+      .catch(() => null);
+  }
+
+  // Dimensioni e varianti ridotte (se presenti) per un'immagine di anteprima
+  function applicaMiniature(img, imgPath, sizes) {
+    if (!miniature) return;
+    const nome = imgPath.split("/").pop();
+    const dim = miniature.images[nome];
+    if (!dim) return;
+    img.width = dim[0];
+    img.height = dim[1];
+    const base = nome.replace(/\.[^.]+$/, "");
+    // le varianti non sono mai ingrandite: quelle larghe almeno quanto la
+    // sorgente hanno la sua larghezza, e un descrittore w ripetuto rende
+    // invalido lo srcset; alla larghezza originale basta la più piccola
+    // (oppure la copia full/ se tutte sono più strette)
+    const ridotte = miniature.widths.filter((w) => w < dim[0]);
+    const originale = miniature.widths.find((w) => w >= dim[0]) || "full";
+    img.srcset = ridotte
+      .map((w) => `${miniature.base}/${w}/${base}.webp ${w}w`)
+      .concat(`${miniature.base}/${originale}/${base}.webp ${dim[0]}w`)
+      .join(", ");
+    img.sizes = sizes;
+  }
+
+  // Immagini risolte per record: { catalog, images: { "Tipo/Ufficio/extra": path | null } }
+  function caricaImmaginiRecord(opzioni) {
+    if (!CFG.imagesFile) return Promise.resolve(null);
+    return fetch(CFG.imagesFile, opzioni)
+      .then((res) => (res.ok ? res.json() : null))
+      .catch(() => null);
+  }
+
+  // File derivato `d` se è della versione dei record caricati; altrimenti
+  // riscaricato dalla rete con `ricarica(opzioni)`, oppure null
+  function versioneValida(d, ricarica) {
+    if (!d || !versioneCatalogo) return Promise.resolve(null);
+    if (d.catalog === versioneCatalogo) return Promise.resolve(d);
+    return ricarica({ cache: "reload" }).then((n) => (n && n.catalog === versioneCatalogo ? n : null));
+  }
+
+  function chiaveRecord(r) {
+    return `${r["Targhetta Tipo"]}/${r["Targhetta Ufficio"]}/${String(r.extra || "").trim()}`;
+  }
+
+  // Path dell'immagine di un record, oppure null se è noto che manca
+  function percorsoImmagine(r) {
+    if (immaginiRecord) {
+      const k = chiaveRecord(r);
+      if (k in immaginiRecord) return immaginiRecord[k];
+    }
+    return CFG.getImgPath(r);
+  }
+
+  // ── Ricerca testuale (indice generato da search_index.py) ───────────
+
+  let indiceRicerca = null,
+    ricercheInCorso = 0;
+  const shardRicerca = {};
+
+  // Come fold() in search_index.py: senza accenti e minuscolo
+  function piega(s) {
+    return String(s).normalize("NFD").replace(/[\u0300-\u036f]/g, "").toLowerCase();
+  }
+
+  // Manifest o shard dell'indice, solo se della versione dei record caricati
+  function caricaFileRicerca(url) {
+    const carica = (opzioni) => caricaJson(url, opzioni).catch(() => null);
+    return carica()
+      .then((d) => versioneValida(d, carica))
+      .then((d) => {
+        if (!d) throw new Error(`${url} non disponibile per questa versione del catalogo`);
+        return d;
+      });
+  }
+
+  function caricaIndiceRicerca() {
+    if (!indiceRicerca) indiceRicerca = caricaFileRicerca(CFG.searchIndex);
+    return indiceRicerca;
+  }
+
+  function caricaShardRicerca(nome) {
+    if (!shardRicerca[nome]) {
+      const base = CFG.searchIndex.replace(/[^/]*$/, "");
+      shardRicerca[nome] = caricaFileRicerca(base + nome);
+    }
+    return shardRicerca[nome];
+  }
+
+  // Posizioni dei record con tutte le parole del testo come prefisso di un
+  // termine (Set), oppure null se nessuna parola è abbastanza lunga
+  async function cercaTesto(testo) {
+    const indice = await caricaIndiceRicerca();
+    const parole = piega(testo)
+      .split(/[^a-z0-9]+/)
+      .filter((p) => p.length >= indice.prefix);
+    if (!parole.length) return null;
+    let risultato = null;
+    for (const parola of parole) {
+      const trovati = new Set();
+      const nome = indice.shards[parola.slice(0, indice.prefix)];
+      if (nome) {
+        const shard = await caricaShardRicerca(nome);
+        shard.terms.forEach((termine, i) => {
+          if (!termine.startsWith(parola)) return;
+          let pos = 0;
+          shard.postings[i].forEach((d) => trovati.add((pos += d)));
+        });
+      }
+      risultato = risultato
+        ? new Set([...risultato].filter((p) => trovati.has(p)))
+        : trovati;
+      if (!risultato.size) break;
+    }
+    return risultato;
+  }
+
+  function inRicerca(r) {
+    return !risultatiRicerca || risultatiRicerca.has(posizioni.get(r));
+  }
+
+  let timerRicerca = null;
+  function avviaRicerca(testo) {
+    document
+      .querySelectorAll(".ricerca-testo")
+      .forEach((el) => el.value !== testo && (el.value = testo));
+    clearTimeout(timerRicerca);
+    timerRicerca = setTimeout(() => {
+      const id = ++ricercheInCorso;
+      cercaTesto(testo)
+        .then((risultato) => {
+          // scarta le risposte di ricerche già superate
+          if (id !== ricercheInCorso) return;
+          risultatiRicerca = risultato;
+          currentPage = 1;
+          aggiornaOpzioniFiltri();
+          aggiornaVisualizzazione(filtraDati(data));
+        })
+        .catch((err) => console.error("Ricerca non disponibile:", err));
+    }, 150);
+  }
+
+  function creaCampoRicerca(testoEtichetta) {
+    const label = document.createElement("label");
+    label.textContent = testoEtichetta;
+    const input = document.createElement("input");
+    input.type = "search";
+    input.className = "ricerca-testo";
+    input.placeholder = "Descrizione, località, ufficio, anno…";
+    input.addEventListener("input", () => avviaRicerca(input.value));
+    label.appendChild(input);
+    return label;
+  }
+
+  if (CFG.serviceWorker && "serviceWorker" in navigator) {
+    navigator.serviceWorker.register(CFG.serviceWorker).catch((err) => console.warn("Service worker:", err));
+  }
+
+  Promise.all([caricaDati(), caricaMiniature(), caricaImmaginiRecord(), caricaFacette(), caricaCubo()])
+    .then(([dati, m, imm, f, c]) => {
+      versioneCatalogo = CFG.versione = dati.versione;
+      // file derivati di un'altra versione del catalogo: riscaricati, altrimenti se ne fa a meno
+      return Promise.all([
+        dati.records,
+        m,
+        versioneValida(imm, caricaImmaginiRecord),
+        versioneValida(f, caricaFacette),
+        versioneValida(c, caricaCubo),
+      ]);
+    })
+    .then(([json, m, imm, f, c]) => {
+      miniature = m;
+      immaginiRecord = imm && imm.images;
       data = json;
+      facette = f;
+      cubo = c;
+      posizioni = new Map(data.map((r, i) => [r, i]));
+      if (CFG.searchIndex) {
+        const wrapper = document.querySelector(".controlli-wrapper");
+        if (wrapper) wrapper.appendChild(creaCampoRicerca("Cerca: "));
+      }
       calcolaLarghezzeFisse(data);
       costruisciFiltri(data);
       costruisciFiltriMobile(data);
@@ -371,6 +719,7 @@
     });
     schemaLabel.appendChild(schemaSelect);
     controlsDiv.appendChild(schemaLabel);
+    if (CFG.searchIndex) controlsDiv.appendChild(creaCampoRicerca("Cerca"));
     panel.appendChild(controlsDiv);
 
     // Pulsante azzera
@@ -446,7 +795,8 @@
 
   // ── Filtraggio dati ──────────────────────────────────────────────────
 
-  function filtraDati(records) {
+  // Valori selezionati nei filtri: { campo: [valori] } dei soli campi filtrati
+  function filtriAttivi() {
     const multiSelects = document.querySelectorAll(
       "#trFiltri .multi-select",
     );
@@ -455,18 +805,147 @@
       const vals = getMultiSelectValues(ms);
       if (vals.length > 0) filtri[ms.dataset.campo] = vals;
     });
-    return records.filter((r) => {
-      for (const [campo, valoriAccettati] of Object.entries(filtri)) {
-        const val = r[campo];
-        if (Array.isArray(val)) {
-          if (!val.some((v) => valoriAccettati.includes(String(v))))
-            return false;
-        } else {
-          if (!valoriAccettati.includes(String(val))) return false;
-        }
+    return filtri;
+  }
+
+  function filtraDati(records, filtri = filtriAttivi()) {
+    if (facette && records === data)
+      return posizioniBitset(bitsetFiltri(filtri)).map((p) => data[p]);
+    return records.filter((r) => inRicerca(r) && corrispondeFiltri(r, filtri));
+  }
+
+  // Il record passa i filtri di tutti i campi tranne `escluso`
+  function corrispondeFiltri(r, filtri, escluso) {
+    for (const [campo, valoriAccettati] of Object.entries(filtri)) {
+      if (campo === escluso) continue;
+      const val = r[campo];
+      if (Array.isArray(val)) {
+        if (!val.some((v) => valoriAccettati.includes(String(v))))
+          return false;
+      } else {
+        if (!valoriAccettati.includes(String(val))) return false;
       }
-      return true;
-    });
+    }
+    return true;
+  }
+
+  function aggiungiValori(valori, v) {
+    if (Array.isArray(v)) v.forEach((x) => valori.add(String(x)));
+    else if (v != null) valori.add(String(v));
+  }
+
+  // ── Bitset dei filtri (generati da facet_bitsets.py) ─────────────────
+
+  // Contratto in facet_bitsets.py: per ogni campo, i valori e i bitset delle
+  // posizioni dei record codificati a sequenze (assenti, presenti, ...)
+  function caricaFacette(opzioni) {
+    if (!CFG.facetsFile) return Promise.resolve(null);
+    return fetch(CFG.facetsFile, opzioni)
+      .then((res) => (res.ok ? res.json() : null))
+      .then((f) => (f && f.format === "facets-rle-v1" ? f : null))
+      .catch(() => null);
+  }
+
+  function nuovoBitset(pieno) {
+    const b = new Uint32Array(Math.ceil(data.length / 32));
+    if (pieno) {
+      b.fill(0xffffffff);
+      const resto = data.length % 32;
+      if (resto) b[b.length - 1] = (1 << resto) - 1;
+    }
+    return b;
+  }
+
+  // Bitset di un valore di un campo, decodificato alla prima richiesta
+  function bitsetValore(campo, valore) {
+    const col = facette.fields[campo];
+    if (!col.bitset) {
+      col.bitset = new Map();
+      col.posizione = new Map(col.values.map((v, i) => [v, i]));
+    }
+    if (!col.bitset.has(valore)) {
+      const b = nuovoBitset(false);
+      const runs = col.runs[col.posizione.get(valore)] || [];
+      let pos = 0;
+      for (let k = 0; k < runs.length; k += 2) {
+        pos += runs[k];
+        for (const fine = pos + runs[k + 1]; pos < fine; pos++)
+          b[pos >>> 5] |= 1 << (pos & 31);
+      }
+      col.bitset.set(valore, b);
+    }
+    return col.bitset.get(valore);
+  }
+
+  function popcount32(x) {
+    x -= (x >>> 1) & 0x55555555;
+    x = (x & 0x33333333) + ((x >>> 2) & 0x33333333);
+    return (((x + (x >>> 4)) & 0x0f0f0f0f) * 0x01010101) >>> 24;
+  }
+
+  // Numero di record presenti in entrambi i bitset
+  function contaComuni(a, b) {
+    let n = 0;
+    for (let i = 0; i < a.length; i++) n += popcount32(a[i] & b[i]);
+    return n;
+  }
+
+  function posizioniBitset(b) {
+    const out = [];
+    for (let w = 0; w < b.length; w++) {
+      for (let x = b[w]; x; x &= x - 1) out.push(w * 32 + 31 - Math.clz32(x & -x));
+    }
+    return out;
+  }
+
+  // Record che passano la ricerca e i filtri (tranne `escluso`): OR dei
+  // valori scelti di un campo, AND tra i campi con bitset; i campi senza
+  // bitset e la ricerca si controllano sui soli record rimasti
+  function bitsetFiltri(filtri, escluso) {
+    const b = nuovoBitset(true);
+    const altri = {};
+    for (const [campo, valori] of Object.entries(filtri)) {
+      if (campo === escluso) continue;
+      if (!facette.fields[campo]) {
+        altri[campo] = valori;
+        continue;
+      }
+      const campoBits = nuovoBitset(false);
+      valori.forEach((v) => {
+        const vb = bitsetValore(campo, v);
+        for (let i = 0; i < campoBits.length; i++) campoBits[i] |= vb[i];
+      });
+      for (let i = 0; i < b.length; i++) b[i] &= campoBits[i];
+    }
+    if (risultatiRicerca || Object.keys(altri).length) {
+      posizioniBitset(b).forEach((p) => {
+        if (!inRicerca(data[p]) || !corrispondeFiltri(data[p], altri))
+          b[p >>> 5] &= ~(1 << (p & 31));
+      });
+    }
+    return b;
+  }
+
+  // Valori di `campo` presenti nei record che passano la ricerca e i filtri
+  // degli altri campi (facet_bitsets.py --verify lo confronta con Python)
+  function valoriPossibiliCampo(filtri, campo) {
+    const valori = new Set();
+    if (facette) {
+      // popcount del bitset di ogni valore con quello degli altri filtri
+      const b = bitsetFiltri(filtri, campo);
+      if (facette.fields[campo]) {
+        facette.fields[campo].values.forEach((v) => {
+          if (contaComuni(bitsetValore(campo, v), b)) valori.add(v);
+        });
+      } else {
+        posizioniBitset(b).forEach((p) => aggiungiValori(valori, data[p][campo]));
+      }
+    } else {
+      data.forEach((r) => {
+        if (inRicerca(r) && corrispondeFiltri(r, filtri, campo)) aggiungiValori(valori, r[campo]);
+      });
+    }
+    return valori;
   }
 
   // ── Aggiorna opzioni filtri a cascata ────────────────────────────────
@@ -485,28 +964,7 @@
     desktopMultiSelects.forEach((ms) => {
       const campo = ms.dataset.campo;
 
-      const recordFiltrati = data.filter((r) => {
-        for (const [c, valoriAccettati] of Object.entries(filtriAttivi)) {
-          if (c === campo) continue;
-          const val = r[c];
-          if (Array.isArray(val)) {
-            if (!val.some((v) => valoriAccettati.includes(String(v))))
-              return false;
-          } else {
-            if (!valoriAccettati.includes(String(val))) return false;
-          }
-        }
-        return true;
-      });
-
-      const valoriPossibili = new Set();
-      recordFiltrati.forEach((r) => {
-        const v = r[campo];
-        if (Array.isArray(v))
-          v.forEach((x) => valoriPossibili.add(String(x)));
-        else if (v != null) valoriPossibili.add(String(v));
-      });
-
+      const valoriPossibili = valoriPossibiliCampo(filtriAttivi, campo);
       const msPanel =
         ms._panel || ms.querySelector(".multi-select-panel");
       if (!msPanel) return;
@@ -561,6 +1019,36 @@
 
   // ── Schema di catalogazione ──────────────────────────────────────────
 
+  // Mappa Targhetta Tipo -> { count, hasImage, record } letta da CFG.tipoFile
+  let rappresentantiTipo = null;
+
+  function caricaTipi(opzioni) {
+    return fetch(CFG.tipoFile, opzioni)
+      .then((res) => (res.ok ? res.json() : null))
+      .catch(() => null);
+  }
+
+  function caricaRappresentantiTipo() {
+    if (!CFG.tipoFile) return Promise.resolve({});
+    if (!rappresentantiTipo) {
+      rappresentantiTipo = caricaTipi()
+        .then((t) => versioneValida(t, caricaTipi))
+        .then((t) => {
+          const mappa = {};
+          (t ? t.tipi : []).forEach((g) => (mappa[g["Targhetta Tipo"]] = g));
+          return mappa;
+        });
+    }
+    return rappresentantiTipo;
+  }
+
+  function stessoRecord(a, b) {
+    return (
+      a["Targhetta Ufficio"] === b["Targhetta Ufficio"] &&
+      String(a.extra || "").trim() === String(b.extra || "").trim()
+    );
+  }
+
   async function applicaSchema(records, vistaSelezionata) {
     const schema = document.getElementById("schemaCatalogazione").value;
     if (schema === "ornaghi_ufficio") {
@@ -574,15 +1062,31 @@
       });
 
       const soloTabella = vistaSelezionata === "tabella";
+      const rappresentanti = soloTabella
+        ? {}
+        : await caricaRappresentantiTipo();
 
       const risultato = [];
       for (const tipo in gruppi) {
         const gruppo = gruppi[tipo];
 
+        const pre = rappresentanti[tipo];
+        const preNelGruppo =
+          pre && gruppo.find((r) => stessoRecord(r, pre.record));
+
         if (soloTabella) {
           risultato.push(gruppo[0]);
+        } else if (pre && !pre.hasImage) {
+          // nessun record di questo tipo ha un'immagine: inutile sondare
+          risultato.push(gruppo[0]);
+        } else if (preNelGruppo) {
+          risultato.push(preNelGruppo);
         } else {
+          // rappresentante escluso dai filtri (o file assente): si sonda il gruppo
           const verificaImmagine = (record) => {
+            if (immaginiRecord && chiaveRecord(record) in immaginiRecord) {
+              return Promise.resolve(immaginiRecord[chiaveRecord(record)] !== null);
+            }
             return new Promise((resolve) => {
               const img = new Image();
               img.onload = () => resolve(true);
@@ -610,6 +1114,7 @@
 
   // ── Visualizzazione ──────────────────────────────────────────────────
 
+  // `records`: i record dei filtri correnti (filtraDati(data), o data all'avvio)
   async function aggiornaVisualizzazione(records) {
     const loadingIndicator = document.getElementById("loadingIndicator");
     loadingIndicator.style.display = "flex";
@@ -650,7 +1155,7 @@
           document.getElementById("cardContainer").style.display = "flex";
           mostraCard(mostrati);
         }
-        aggiornaGrafico(records);
+        aggiornaGrafico(records, true);
         return;
       }
 
@@ -667,7 +1172,7 @@
         mostraCard(mostrati);
       } else cardContainer.style.display = "none";
 
-      aggiornaGrafico(records);
+      aggiornaGrafico(records, true);
     } finally {
       loadingIndicator.style.display = "none";
     }
@@ -839,8 +1344,7 @@
       imgContainer.className = "card-image-container";
 
       const img = document.createElement("img");
-      const imgPath = CFG.getImgPath(r);
-      img.src = imgPath;
+      const imgPath = percorsoImmagine(r);
       img.alt = r["Descrizione"] || "Annullo";
       img.loading = "lazy";
 
@@ -855,6 +1359,12 @@
 
       img.onclick = () => apriLightbox(i);
       imgContainer.appendChild(img);
+      if (imgPath) {
+        img.src = imgPath;
+        applicaMiniature(img, imgPath, "(max-width: 480px) 100vw, (max-width: 900px) 50vw, 25vw");
+      } else {
+        img.onerror();
+      }
       card.appendChild(imgContainer);
 
       const newCard = document.createElement("h3");
@@ -913,9 +1423,8 @@
 
       const thumb = document.createElement("div");
       thumb.className = "item-thumb";
-      const imgPath = CFG.getImgPath(r);
+      const imgPath = percorsoImmagine(r);
       const img = document.createElement("img");
-      img.src = imgPath;
       img.loading = "lazy";
       img.onerror = () => {
         img.style.display = "none";
@@ -925,6 +1434,12 @@
         thumb.appendChild(noImg);
       };
       thumb.appendChild(img);
+      if (imgPath) {
+        img.src = imgPath;
+        applicaMiniature(img, imgPath, "80px");
+      } else {
+        img.onerror();
+      }
 
       const info = document.createElement("div");
       info.className = "item-info";
@@ -973,29 +1488,43 @@
     const overlay = document.getElementById("lightboxOverlay");
     const img = document.getElementById("lightboxImage");
     const fallback = document.getElementById("fallbackText");
-    img.src = immagini[index];
-    img.style.display = "block";
-    fallback.textContent = "";
     img.onerror = () => {
       img.style.display = "none";
       fallback.textContent = "Immagine non ancora presente";
     };
+    if (immagini[index]) {
+      img.src = immagini[index];
+      img.style.display = "block";
+      fallback.textContent = "";
+    } else {
+      // immagine nota come mancante: nessuna richiesta
+      img.removeAttribute("src");
+      img.onerror();
+    }
     overlay.style.display = "flex";
   }
 
+  // Prossimo indice nella direzione `passo` saltando le immagini mancanti
+  // (se mancano tutte si resta sull'indice successivo)
+  function indiceAdiacente(passo) {
+    const n = immagini.length;
+    for (let k = 1; k <= n; k++) {
+      const i = (lightboxIndex + passo * k + n * k) % n;
+      if (immagini[i]) return i;
+    }
+    return (lightboxIndex + passo + n) % n;
+  }
+
   function chiudiLightbox() {
     document.getElementById("lightboxOverlay").style.display = "none";
   }
 
   // Esponi le funzioni necessarie per i bottoni inline dell'HTML
   window.prevImage = function () {
-    lightboxIndex =
-      (lightboxIndex - 1 + immagini.length) % immagini.length;
-    apriLightbox(lightboxIndex);
+    apriLightbox(indiceAdiacente(-1));
   };
   window.nextImage = function () {
-    lightboxIndex = (lightboxIndex + 1) % immagini.length;
-    apriLightbox(lightboxIndex);
+    apriLightbox(indiceAdiacente(1));
   };
   window.chiudiLightbox = chiudiLightbox;
 
@@ -1004,6 +1533,55 @@
   // Grafico: viene inizializzato solo se la libreria Chart.js è disponibile.
   let chart = null;
 
+  // Contratto in build_cube di site_stats.py: celle in colonne (codici dei
+  // valori di ogni dimensione, record e record con immagine) e totali per valore
+  function caricaCubo(opzioni) {
+    if (!CFG.cubeFile) return Promise.resolve(null);
+    return fetch(CFG.cubeFile, opzioni)
+      .then((res) => (res.ok ? res.json() : null))
+      .then((c) => (c && c.format === "cube-v1" ? c : null))
+      .catch(() => null);
+  }
+
+  // Record per anno dei filtri correnti, sommando le celle del cubo che li
+  // soddisfano; null se il cubo non basta (ricerca attiva, filtri su campi
+  // che non sono dimensioni del cubo o su valori lista)
+  function conteggioAnniDaCubo() {
+    if (!cubo || risultatiRicerca) return null;
+    const filtri = filtriAttivi();
+    const anni = cubo.values.Anno;
+    const conteggio = {};
+    const aggiungi = (k, n) => {
+      if (anni[k] === null || !n) return;
+      const key = String(anni[k]);
+      conteggio[key] = (conteggio[key] || 0) + n;
+    };
+    const campi = Object.keys(filtri);
+    if (campi.length === 0) {
+      cubo.totals.Anno.count.forEach((n, k) => aggiungi(k, n));
+      return conteggio;
+    }
+    const vincoli = [];
+    for (const campo of campi) {
+      if (!cubo.dims.includes(campo)) return null;
+      const accettati = new Set(filtri[campo]);
+      const codici = new Set();
+      for (let k = 0; k < cubo.values[campo].length; k++) {
+        const v = cubo.values[campo][k];
+        if (Array.isArray(v)) return null;
+        if (accettati.has(String(v))) codici.add(k);
+      }
+      vincoli.push([cubo.cells[campo], codici]);
+    }
+    const colAnno = cubo.cells.Anno;
+    const count = cubo.cells.count;
+    celle: for (let i = 0; i < count.length; i++) {
+      for (const [col, codici] of vincoli) if (!codici.has(col[i])) continue celle;
+      aggiungi(colAnno[i], count[i]);
+    }
+    return conteggio;
+  }
+
   function createChartInstance() {
     const canvas = document.getElementById("grafico");
     if (!canvas) return null;
@@ -1042,17 +1620,24 @@
     });
   }
 
-  function aggiornaGrafico(records) {
+  // `filtrati`: i record sono quelli dei filtri correnti (filtraDati), e con
+  // lo schema per ufficio i conteggi si possono prendere dal cubo
+  function aggiornaGrafico(records, filtrati) {
     // Se chart non esiste, non fare nulla
     if (!chart) return;
-    const conteggio = {};
-    records.forEach((r) => {
-      const y = r && r.Anno !== undefined && r.Anno !== null ? r.Anno : null;
-      if (y !== null) {
-        const key = String(y);
-        conteggio[key] = (conteggio[key] || 0) + 1;
-      }
-    });
+    const schema = document.getElementById("schemaCatalogazione").value;
+    let conteggio =
+      filtrati && schema === "ornaghi_ufficio" ? conteggioAnniDaCubo() : null;
+    if (!conteggio) {
+      conteggio = {};
+      records.forEach((r) => {
+        const y = r && r.Anno !== undefined && r.Anno !== null ? r.Anno : null;
+        if (y !== null) {
+          const key = String(y);
+          conteggio[key] = (conteggio[key] || 0) + 1;
+        }
+      });
+    }
     const anni = Object.keys(conteggio).sort((a, b) => Number(a) - Number(b));
     const valori = anni.map((a) => conteggio[a]);
     chart.data.labels = anni;
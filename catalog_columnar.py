@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Codifica i JSON delle sezioni in un formato colonnare compatto
+(<sezione>.cols.json), con copie precompresse .gz e, se il modulo `brotli`
+è installato, .br.
+
+Contratto del formato (decodificato da decodificaColonnare in catalog.js):
+
+  {
+    "format": "columnar-v1",
+    "catalog": "<versione>",           versione del JSON codificato (catalog_stream.catalog_version):
+                                       catalog.js la usa come versione dei record caricati
+    "count":  N,                       numero di record
+    "fields": ["Targhetta Tipo", ...], nomi dei campi
+    "shapes": [[0, 1, 2, ...], ...],   elenchi ordinati di indici di campo:
+                                       chiavi presenti in un record, nell'ordine originale
+    "shapeCodes": [0, 0, 1, ...],      (opzionale) shape di ogni record; se assente
+                                       tutti i record usano shapes[0]
+    "columns": {
+      "<campo>": {"values": [v0, v1, ...]}              valori in chiaro, uno per record
+      "<campo>": {"dict": [d0, d1, ...], "codes": [...]} valori a bassa cardinalità:
+                                                         valore del record i = dict[codes[i]]
+    }
+  }
+
+Ogni colonna ha esattamente N elementi; per i record la cui shape non contiene
+il campo l'elemento è un segnaposto (null o -1) da ignorare. Il record i si
+ricostruisce prendendo, nell'ordine di shapes[shapeCodes[i]], ogni campo e il
+suo valore alla posizione i. La decodifica è quindi senza perdite, incluso
+l'ordine delle chiavi.
+
+Dopo la codifica il file viene decodificato e confrontato con l'originale:
+se il round-trip non è identico lo script termina con errore.
+
+Con --compare stampa anche il confronto di dimensioni (in chiaro, gzip, brotli)
+e tempo di parsing rispetto al JSON originale (brotli al livello 11 sul JSON
+originale richiede alcuni secondi, per questo non è il default).
+
+Uso:
+  python3 catalog_columnar.py [--compare] [JSON ...]
+"""
+
+import sys
+import json
+import gzip
+import time
+import argparse
+from pathlib import Path
+
+from sections import SECTIONS
+from catalog_stream import version_of
+from output_files import dump, write_if_changed
+
+try:
+    import brotli
+except ImportError:  # opzionale: senza brotli si scrive solo la copia .gz
+    brotli = None
+
+SECTION_JSONS = [s.json_path for s in SECTIONS]
+
+FORMAT = 'columnar-v1'
+
+# Una colonna viene codificata a dizionario se i valori distinti sono al più
+# questa frazione dei record.
+DICT_MAX_RATIO = 0.5
+
+
+def _value_key(v):
+    # distingue 1, 1.0, "1" e True, che in un dict Python collidono
+    return json.dumps(v, ensure_ascii=False, sort_keys=True)
+
+
+def encode(records, catalog=None):
+    fields = []
+    field_pos = {}
+    shapes = []
+    shape_pos = {}
+    shape_codes = []
+    for rec in records:
+        for k in rec:
+            if k not in field_pos:
+                field_pos[k] = len(fields)
+                fields.append(k)
+        shape = tuple(field_pos[k] for k in rec)
+        if shape not in shape_pos:
+            shape_pos[shape] = len(shapes)
+            shapes.append(shape)
+        shape_codes.append(shape_pos[shape])
+
+    n = len(records)
+    columns = {}
+    for f in fields:
+        present = [(i, rec[f]) for i, rec in enumerate(records) if f in rec]
+        distinct = {}
+        for _, v in present:
+            distinct.setdefault(_value_key(v), v)
+        if n and len(distinct) <= max(1, n * DICT_MAX_RATIO):
+            dict_pos = {k: i for i, k in enumerate(distinct)}
+            codes = [-1] * n
+            for i, v in present:
+                codes[i] = dict_pos[_value_key(v)]
+            columns[f] = {'dict': list(distinct.values()), 'codes': codes}
+        else:
+            values = [None] * n
+            for i, v in present:
+                values[i] = v
+            columns[f] = {'values': values}
+
+    out = {'format': FORMAT, 'catalog': catalog, 'count': n, 'fields': fields, 'shapes': [list(s) for s in shapes]}
+    if len(shapes) > 1:
+        out['shapeCodes'] = shape_codes
+    out['columns'] = columns
+    return out
+
+
+def decode(obj):
+    """Implementazione di riferimento del contratto descritto sopra."""
+    if obj.get('format') != FORMAT:
+        raise ValueError(f"formato non supportato: {obj.get('format')!r}")
+    fields = obj['fields']
+    cols = []
+    for f in fields:
+        col = obj['columns'][f]
+        if 'dict' in col:
+            d = col['dict']
+            cols.append([d[c] if c >= 0 else None for c in col['codes']])
+        else:
+            cols.append(col['values'])
+    shapes = obj['shapes']
+    codes = obj.get('shapeCodes')
+    records = []
+    for i in range(obj['count']):
+        shape = shapes[codes[i] if codes else 0]
+        records.append({fields[j]: cols[j][i] for j in shape})
+    return records
+
+
+def _parse_ms(payload, decoder=None, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        obj = json.loads(payload)
+        if decoder:
+            decoder(obj)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def _sizes(payload):
+    gz = gzip.compress(payload, compresslevel=9, mtime=0)
+    br = brotli.compress(payload, quality=11) if brotli else None
+    return gz, br
+
+
+def process(json_path: Path, compare=False):
+    raw = json_path.read_bytes()
+    records = json.loads(raw)
+    encoded = dump(encode(records, version_of(raw))).encode('utf-8')
+
+    # round-trip: la decodifica deve restituire esattamente i record originali
+    if dump(decode(json.loads(encoded))) != dump(records):
+        raise SystemExit(f"ERRORE: round-trip non identico per {json_path}")
+
+    out = json_path.with_name(json_path.stem + '.cols.json')
+    gz, br = _sizes(encoded)
+    write_if_changed(out, encoded)
+    write_if_changed(out.with_name(out.name + '.gz'), gz)
+    if br is not None:
+        write_if_changed(out.with_name(out.name + '.br'), br)
+
+    def kb(b):
+        return f"{len(b) / 1024:8.1f}" if b is not None else "       -"
+
+    if not compare:
+        print(f"✓ {out.as_posix()} ({len(records)} record): {kb(encoded).strip()} KB, "
+              f"gzip {kb(gz).strip()} KB, brotli {kb(br).strip()} KB (JSON originale {kb(raw).strip()} KB)")
+        return
+
+    raw_gz, raw_br = _sizes(raw)
+    print(f"✓ {out.as_posix()} ({len(records)} record)")
+    print("                 byte KB     gzip KB   brotli KB   parse ms")
+    print(f"  JSON         {kb(raw)}    {kb(raw_gz)}    {kb(raw_br)}   {_parse_ms(raw):8.2f}")
+    print(f"  colonnare    {kb(encoded)}    {kb(gz)}    {kb(br)}   {_parse_ms(encoded, decode):8.2f}  (incl. decodifica)")
+
+
+def main():
+    p = argparse.ArgumentParser(description='Codifica i JSON delle sezioni in formato colonnare compatto')
+    p.add_argument('json', nargs='*', default=SECTION_JSONS, help='JSON da codificare (default: tutte le sezioni)')
+    p.add_argument('--compare', action='store_true', help='Confronta dimensioni e tempo di parsing con il JSON originale')
+    args = p.parse_args()
+
+    if brotli is None:
+        print("ℹ modulo brotli non installato: copie .br non generate")
+    for path in args.json:
+        json_path = Path(path)
+        if json_path.exists():
+            process(json_path, compare=args.compare)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
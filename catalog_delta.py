@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Aggiornamenti incrementali dei JSON delle sezioni tra un rilascio e l'altro.
+
+Per ogni JSON di sezione pubblicato con hash da fingerprint_assets.py (es.
+regno/targhetteRegno.json) la versione è l'hash del contenuto, lo stesso del
+nome della copia <nome>.<hash>.json. Se il JSON è cambiato rispetto alla
+versione corrente del manifest, lo script confronta i record delle due
+versioni e scrive una patch a livello di record; un client che ha già la
+versione N (catalog.js la tiene nella Cache API del browser) passa a N+1
+scaricando solo le patch invece dell'intero file.
+
+Struttura su disco (<cartella sezione>/delta/):
+
+  <nome>.versions.json   {"format": "versions-v1", "file": "targhetteRegno.json",
+                          "current": "<hash>", "count": N,
+                          "url": "targhetteRegno.<hash>.json",    versione completa
+                          "patches": {"<da>": {"to": "<a>", "file": "delta/...",
+                                               "bytes": B, "seq": S}, ...}}
+  <nome>.<da>-<a>.json   {"format": "delta-v1", "from": "<da>", "to": "<a>",
+                          "fromCount": M, "count": N,
+                          "added": [chiavi], "removed": [chiavi], "changed": [chiavi],
+                          "ops": [[inizio, lunghezza], {record}, ...]}
+
+I path del manifest sono relativi alla cartella della sezione, come quelli di
+CATALOG_CONFIG. La chiave di un record è Tipo/Ufficio/extra (come
+site_stats.record_key e chiaveRecord in catalog.js) seguita da #n per la
+n-esima occorrenza della stessa chiave (n >= 2). La nuova lista di record si
+ottiene eseguendo `ops` in ordine: [inizio, lunghezza] copia i record della
+versione precedente in quelle posizioni, un oggetto è un record nuovo o
+modificato. L'ordine dei record è quindi quello della nuova versione, come
+richiedono gli indici per posizione (facette, ricerca). added/removed/changed
+servono solo come riepilogo. Ogni patch viene verificata applicandola prima
+di scriverla.
+
+Il manifest tiene le ultime MAX_PATCHES patch (le più vecchie vengono rimosse
+dal disco): un client con una versione più vecchia, o senza una catena di
+patch fino a quella corrente, scarica la versione completa.
+
+Le patch vanno da una versione pubblicata alla successiva, non da un rilascio
+locale all'altro (più modifiche tra due deploy consumerebbero la catena):
+catalog_delta è un passo del deploy (release.py --deploy) e delta/ non è nel
+repository. Con --base-url (default: variabile d'ambiente SITE_URL, impostata
+da .github/workflows/pages.yml) il manifest e le patch di partenza sono quelli
+del sito pubblicato: la versione "current" è quella che hanno i client, e le
+patch ancora nel manifest vengono riscaricate per essere ripubblicate. Senza
+URL (prova in locale) si parte da quelli in delta/, se presenti. Se il sito
+non risponde la catena riparte dalla versione corrente.
+
+La versione precedente si legge dalla copia salvata in .cache/delta/ oppure,
+in un clone senza .cache/, dalla storia git del JSON (ultimi GIT_DEPTH commit
+che lo modificano), infine dalla copia con hash del sito pubblicato. Le copie
+con hash delle versioni non sono nel repository: le scrive
+fingerprint_assets.py al deploy, dopo questo passo.
+
+Uso:
+  python3 catalog_delta.py [--base-url URL]
+"""
+
+import os
+import sys
+import json
+import difflib
+import subprocess
+import argparse
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from asset_index import PROJECT_ROOT, CACHE_DIR
+from output_files import dump, write_if_changed
+from fingerprint_assets import ASSETS, hashed_name
+from catalog_stream import version_of
+from sections import SECTIONS
+
+sys.path.insert(0, str(PROJECT_ROOT / 'static' / 'statistics'))
+from site_stats import record_key  # noqa: E402
+
+# JSON delle sezioni pubblicati con hash: solo per questi la versione ha un URL immutabile
+DELTA_JSONS = [s.json_path for s in SECTIONS if s.json_path in ASSETS]
+DELTA_DIR = 'delta'
+SNAPSHOT_DIR = CACHE_DIR / 'delta'
+MAX_PATCHES = 10
+GIT_DEPTH = 50
+SITE_URL_ENV = 'SITE_URL'
+FETCH_TIMEOUT = 30
+
+
+def versions_path(rel):
+    """Path (relativo) del manifest delle versioni di un JSON di sezione."""
+    folder, _, name = rel.rpartition('/')
+    return f"{folder}/{DELTA_DIR}/{Path(name).stem}.versions.json"
+
+
+def record_keys(records):
+    """Chiavi dei record, con #n per le occorrenze ripetute della stessa chiave."""
+    seen = {}
+    keys = []
+    for item in records:
+        key = record_key(item)
+        n = seen[key] = seen.get(key, 0) + 1
+        keys.append(key if n == 1 else f"{key}#{n}")
+    return keys
+
+
+def build_patch(old, new):
+    """Patch (senza from/to) che trasforma la lista di record `old` in `new`."""
+    old_keys, new_keys = record_keys(old), record_keys(new)
+    old_pos = {k: i for i, k in enumerate(old_keys)}
+    old_dumps = [dump(r) for r in old]
+    # record identici altrove (spostati, o chiave ripetuta con #n diverso)
+    old_by_dump = {d: i for i, d in reversed(list(enumerate(old_dumps)))}
+    ops = []
+
+    def copy(i):
+        last = ops[-1] if ops else None
+        if isinstance(last, list) and last[0] + last[1] == i:
+            last[1] += 1
+        else:
+            ops.append([i, 1])
+
+    changed = []
+    matcher = difflib.SequenceMatcher(None, old_keys, new_keys, autojunk=False)
+    for tag, i1, _, j1, j2 in matcher.get_opcodes():
+        for j in range(j1, j2):
+            key = new_keys[j]
+            # a parità di chiave si copia il record se non è cambiato, anche se spostato
+            i = i1 + (j - j1) if tag == 'equal' else old_pos.get(key)
+            record = dump(new[j])
+            if i is not None and old_dumps[i] == record:
+                copy(i)
+            elif record in old_by_dump:
+                copy(old_by_dump[record])
+            else:
+                ops.append(new[j])
+                if i is not None:
+                    changed.append(key)
+    new_set = set(new_keys)
+    return {
+        "fromCount": len(old), "count": len(new),
+        "added": [k for k in new_keys if k not in old_pos],
+        "removed": [k for k in old_keys if k not in new_set],
+        "changed": changed,
+        "ops": ops,
+    }
+
+
+def apply_patch(old, patch):
+    """Applica una patch (lo stesso algoritmo di applicaPatch in catalog.js)."""
+    if len(old) != patch["fromCount"]:
+        raise ValueError("la patch non parte da questa versione")
+    out = []
+    for op in patch["ops"]:
+        if isinstance(op, list):
+            out.extend(old[op[0]:op[0] + op[1]])
+        else:
+            out.append(op)
+    if len(out) != patch["count"]:
+        raise ValueError("numero di record diverso da quello atteso")
+    return out
+
+
+def _snapshot(rel, version):
+    return SNAPSHOT_DIR / rel.rpartition('/')[0] / f"{Path(rel).stem}.{version}.json"
+
+
+def _git(*args):
+    return subprocess.run(['git', *args], cwd=PROJECT_ROOT, capture_output=True, check=True).stdout
+
+
+def _from_git(rel, version):
+    """Contenuto di `rel` alla versione `version` dalla storia git, o None."""
+    try:
+        revs = _git('log', f'-{GIT_DEPTH}', '--format=%H', '--', rel).decode().split()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    for rev in revs:
+        try:
+            data = _git('show', f'{rev}:{rel}')
+        except subprocess.CalledProcessError:
+            continue
+        if version_of(data) == version:
+            return data
+    return None
+
+
+def _fetch(url):
+    """Contenuto di `url`, None se non esiste (404); gli altri errori passano."""
+    try:
+        with urllib.request.urlopen(url, timeout=FETCH_TIMEOUT) as res:
+            return res.read()
+    except urllib.error.HTTPError as e:
+        if e.code == 404:
+            return None
+        raise
+
+
+def published_manifest(rel, base_url):
+    """Manifest delle versioni di `rel` sul sito pubblicato, con le sue patch
+    riscaricate in delta/ (quelle non più disponibili escono dal manifest);
+    None se il sito non ha ancora il manifest o non risponde."""
+    folder = rel.rpartition('/')[0]
+    try:
+        data = _fetch(f"{base_url}/{versions_path(rel)}")
+        if data is None:
+            print(f"ℹ {rel}: nessun manifest delle versioni pubblicato, la catena parte da qui")
+            return None
+        manifest = json.loads(data)
+        for version, patch in list(manifest["patches"].items()):
+            payload = _fetch(f"{base_url}/{folder}/{patch['file']}")
+            if payload is None:
+                del manifest["patches"][version]
+            else:
+                write_if_changed(PROJECT_ROOT / folder / patch["file"], payload)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠ {rel}: manifest pubblicato non leggibile da {base_url} ({e})")
+        return None
+    return manifest
+
+
+def previous_version(rel, version, base_url=None, url=None):
+    """Contenuto della versione `version` di `rel` (copia in .cache/delta/,
+    storia git o copia con hash `url` del sito pubblicato), verificato con
+    l'hash; None se non disponibile."""
+    try:
+        data = _snapshot(rel, version).read_bytes()
+    except OSError:
+        data = None
+    if data is not None and version_of(data) == version:
+        return data
+    data = _from_git(rel, version)
+    if data is None and base_url and url:
+        try:
+            data = _fetch(f"{base_url}/{rel.rpartition('/')[0]}/{url}")
+        except OSError:
+            data = None
+        if data is not None and version_of(data) != version:
+            data = None
+    return data
+
+
+def save_snapshot(rel, version, data):
+    """Copia della versione corrente in .cache/delta/ (base del prossimo rilascio)."""
+    path = _snapshot(rel, version)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for old in path.parent.glob(f"{Path(rel).stem}.*.json"):
+        if old != path:
+            old.unlink()
+    if not path.exists():
+        path.write_bytes(data)
+
+
+def process(rel, base_url=None):
+    path = PROJECT_ROOT / rel
+    data = path.read_bytes()
+    version = version_of(data)
+    records = json.loads(data)
+    folder, _, name = rel.rpartition('/')
+    vpath = PROJECT_ROOT / versions_path(rel)
+    if base_url:
+        manifest = published_manifest(rel, base_url) or {"patches": {}}
+    else:
+        try:
+            manifest = json.loads(vpath.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            manifest = {"patches": {}}
+    patches = manifest["patches"]
+    previous = manifest.get("current")
+    note = "nessuna modifica"
+
+    if previous is not None and previous != version:
+        old_data = previous_version(rel, previous, base_url, manifest.get("url"))
+        if old_data is None:
+            print(f"⚠ {rel}: versione precedente {previous} non trovata, la catena di patch riparte da {version}")
+            patches.clear()
+            note = "catena azzerata"
+        else:
+            patch = build_patch(json.loads(old_data), records)
+            if apply_patch(json.loads(old_data), patch) != records:
+                raise SystemExit(f"ERRORE: la patch {previous} -> {version} di {rel} non ricostruisce la nuova versione")
+            file = f"{DELTA_DIR}/{Path(name).stem}.{previous}-{version}.json"
+            payload = dump({"format": "delta-v1", "from": previous, "to": version, **patch})
+            write_if_changed(PROJECT_ROOT / folder / file, payload)
+            seq = max((p["seq"] for p in patches.values()), default=0) + 1
+            patches[previous] = {"to": version, "file": file, "bytes": len(payload.encode('utf-8')), "seq": seq}
+            note = (f"patch da {previous}: +{len(patch['added'])} -{len(patch['removed'])} "
+                    f"~{len(patch['changed'])} record, {len(payload.encode('utf-8')) / 1024:.1f} KB")
+
+    # solo le ultime MAX_PATCHES patch
+    keep = sorted(patches, key=lambda v: patches[v]["seq"])[-MAX_PATCHES:]
+    patches = {v: patches[v] for v in keep}
+    manifest = {
+        "format": "versions-v1",
+        "file": name,
+        "current": version,
+        "count": len(records),
+        "url": hashed_name(name, data),
+        "patches": patches,
+    }
+    write_if_changed(vpath, dump(manifest) + '\n')
+    used = {Path(p["file"]).name for p in patches.values()} | {vpath.name}
+    removed = 0
+    for f in vpath.parent.glob(f"{Path(name).stem}.*.json"):
+        if f.name not in used:
+            f.unlink()
+            removed += 1
+    save_snapshot(rel, version, data)
+    print(f"✓ {rel}: versione {version} ({len(records)} record), {note}; "
+          f"{len(patches)} patch nel manifest" + (f", {removed} rimosse" if removed else ""))
+
+
+def latest_patches():
+    """Path (relativi alla radice) dell'ultima patch di ogni JSON di sezione,
+    per la lista di precache (fingerprint_assets.py)."""
+    out = []
+    for rel in DELTA_JSONS:
+        try:
+            manifest = json.loads((PROJECT_ROOT / versions_path(rel)).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            continue
+        last = max(manifest["patches"].values(), key=lambda p: p["seq"], default=None)
+        if last is not None:
+            out.append(f"{rel.rpartition('/')[0]}/{last['file']}")
+    return out
+
+
+def main():
+    p = argparse.ArgumentParser(description='Patch a livello di record tra versioni pubblicate dei JSON delle sezioni')
+    p.add_argument('--base-url', default=os.environ.get(SITE_URL_ENV),
+                   help=f'URL del sito pubblicato da cui partire (default: variabile {SITE_URL_ENV}; '
+                        'senza, il manifest in delta/)')
+    args = p.parse_args()
+    base_url = args.base_url.rstrip('/') if args.base_url else None
+    for rel in DELTA_JSONS:
+        if not (PROJECT_ROOT / rel).exists():
+            print(f"⚠ {rel} non trovato, saltato")
+            continue
+        process(rel, base_url)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
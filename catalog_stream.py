@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Lettura in streaming dei JSON delle sezioni (array di record).
+
+iter_records() legge il file a blocchi e decodifica un elemento dell'array
+alla volta con json.JSONDecoder.raw_decode: in memoria restano solo il blocco
+corrente e il record in lettura, qualunque sia la dimensione del catalogo.
+Un elemento che finisce alla fine del blocco (o un numero seguito solo da
+cifre, es. "4.5" + "e10") viene riletto dopo aver aggiunto il blocco
+successivo, perché potrebbe continuare. Un file che non è un array JSON
+valido solleva json.JSONDecodeError, come json.load.
+
+catalog_version() dà la versione di un JSON di sezione: i primi 10 caratteri
+dello SHA-256 del contenuto, come il nome della copia con hash scritta da
+fingerprint_assets.py e le versioni di catalog_delta.py. I file derivati dal
+catalogo e letti per posizione o per chiave insieme ai record (colonnare,
+facette, cubo, immagini, rappresentanti per tipo, ricerca, manifest delle
+pagine di dettaglio) la riportano nel campo "catalog": catalog.js li usa solo
+se coincide con la versione dei record caricati.
+
+Uso:
+  python3 catalog_stream.py [--compare] JSON ...
+"""
+
+import sys
+import re
+import json
+import time
+import hashlib
+import argparse
+import tracemalloc
+
+CHUNK_SIZE = 1 << 16
+VERSION_LEN = 10
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_NUMBER_CHARS = frozenset('0123456789+-.eE')
+
+
+class _Reader:
+    def __init__(self, fh, chunk_size):
+        self.fh = fh
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Aggiunge un blocco al buffer; False a fine file."""
+        if self.eof:
+            return False
+        chunk = self.fh.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        if self.pos:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        self.buf += chunk
+        return True
+
+    def skip_ws(self):
+        """Salta gli spazi; ritorna il carattere successivo ('' a fine file)."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    def error(self, msg):
+        return json.JSONDecodeError(msg, self.buf, self.pos)
+
+
+def iter_records(path_or_file, chunk_size=CHUNK_SIZE):
+    """Genera gli elementi dell'array JSON di primo livello di un file, uno alla volta."""
+    if hasattr(path_or_file, 'read'):
+        yield from _iter_array(path_or_file, chunk_size)
+        return
+    with open(path_or_file, 'r', encoding='utf-8') as fh:
+        yield from _iter_array(fh, chunk_size)
+
+
+def version_of(data):
+    """Versione di un catalogo dal contenuto del suo JSON (bytes)."""
+    return hashlib.sha256(data).hexdigest()[:VERSION_LEN]
+
+
+def catalog_version(path):
+    """Versione del JSON di sezione `path`, letto a blocchi come iter_records."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()[:VERSION_LEN]
+
+
+def _iter_array(fh, chunk_size):
+    decoder = json.JSONDecoder()
+    r = _Reader(fh, chunk_size)
+    if r.skip_ws() == '\ufeff':
+        r.pos += 1
+    if r.skip_ws() != '[':
+        raise r.error("Expecting '['")
+    r.pos += 1
+    if r.skip_ws() == ']':
+        r.pos += 1
+    else:
+        while True:
+            r.skip_ws()
+            while True:
+                try:
+                    item, end = decoder.raw_decode(r.buf, r.pos)
+                except json.JSONDecodeError:
+                    if r.fill():
+                        continue
+                    raise
+                # un numero spezzato tra due blocchi ("4.5" + "e10") sembra completo
+                incomplete = end == len(r.buf) or (
+                    isinstance(item, (int, float)) and not isinstance(item, bool)
+                    and r.buf[end] in _NUMBER_CHARS)
+                if incomplete and r.fill():
+                    continue
+                break
+            r.pos = end
+            yield item
+            c = r.skip_ws()
+            if c == ',':
+                r.pos += 1
+            elif c == ']':
+                r.pos += 1
+                break
+            else:
+                raise r.error("Expecting ',' delimiter")
+    if r.skip_ws() != '':
+        raise r.error('Extra data')
+
+
+def _peak(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    n = fn()
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return n, elapsed, peak
+
+
+def main():
+    p = argparse.ArgumentParser(description='Conta i record di JSON di sezione letti in streaming')
+    p.add_argument('json', nargs='+', help='File JSON (array di record)')
+    p.add_argument('--compare', action='store_true', help='Confronta tempo e picco di memoria con json.load')
+    args = p.parse_args()
+
+    for path in args.json:
+        n, s, peak = _peak(lambda: sum(1 for _ in iter_records(path)))
+        print(f"✓ {path}: {n} record, streaming {s * 1000:.0f} ms, picco {peak / 2**20:.2f} MB")
+        if args.compare:
+            def full():
+                with open(path, 'r', encoding='utf-8') as fh:
+                    return len(json.load(fh))
+            n_full, s, peak = _peak(full)
+            same = '' if n_full == n else f" ✗ {n_full} record"
+            print(f"  json.load  {s * 1000:.0f} ms, picco {peak / 2**20:.2f} MB{same}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
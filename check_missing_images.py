@@ -15,7 +15,10 @@ Options:
 import os
 import json
 import argparse
-from collections import defaultdict
+
+from asset_index import build_asset_index, list_dir, relative_to_root
+from catalog_stream import iter_records
+from profiling import Profiler, add_profile_argument
 
 
 def build_filename(ufficio, extra, ext='.jpeg'):
@@ -32,67 +35,74 @@ def main():
     p.add_argument('--img-dir', default='regno/jpg', help='Directory containing images (default: regno/jpg)')
     p.add_argument('--out', help='Optional output CSV/JSON file to write missing entries')
     p.add_argument('--try-exts', action='store_true', help='If set, try .jpg and .png when .jpeg missing')
+    add_profile_argument(p)
     args = p.parse_args()
+    profiler = Profiler('check_missing_images', enabled=args.profile)
 
     if not os.path.exists(args.json):
         return
 
-    with open(args.json, 'r', encoding='utf-8') as fh:
-        data = json.load(fh)
-
-    # Map expected filename -> list of records that reference it
-    expected = defaultdict(list)
-    for rec in data:
-        # Accept multiple possible keys for ufficio/extra
-        uff = rec.get('Targhetta Ufficio') or rec.get('Ufficio') or rec.get('ufficio')
-        extra = rec.get('Extra') if 'Extra' in rec else rec.get('extra') if 'extra' in rec else ''
-        if uff is None:
-            continue
-        fname = build_filename(uff, extra, ext='.jpeg')
-        expected[fname].append({'record': rec, 'ufficio': uff, 'extra': extra})
-
     img_dir = args.img_dir
-    available = set(os.listdir(img_dir)) if os.path.isdir(img_dir) else set()
-
     # If directory doesn't exist, exit silently
     if not os.path.isdir(img_dir):
         return
 
-    missing = {}
-    for fname, recs in expected.items():
+    # Read the listing from the shared asset index (only changed dirs are rescanned)
+    with profiler.phase('listing') as ph:
+        index = build_asset_index()
+        rel = relative_to_root(index, img_dir)
+        available = set(list_dir(index, rel)) if rel is not None else set(os.listdir(img_dir))
+        ph['files'] = len(available)
+
+    def is_available(fname):
         if fname in available:
-            continue
-        found = None
+            return True
         if args.try_exts:
             base = os.path.splitext(fname)[0]
-            for ext in ('.jpeg', '.jpg', '.png'):
-                cand = base + ext
-                if cand in available:
-                    found = cand
-                    break
-        if not found:
-            missing[fname] = recs
-
-    total_unique = len(expected)
-    total_missing = len(missing)
-    total_records = len(data)
-    total_missing_records = sum(len(v) for v in missing.values())
-
-    if args.out:
-        out = args.out
-        if out.lower().endswith('.json'):
-            with open(out, 'w', encoding='utf-8') as fh:
-                json.dump({k: [r['record'] for r in v] for k, v in missing.items()}, fh, ensure_ascii=False, indent=2)
-        else:
-            # write simple CSV
-            import csv
-            with open(out, 'w', newline='', encoding='utf-8') as fh:
-                writer = csv.writer(fh)
-                writer.writerow(['filename', 'count', 'sample_descr'])
-                for k, v in missing.items():
-                    sample = v[0]['record']
-                    writer.writerow([k, len(v), sample.get('Descrizione') or ''])
-    # Silent: do not print anything to stdout
+            return any(base + ext in available for ext in ('.jpeg', '.jpg', '.png'))
+        return False
+
+    # Single streaming pass over the records: only the missing entries are kept
+    # (all their records for a JSON report, count and first description for CSV)
+    keep_records = bool(args.out) and args.out.lower().endswith('.json')
+    with profiler.phase('scan') as ph:
+        missing = {}
+        n_records = 0
+        for rec in iter_records(args.json):
+            n_records += 1
+            # Accept multiple possible keys for ufficio/extra
+            uff = rec.get('Targhetta Ufficio') or rec.get('Ufficio') or rec.get('ufficio')
+            extra = rec.get('Extra') if 'Extra' in rec else rec.get('extra') if 'extra' in rec else ''
+            if uff is None:
+                continue
+            fname = build_filename(uff, extra, ext='.jpeg')
+            entry = missing.get(fname)
+            if entry is None:
+                if is_available(fname):
+                    continue
+                entry = missing[fname] = {'count': 0, 'sample_descr': rec.get('Descrizione') or '', 'records': []}
+            entry['count'] += 1
+            if keep_records:
+                entry['records'].append(rec)
+        ph['files'] = 1
+        ph['records'] = n_records
+
+    with profiler.phase('write'):
+        if args.out:
+            out = args.out
+            if out.lower().endswith('.json'):
+                with open(out, 'w', encoding='utf-8') as fh:
+                    json.dump({k: v['records'] for k, v in missing.items()}, fh, ensure_ascii=False, indent=2)
+            else:
+                # write simple CSV
+                import csv
+                with open(out, 'w', newline='', encoding='utf-8') as fh:
+                    writer = csv.writer(fh)
+                    writer.writerow(['filename', 'count', 'sample_descr'])
+                    for k, v in missing.items():
+                        writer.writerow([k, v['count'], v['sample_descr']])
+    # Silent: do not print anything to stdout (except the --profile summary)
+    profiler.finish()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Report delle scansioni duplicate (duplicate_images.csv, accanto a
+unreferenced_regno_images.csv).
+
+Per ogni immagine delle cartelle di SOURCE_DIRS si calcolano l'hash SHA-256
+del contenuto e, se Pillow è installato, un hash percettivo (dHash a 256 bit:
+confronto di luminosità tra pixel vicini su una riduzione 17x16 in scala di
+grigi), che resta quasi uguale per la stessa immagine ricompressa, ridimensionata
+o salvata in un altro formato. Le scansioni hanno tutte lo stesso impianto
+(cartolina, annullo, targhetta): con il dHash classico a 64 bit scansioni
+diverse finiscono a pochi bit di distanza, a 256 bit le copie della stessa
+scansione restano intorno a 20 e le targhette diverse sopra 45. Gli hash sono calcolati in parallelo e messi in
+cache in .cache/duplicates_state.json per (path, dimensione, mtime): le
+esecuzioni successive elaborano solo i file nuovi o modificati.
+
+Due immagini sono nello stesso gruppo se hanno lo stesso SHA-256 oppure dHash
+a distanza di Hamming <= --threshold (raggruppamento transitivo). Le coppie
+vicine si cercano confrontando tutti i dHash distinti (XOR e popcount su
+interi a 256 bit: meno di un secondo per le ~2.400 scansioni attuali); un
+indice a fasce non aiuta, perché con soglia 32 le fasce sarebbero di 8 bit e
+tutte le scansioni, così simili, vi si sovrappongono.
+
+Colonne del CSV: group, kind (exact se tutte le copie sono identiche, near
+altrimenti), image_path, bytes, sha256, dhash, distance (dal dHash della
+prima immagine del gruppo). I file vuoti sono ignorati. Senza Pillow si
+trovano solo i duplicati esatti.
+
+Uso:
+  python3 duplicate_images.py [--jobs N] [--threshold 32] [--force] [DIR ...]
+"""
+
+import io
+import os
+import csv
+import sys
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageFile
+    # alcune scansioni sono troncate: i browser le mostrano comunque, qui idem
+    ImageFile.LOAD_TRUNCATED_IMAGES = True
+except ImportError:  # opzionale: senza Pillow solo duplicati esatti
+    Image = None
+
+from asset_index import PROJECT_ROOT, CACHE_DIR, IMAGE_EXTENSIONS, build_asset_index, list_dir
+from output_files import write_if_changed
+from sections import SECTIONS
+
+SOURCE_DIRS = [d for s in SECTIONS for d in s.image_dirs] + ['static/jpeg/falsi']
+OUT_CSV = PROJECT_ROOT / 'duplicate_images.csv'
+STATE_FILE = CACHE_DIR / 'duplicates_state.json'
+STATE_VERSION = 1
+HASH_SIZE = 16                      # dHash di HASH_SIZE x HASH_SIZE bit
+HASH_BITS = HASH_SIZE * HASH_SIZE
+DEFAULT_THRESHOLD = 32
+# formati che Pillow non legge senza plugin: solo SHA-256
+NO_DHASH_EXTENSIONS = {'.svg'}
+
+
+def dhash(im):
+    """dHash a HASH_BITS bit di un'immagine Pillow, come intero."""
+    # decodifica JPEG ridotta: basta una versione piccola
+    im.draft('L', (HASH_SIZE * 8, HASH_SIZE * 8))
+    width = HASH_SIZE + 1
+    small = im.convert('L').resize((width, HASH_SIZE), Image.LANCZOS).tobytes()
+    bits = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            bits = (bits << 1) | (small[row * width + col] > small[row * width + col + 1])
+    return bits
+
+
+def hash_file(path):
+    """Lavoro eseguito nei processi figli: (sha256, dHash esadecimale o None)."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    sha = hashlib.sha256(data).hexdigest()
+    perceptual = None
+    if Image is not None and os.path.splitext(path)[1].lower() not in NO_DHASH_EXTENSIONS:
+        try:
+            with Image.open(io.BytesIO(data)) as im:
+                perceptual = f'{dhash(im):0{HASH_BITS // 4}x}'
+        except Exception:
+            pass
+    return sha, perceptual
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+def near_pairs(hashes, threshold):
+    """Coppie (i, j), i < j, di hash a distanza di Hamming <= threshold."""
+    pairs = []
+    for i, a in enumerate(hashes):
+        for j in range(i + 1, len(hashes)):
+            if (a ^ hashes[j]).bit_count() <= threshold:
+                pairs.append((i, j))
+    return pairs
+
+
+def group_duplicates(entries, threshold):
+    """`entries`: {path: {'bytes', 'sha256', 'dhash'}}. Ritorna i gruppi di
+    almeno due path (ognuno ordinato), ordinati per primo path."""
+    parent = {p: p for p in entries}
+
+    def find(p):
+        while parent[p] != p:
+            parent[p] = parent[parent[p]]
+            p = parent[p]
+        return p
+
+    def union(a, b):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+
+    by_key = {}
+    for path, e in entries.items():
+        by_key.setdefault(('sha', e['sha256']), []).append(path)
+        if e['dhash'] is not None:
+            by_key.setdefault(('dhash', e['dhash']), []).append(path)
+    for paths in by_key.values():
+        for other in paths[1:]:
+            union(paths[0], other)
+
+    distinct = sorted({e['dhash'] for e in entries.values() if e['dhash'] is not None})
+    values = [int(h, 16) for h in distinct]
+    for i, j in near_pairs(values, threshold):
+        union(by_key[('dhash', distinct[i])][0], by_key[('dhash', distinct[j])][0])
+
+    groups = {}
+    for path in sorted(entries):
+        groups.setdefault(find(path), []).append(path)
+    return [g for g in groups.values() if len(g) > 1]
+
+
+def report_rows(groups, entries):
+    rows = []
+    for n, paths in enumerate(groups, 1):
+        kind = 'exact' if len({entries[p]['sha256'] for p in paths}) == 1 else 'near'
+        first = entries[paths[0]]['dhash']
+        for p in paths:
+            e = entries[p]
+            distance = hamming(int(first, 16), int(e['dhash'], 16)) if first and e['dhash'] else ''
+            rows.append([n, kind, p, e['bytes'], e['sha256'], e['dhash'] or '', distance])
+    return rows
+
+
+def load_state():
+    """{path: {'size', 'mtime', 'sha256', 'dhash', 'pil'}} dell'esecuzione precedente."""
+    try:
+        with open(STATE_FILE, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if state.get('version') != STATE_VERSION or state.get('hash_bits') != HASH_BITS:
+        return {}
+    return state['files']
+
+
+def save_state(files):
+    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = STATE_FILE.with_name(STATE_FILE.name + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'version': STATE_VERSION, 'hash_bits': HASH_BITS, 'files': files}, f, separators=(',', ':'))
+    os.replace(tmp, STATE_FILE)
+
+
+def main():
+    p = argparse.ArgumentParser(description='Trova le scansioni duplicate o quasi uguali')
+    p.add_argument('dirs', nargs='*', default=SOURCE_DIRS, help='Cartelle da confrontare (default: cartelle immagini)')
+    p.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='Processi paralleli (default: numero di CPU)')
+    p.add_argument('--threshold', type=int, default=DEFAULT_THRESHOLD,
+                   help=f'Distanza massima tra dHash per le immagini quasi uguali (default: {DEFAULT_THRESHOLD})')
+    p.add_argument('--force', action='store_true', help='Ricalcola tutti gli hash')
+    args = p.parse_args()
+
+    if Image is None:
+        print("ℹ Pillow non installato (pip install pillow): solo duplicati esatti")
+
+    state = {} if args.force else load_state()
+    index = build_asset_index()
+    entries = {}
+    todo = []      # (rel, size, mtime)
+    for d in args.dirs:
+        if not (PROJECT_ROOT / d).is_dir():
+            continue
+        for name in sorted(list_dir(index, d)):
+            ext = os.path.splitext(name)[1].lower()
+            if ext not in IMAGE_EXTENSIONS:
+                continue
+            rel = f'{d}/{name}'
+            st = (PROJECT_ROOT / rel).stat()
+            if st.st_size == 0:
+                continue
+            prev = state.get(rel)
+            # un hash calcolato senza Pillow va rifatto quando Pillow c'è
+            if (prev and prev['size'] == st.st_size and prev['mtime'] == st.st_mtime_ns
+                    and (prev['pil'] or Image is None)):
+                entries[rel] = {'bytes': st.st_size, 'sha256': prev['sha256'], 'dhash': prev['dhash']}
+                continue
+            todo.append((rel, st.st_size, st.st_mtime_ns))
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+            results = pool.map(hash_file, [str(PROJECT_ROOT / rel) for rel, _, _ in todo], chunksize=16)
+            for (rel, size, mtime), (sha, perceptual) in zip(todo, results):
+                state[rel] = {'size': size, 'mtime': mtime, 'sha256': sha, 'dhash': perceptual,
+                              'pil': Image is not None}
+                entries[rel] = {'bytes': size, 'sha256': sha, 'dhash': perceptual}
+    for rel in [r for r in state if r not in entries and any(r.startswith(f'{d}/') for d in args.dirs)]:
+        del state[rel]
+    save_state(state)
+
+    groups = group_duplicates(entries, args.threshold)
+    rows = report_rows(groups, entries)
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(['group', 'kind', 'image_path', 'bytes', 'sha256', 'dhash', 'distance'])
+    writer.writerows(rows)
+    state_msg = 'aggiornato' if write_if_changed(OUT_CSV, out.getvalue()) else 'invariato'
+
+    # copie identiche: file con lo stesso SHA-256 di un file precedente
+    seen, copies, wasted = set(), 0, 0
+    for rel in sorted(entries):
+        e = entries[rel]
+        if e['sha256'] in seen:
+            copies += 1
+            wasted += e['bytes']
+        seen.add(e['sha256'])
+    print(f"✓ {OUT_CSV.name}: {len(groups)} gruppi, {copies} copie identiche ({wasted / 1024:.0f} KB); "
+          f"{len(entries)} immagini, {len(todo)} elaborate, {state_msg}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
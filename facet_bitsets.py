@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+Bitset per i valori dei filtri a selezione multipla delle pagine del catalogo
+(<sezione>.facets.json, letti da catalog.js).
+
+Per ogni campo di FACET_FIELDS e ogni suo valore si scrive l'insieme delle
+posizioni dei record (nell'ordine del JSON della sezione, lo stesso di `data`
+in catalog.js) che hanno quel valore. I valori sono confrontati come stringhe,
+come String(v) in catalog.js; un record con un elenco di valori compare nel
+bitset di ognuno.
+
+Contratto del formato:
+
+  {
+    "format": "facets-rle-v1",
+    "catalog": "<versione>",       versione del JSON (catalog_stream.catalog_version)
+    "count": N,
+    "fields": {
+      "<campo>": {"values": [v0, v1, ...], "runs": [[z, u, z, u, ...], ...]}
+    }
+  }
+
+runs[i] è il bitset del valore values[i] codificato a lunghezze di sequenza:
+alternativamente numero di posizioni assenti e presenti, a partire da quelle
+assenti (quindi il primo elemento può essere 0); le posizioni dopo l'ultima
+sequenza sono assenti.
+
+Con i bitset il filtro diventa: OR dei valori scelti di un campo, AND tra i
+campi, e il numero di record di un'opzione è il popcount del suo bitset in AND
+con i filtri degli altri campi. I filtri su campi senza bitset (es.
+Descrizione) si applicano ai soli record rimasti. filter_linear e
+options_linear riproducono filtraDati e valoriPossibiliCampo di catalog.js
+senza bitset; con --verify si confrontano con la versione a bitset su alcuni
+casi fissi (nessun filtro, valori inesistenti, campi senza bitset, bitset di
+un'altra versione del catalogo, anche con lo stesso numero di record, che
+come in catalog.js vanno ignorati) e su combinazioni casuali di filtri. Gli
+stessi casi passano poi per filtraDati e valoriPossibiliCampo di catalog.js,
+eseguiti con node con e senza bitset (decodifica delle sequenze, OR/AND,
+popcount); se node non c'è questa parte viene saltata. Codice 1 se un
+risultato differisce. La verifica richiede decine di secondi e non fa parte
+di release.py: va lanciata a parte dopo modifiche a questo script o ai filtri
+di catalog.js.
+
+I bitset si costruiscono in un solo passaggio sui record raccogliendo, per
+ogni valore, l'elenco crescente delle posizioni, da cui si ricavano
+direttamente le sequenze: il costo è lineare nel numero di record (un
+intero Python aggiornato a ogni record verrebbe copiato ogni volta).
+
+Uso:
+  python3 facet_bitsets.py [--verify] [JSON ...]
+"""
+
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import subprocess
+from pathlib import Path
+
+from output_files import dump, write_if_changed
+from catalog_stream import iter_records, catalog_version
+from sections import SECTIONS
+
+SECTION_JSONS = [s.json_path for s in SECTIONS]
+FACET_FIELDS = ['Anno', 'Località', 'Denominazione ufficio', 'Datario', 'Targhetta Tipo']
+# campi filtrabili nelle pagine del catalogo (colonne di #trTitoli)
+FILTER_FIELDS = ['Targhetta Tipo', 'Targhetta Ufficio', 'extra', 'Descrizione', 'Anno',
+                 'Località', 'Denominazione ufficio', 'Datario']
+
+FORMAT = 'facets-rle-v1'
+VERIFY_CASES = 300
+CATALOG_JS = Path(__file__).resolve().parent / 'catalog.js'
+
+# Filtri di catalog.js eseguiti con node: la sezione "Filtraggio dati" dello
+# script (fino agli aggiornamenti del DOM) valutata con data, facette e
+# ricerca vuota; su stdin {script, records, facets, fields, cases}, su stdout
+# per ogni caso [posizioni, {campo: valori possibili}], senza e con bitset.
+NODE_CHECK = r'''
+const fs = require("fs");
+const input = JSON.parse(fs.readFileSync(0, "utf8"));
+const src = fs.readFileSync(input.script, "utf8");
+const inizio = src.indexOf("  // ── Filtraggio dati");
+const fine = src.indexOf("  // ── Aggiorna opzioni filtri a cascata");
+if (inizio < 0 || fine < inizio) throw new Error("sezione dei filtri non trovata in " + input.script);
+let data = input.records, facette = null, risultatiRicerca = null;
+const inRicerca = () => true;
+eval(src.slice(inizio, fine));
+const posizione = new Map(data.map((r, i) => [r, i]));
+const risultati = () => input.cases.map((filtri) => [
+  filtraDati(data, filtri).map((r) => posizione.get(r)),
+  Object.fromEntries(input.fields.map((campo) => [campo, [...valoriPossibiliCampo(filtri, campo)]])),
+]);
+const linear = risultati();
+facette = input.facets;
+process.stdout.write(JSON.stringify({ linear, bitset: risultati() }));
+'''
+
+
+def js_string(v):
+    """String(v) di JavaScript per i valori JSON."""
+    if v is None:
+        return 'null'
+    if isinstance(v, bool):
+        return 'true' if v else 'false'
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v)
+
+
+def _values(rec, field):
+    v = rec.get(field)
+    if v is None:
+        return []
+    return [js_string(x) for x in v] if isinstance(v, list) else [js_string(v)]
+
+
+def popcount(bits):
+    return bin(bits).count('1')
+
+
+def positions(bits):
+    return [i for i, c in enumerate(reversed(bin(bits)[2:])) if c == '1']
+
+
+def from_positions(pos_list):
+    bits = 0
+    for p in pos_list:
+        bits |= 1 << p
+    return bits
+
+
+def rle_encode(pos_list):
+    """Sequenze [assenti, presenti, ...] da un elenco crescente di posizioni."""
+    runs = []
+    end = 0       # prima posizione dopo l'ultima sequenza chiusa
+    start = None  # inizio della sequenza di presenti in corso
+    last = None
+    for p in pos_list:
+        if start is not None and p == last + 1:
+            last = p
+            continue
+        if start is not None:
+            runs += [start - end, last + 1 - start]
+            end = last + 1
+        start = last = p
+    if start is not None:
+        runs += [start - end, last + 1 - start]
+    return runs
+
+
+def rle_decode(runs):
+    bits = 0
+    pos = 0
+    for i in range(0, len(runs), 2):
+        pos += runs[i]
+        ones = runs[i + 1]
+        bits |= ((1 << ones) - 1) << pos
+        pos += ones
+    return bits
+
+
+def build_facets(records, fields=FACET_FIELDS):
+    """({campo: {valore: [posizioni crescenti]}}, numero di record), valori
+    nell'ordine di prima comparsa; `records` può essere un iteratore, letto
+    una sola volta."""
+    facets = {f: {} for f in fields}
+    count = 0
+    for pos, rec in enumerate(records):
+        count = pos + 1
+        for f in fields:
+            for v in _values(rec, f):
+                lst = facets[f].get(v)
+                if lst is None:
+                    facets[f][v] = [pos]
+                elif lst[-1] != pos:    # valore ripetuto nell'elenco dello stesso record
+                    lst.append(pos)
+    return facets, count
+
+
+def encode(records, fields=FACET_FIELDS, catalog=None):
+    facets, count = build_facets(records, fields)
+    return {
+        'format': FORMAT,
+        'catalog': catalog,
+        'count': count,
+        'fields': {f: {'values': list(vals), 'runs': [rle_encode(b) for b in vals.values()]}
+                   for f, vals in facets.items()},
+    }
+
+
+def decode(obj):
+    """Implementazione di riferimento del contratto descritto sopra."""
+    if obj.get('format') != FORMAT:
+        raise ValueError(f"formato non supportato: {obj.get('format')!r}")
+    return {f: {v: rle_decode(r) for v, r in zip(col['values'], col['runs'])}
+            for f, col in obj['fields'].items()}
+
+
+# ── Semantica attuale di catalog.js (scansione di tutti i record) ──────
+
+def _matches(rec, filtri, skip=None):
+    for campo, accettati in filtri.items():
+        if campo == skip:
+            continue
+        val = rec.get(campo)
+        if isinstance(val, list):
+            if not any(js_string(v) in accettati for v in val):
+                return False
+        elif js_string(val) not in accettati:
+            return False
+    return True
+
+
+def filter_linear(records, filtri):
+    """filtraDati: posizioni dei record che passano tutti i filtri."""
+    return [pos for pos, rec in enumerate(records) if _matches(rec, filtri)]
+
+
+def options_linear(records, filtri, campo):
+    """aggiornaOpzioniFiltri: {valore: record} di `campo` tra i record che
+    passano i filtri degli altri campi."""
+    counts = {}
+    for rec in records:
+        if _matches(rec, filtri, skip=campo):
+            for v in set(_values(rec, campo)):
+                counts[v] = counts.get(v, 0) + 1
+    return counts
+
+
+# ── Versione a bitset ───────────────────────────────────────────────────
+
+def mask(facets, records, filtri, skip=None):
+    """Bitset dei record che passano i filtri (escluso `skip`): AND dei campi
+    con bitset, poi i campi senza bitset sui soli record rimasti."""
+    bits = (1 << len(records)) - 1
+    others = {}
+    for campo, accettati in filtri.items():
+        if campo == skip:
+            continue
+        if campo in facets:
+            field_bits = 0
+            for v in accettati:
+                field_bits |= facets[campo].get(v, 0)
+            bits &= field_bits
+        else:
+            others[campo] = accettati
+    if others:
+        bits = from_positions(p for p in positions(bits) if _matches(records[p], others))
+    return bits
+
+
+def usable(obj, records, catalog):
+    """Bitset decodificati, oppure None se sono di un'altra versione del
+    catalogo: come in catalog.js si filtra senza."""
+    if obj.get('catalog') != catalog or obj['count'] != len(records):
+        return None
+    return decode(json.loads(dump(obj)))
+
+
+def filter_bitsets(facets, records, filtri):
+    if facets is None:
+        return filter_linear(records, filtri)
+    return positions(mask(facets, records, filtri))
+
+
+def options_bitsets(facets, records, filtri, campo):
+    if facets is None:
+        return options_linear(records, filtri, campo)
+    bits = mask(facets, records, filtri, skip=campo)
+    if campo in facets:
+        counts = {v: popcount(b & bits) for v, b in facets[campo].items()}
+        return {v: c for v, c in counts.items() if c}
+    counts = {}
+    for p in positions(bits):
+        for v in set(_values(records[p], campo)):
+            counts[v] = counts.get(v, 0) + 1
+    return counts
+
+
+def random_filters(records, rng):
+    """Da 1 a 3 campi con 1-3 valori, presi per lo più da un record esistente."""
+    filtri = {}
+    for campo in rng.sample(FILTER_FIELDS, rng.randint(1, 3)):
+        vals = {v for rec in rng.sample(records, min(len(records), rng.randint(1, 3))) for v in _values(rec, campo)}
+        if rng.random() < 0.1:
+            vals.add('valore inesistente')
+        if vals:
+            filtri[campo] = vals
+    return filtri
+
+
+def fixed_filters(records):
+    """Casi limite: nessun filtro, solo valori inesistenti, un valore esistente
+    e uno inesistente, un campo senza bitset, campi vuoti nei record."""
+    first = records[0] if records else {}
+    cases = [{}, {'Anno': {'valore inesistente'}}, {'Località': {'valore inesistente', 'null'}}]
+    for campo in ('Località', 'Targhetta Ufficio'):
+        vals = set(_values(first, campo))
+        if vals:
+            cases.append({campo: vals | {'valore inesistente'}})
+    return cases
+
+
+def filter_fields(rec):
+    """Solo i campi filtrabili di un record (bastano a filtri e bitset)."""
+    return {c: rec[c] for c in FILTER_FIELDS if c in rec}
+
+
+def expected_results(records, filtri):
+    """Filtro e opzioni di ogni campo con la scansione lineare."""
+    return filter_linear(records, filtri), [options_linear(records, filtri, c) for c in FILTER_FIELDS]
+
+
+def check(records, obj, catalog):
+    """Confronto deterministico sui casi di fixed_filters, con i bitset del
+    catalogo e con gli stessi bitset attribuiti a un'altra versione (stesso
+    numero di record: vanno ignorati lo stesso); ritorna i casi con risultati
+    diversi."""
+    stale = {**obj, 'catalog': f'non-{catalog}'}
+    errors = []
+    for source in (obj, stale):
+        facets = usable(source, records, catalog)
+        if source is stale and facets is not None:
+            errors.append({'bitset di un\'altra versione usati': source['catalog']})
+        for filtri in fixed_filters(records):
+            expected = expected_results(records, filtri)
+            got = (filter_bitsets(facets, records, filtri),
+                   [options_bitsets(facets, records, filtri, c) for c in FILTER_FIELDS])
+            if got != expected:
+                errors.append(filtri)
+    return errors
+
+
+def check_js(records, obj, cases, expected, script=CATALOG_JS):
+    """Confronta filtraDati e valoriPossibiliCampo di catalog.js (con node,
+    senza e con i bitset `obj`) con i risultati attesi dei casi; ritorna i
+    casi con risultati diversi, None se node non è installato."""
+    node = shutil.which('node')
+    if node is None:
+        return None
+    payload = dump({'script': str(script), 'records': records, 'facets': obj, 'fields': FILTER_FIELDS,
+                    'cases': [{c: sorted(v) for c, v in filtri.items()} for filtri in cases]})
+    run = subprocess.run([node, '-e', NODE_CHECK], input=payload.encode('utf-8'), capture_output=True)
+    if run.returncode != 0:
+        raise SystemExit(f"ERRORE: verifica di catalog.js con node fallita:\n{run.stderr.decode('utf-8', 'replace')}")
+    out = json.loads(run.stdout)
+    errors = []
+    for filtri, (positions_exp, options_exp), *got in zip(cases, expected, out['linear'], out['bitset']):
+        want = [positions_exp, {c: sorted(o) for c, o in zip(FILTER_FIELDS, options_exp)}]
+        if any([pos, {c: sorted(v) for c, v in opts.items()}] != want for pos, opts in got):
+            errors.append(filtri)
+    return errors
+
+
+def verify(records, obj, catalog, cases=VERIFY_CASES, seed=1):
+    """Confronta filtri e opzioni della versione a bitset (dal JSON codificato)
+    con la scansione lineare, prima sui casi fissi di check() poi su `cases`
+    combinazioni casuali, e gli stessi casi con catalog.js (check_js);
+    ritorna (errori, errori di catalog.js o None, ms lineare, ms bitset)."""
+    facets = usable(obj, records, catalog)
+    rng = random.Random(seed)
+    errors = check(records, obj, catalog)
+    all_cases = fixed_filters(records)
+    expected = [expected_results(records, filtri) for filtri in all_cases]
+    linear_s = bitset_s = 0.0
+    for _ in range(cases):
+        filtri = random_filters(records, rng)
+        t0 = time.perf_counter()
+        want = expected_results(records, filtri)
+        t1 = time.perf_counter()
+        got = (filter_bitsets(facets, records, filtri), [options_bitsets(facets, records, filtri, c) for c in FILTER_FIELDS])
+        t2 = time.perf_counter()
+        linear_s += t1 - t0
+        bitset_s += t2 - t1
+        if got != want:
+            errors.append(filtri)
+        all_cases.append(filtri)
+        expected.append(want)
+    js_errors = check_js(records, obj, all_cases, expected)
+    return errors, js_errors, linear_s * 1000 / cases, bitset_s * 1000 / cases
+
+
+def main():
+    p = argparse.ArgumentParser(description='Genera i bitset dei valori dei filtri delle sezioni del catalogo')
+    p.add_argument('json', nargs='*', default=SECTION_JSONS, help='JSON da elaborare (default: tutte le sezioni)')
+    p.add_argument('--verify', action='store_true',
+                   help='Confronta i filtri a bitset (Python e catalog.js con node) con la scansione lineare '
+                        'su casi limite e combinazioni casuali')
+    args = p.parse_args()
+
+    ok = True
+    for path in args.json:
+        json_path = Path(path)
+        if not json_path.exists():
+            continue
+        records = iter_records(json_path)
+        if args.verify:
+            # la verifica rilegge i record più volte: se ne tengono i soli campi filtrabili
+            records = [filter_fields(rec) for rec in records]
+        catalog = catalog_version(json_path)
+        obj = encode(records, catalog=catalog)
+        payload = dump(obj)
+        out = json_path.with_name(json_path.stem + '.facets.json')
+        state = 'aggiornato' if write_if_changed(out, payload) else 'invariato'
+        n_values = sum(len(col['values']) for col in obj['fields'].values())
+        print(f"✓ {out.as_posix()} ({obj['count']} record, {n_values} valori): "
+              f"{len(payload.encode('utf-8')) / 1024:.1f} KB, {state}")
+        if args.verify:
+            errors, js_errors, linear_ms, bitset_ms = verify(records, obj, catalog)
+            if errors:
+                ok = False
+                print(f"✗ {len(errors)} combinazioni di filtri con risultati diversi, es. {errors[0]}")
+            else:
+                print(f"  ✓ casi limite e {VERIFY_CASES} combinazioni casuali identici alla scansione lineare "
+                      f"(filtro + opzioni: lineare {linear_ms:.2f} ms, bitset {bitset_ms:.2f} ms)")
+            if js_errors is None:
+                print("  ℹ node non installato: filtri di catalog.js non verificati")
+            elif js_errors:
+                ok = False
+                print(f"✗ catalog.js: {len(js_errors)} combinazioni di filtri con risultati diversi, es. {js_errors[0]}")
+            else:
+                print("  ✓ catalog.js (node): stessi risultati, con e senza bitset")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
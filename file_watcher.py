@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Osservazione dei file del progetto per le modalità --watch degli script.
+
+Su Linux usa inotify (tramite ctypes, senza dipendenze): una watch per ogni
+cartella non esclusa da asset_index.SKIP_DIRS, aggiunte man mano che nascono
+nuove cartelle. Altrove, o se inotify non è disponibile (limite di watch,
+file system di rete), si ripiega sul polling: a ogni intervallo l'indice dei
+file (asset_index.py) viene aggiornato rileggendo solo le cartelle il cui
+mtime è cambiato. Un file riscritto sul posto non cambia l'mtime della sua
+cartella: per questo a ogni intervallo si controllano anche dimensione e mtime
+dei file indicati esplicitamente (es. i JSON delle sezioni) e di tutti i file
+delle cartelle indicate (es. le cartelle delle scansioni), confrontandoli con
+quelli registrati nell'indice. Le altre riscritture sul posto sfuggono al
+polling: per quelle serve inotify.
+
+Gli eventi sono coppie (tipo, path relativo Posix) con tipo:
+  created   file creato o spostato dentro l'albero
+  deleted   file rimosso o spostato fuori
+  modified  file riscritto
+  resync    lo stato non è più affidabile (coda inotify piena, cartella
+            rimossa o spostata): chi osserva deve riallinearsi da capo
+
+batches() raggruppa le raffiche di eventi (debounce) in un dict path -> tipo.
+
+Uso:
+  python3 file_watcher.py [--polling] [--debounce 0.2]
+"""
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import argparse
+import ctypes
+import ctypes.util
+
+from asset_index import PROJECT_ROOT, SKIP_DIRS, build_asset_index
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def _skipped(rel):
+    return any(part in SKIP_DIRS for part in rel.split('/'))
+
+
+def _join(base, name):
+    return f'{base}/{name}' if base else name
+
+
+def _load_libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1, libc.inotify_add_watch, libc.inotify_rm_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class InotifyWatcher:
+    kind = 'inotify'
+
+    def __init__(self, root=PROJECT_ROOT):
+        self.libc = _load_libc()
+        if self.libc is None:
+            raise OSError(errno.ENOSYS, 'inotify non disponibile')
+        self.root = str(root)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1')
+        self.wds = {}       # wd -> cartella relativa
+        try:
+            self._add_tree('')
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def _add_watch(self, rel):
+        path = os.path.join(self.root, rel).encode('utf-8', 'surrogateescape')
+        wd = self.libc.inotify_add_watch(self.fd, path, WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR):
+                return
+            raise OSError(err, f'inotify_add_watch {rel or "."}: {os.strerror(err)}')
+        self.wds[wd] = rel
+
+    def _add_tree(self, rel):
+        """Aggiunge le watch per `rel` e le sue sottocartelle; ritorna i file trovati."""
+        files = []
+        stack = [rel]
+        while stack:
+            d = stack.pop()
+            self._add_watch(d)
+            try:
+                entries = list(os.scandir(os.path.join(self.root, d)))
+            except OSError:
+                continue
+            for entry in entries:
+                child = _join(d, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in SKIP_DIRS:
+                        stack.append(child)
+                elif entry.is_file():
+                    files.append(child)
+        return files
+
+    def _drop_tree(self, rel):
+        prefix = f'{rel}/'
+        for wd, d in list(self.wds.items()):
+            if d == rel or d.startswith(prefix):
+                self.libc.inotify_rm_watch(self.fd, wd)
+                self.wds.pop(wd, None)
+
+    def read(self, timeout=None):
+        """Eventi disponibili entro `timeout` secondi (None = attende)."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        data = b''
+        while True:
+            try:
+                chunk = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            if not chunk:
+                break
+            data += chunk
+        events = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode('utf-8', 'surrogateescape')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                events.append(('resync', ''))
+                continue
+            if mask & IN_IGNORED:
+                self.wds.pop(wd, None)
+                continue
+            base = self.wds.get(wd)
+            if base is None or not name:
+                continue
+            rel = _join(base, name)
+            if _skipped(rel):
+                continue
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    events.extend(('created', f) for f in self._add_tree(rel))
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._drop_tree(rel)
+                    events.append(('resync', rel))
+            elif mask & (IN_CREATE | IN_MOVED_TO):
+                events.append(('created', rel))
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                events.append(('deleted', rel))
+            elif mask & IN_CLOSE_WRITE:
+                events.append(('modified', rel))
+        return events
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+class PollingWatcher:
+    kind = 'polling'
+
+    def __init__(self, root=PROJECT_ROOT, files=(), dirs=(), interval=1.0):
+        self.root = root
+        self.interval = interval
+        self.index = build_asset_index(root, cache_path=None)
+        self.files = {f: _stamp(os.path.join(root, f)) for f in files}
+        self.dirs = tuple(d.strip('/') for d in dirs)
+        self.next_poll = time.monotonic() + interval
+
+    def _poll(self):
+        old = self.index
+        new = self.index = build_asset_index(self.root, cache_path=None, previous=old)
+        events = []
+        # le cartelle non rilette sono lo stesso oggetto dell'indice precedente
+        for rel in old['dirs'].keys() | new['dirs'].keys():
+            before, after = old['dirs'].get(rel), new['dirs'].get(rel)
+            if before is after:
+                continue
+            before_files = before['files'] if before else {}
+            after_files = after['files'] if after else {}
+            for name in sorted(before_files.keys() | after_files.keys()):
+                f = _join(rel, name)
+                if name not in after_files:
+                    events.append(('deleted', f))
+                elif name not in before_files:
+                    events.append(('created', f))
+                elif before_files[name] != after_files[name]:
+                    events.append(('modified', f))
+        # file riscritti sul posto nelle cartelle non rilette
+        for rel, entry in new['dirs'].items():
+            if old['dirs'].get(rel) is not entry or not any(rel == d or rel.startswith(f'{d}/') for d in self.dirs):
+                continue
+            files = entry['files']
+            for name, stamp in files.items():
+                now = _stamp(os.path.join(self.root, rel, name))
+                if now is not None and now != stamp:
+                    files[name] = now
+                    events.append(('modified', _join(rel, name)))
+        seen = {f for _, f in events}
+        for f, stamp in self.files.items():
+            now = _stamp(os.path.join(self.root, f))
+            if now != stamp:
+                self.files[f] = now
+                if f not in seen and now is not None and stamp is not None:
+                    events.append(('modified', f))
+        return events
+
+    def read(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            if now >= self.next_poll:
+                self.next_poll = now + self.interval
+                events = self._poll()
+                if events:
+                    return events
+            wait = self.next_poll - now
+            if deadline is not None:
+                if now >= deadline:
+                    return []
+                wait = min(wait, deadline - now)
+            time.sleep(max(0.0, wait))
+
+    def close(self):
+        pass
+
+
+def open_watcher(root=PROJECT_ROOT, files=(), dirs=(), polling=False, interval=1.0):
+    """InotifyWatcher se possibile, altrimenti PollingWatcher (che controlla
+    a ogni intervallo i file `files` e quelli delle cartelle `dirs`)."""
+    if not polling:
+        try:
+            return InotifyWatcher(root)
+        except OSError as exc:
+            print(f"ℹ inotify non utilizzabile ({exc}): uso il polling ogni {interval:g} s")
+    return PollingWatcher(root, files=files, dirs=dirs, interval=interval)
+
+
+def batches(watcher, debounce=0.2, max_delay=2.0):
+    """Genera (modifiche, istante del primo evento): modifiche è un dict
+    path -> tipo con gli eventi arrivati finché non passano `debounce`
+    secondi senza altri eventi (al massimo `max_delay` secondi)."""
+    while True:
+        events = watcher.read(None)
+        if not events:
+            continue
+        first = time.monotonic()
+        pending = {}
+        while True:
+            for kind, rel in events:
+                # un file creato e poi riscritto resta "creato"
+                if not (kind == 'modified' and pending.get(rel) == 'created'):
+                    pending[rel] = kind
+            remaining = min(debounce, first + max_delay - time.monotonic())
+            if remaining <= 0:
+                break
+            events = watcher.read(remaining)
+            if not events:
+                break
+        yield pending, first
+
+
+def main():
+    p = argparse.ArgumentParser(description='Stampa le modifiche ai file del progetto (prova del watcher)')
+    p.add_argument('--polling', action='store_true', help='Usa il polling anche se inotify è disponibile')
+    p.add_argument('--interval', type=float, default=1.0, help='Intervallo del polling in secondi (default: 1)')
+    p.add_argument('--debounce', type=float, default=0.2, help='Attesa dopo l\'ultimo evento in secondi (default: 0.2)')
+    args = p.parse_args()
+
+    watcher = open_watcher(polling=args.polling, interval=args.interval)
+    print(f"ℹ In ascolto su {PROJECT_ROOT} ({watcher.kind}), Ctrl+C per terminare")
+    try:
+        for changes, _ in batches(watcher, args.debounce):
+            for rel, kind in sorted(changes.items()):
+                print(f"  {kind:<9} {rel}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
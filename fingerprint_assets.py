@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Copie con impronta del contenuto (content hash) degli asset caricati dalle
+pagine, per poterli servire come immutabili.
+
+Per ogni file di ASSETS si scrive accanto all'originale una copia
+<nome>.<hash>.<ext> (primi HASH_LEN caratteri dello SHA-256 del contenuto),
+con le varianti precompresse .gz e, se il modulo `brotli` è installato, .br.
+Un URL con hash cambia solo se cambia il contenuto: le copie possono essere
+messe in cache senza scadenza (Cache-Control: immutable, dove l'hosting lo
+permette) e dopo un rilascio il browser scarica subito i file nuovi.
+
+Poi i riferimenti negli HTML e JS del sito (src/href, fetch, jsonFile di
+CATALOG_CONFIG, ...) vengono riscritti verso le copie, secondo il manifest
+asset-manifest.json ({path originale: path con hash}). Si riscrive ogni
+stringa tra virgolette il cui path, risolto rispetto al file (o al suo
+<base href>) o alla radice se inizia con "/", è un asset con o senza hash:
+rieseguire lo script con gli stessi contenuti non cambia nulla, e un nuovo
+hash sostituisce il precedente. Gli originali restano i file da modificare;
+un asset JS o CSS viene riscritto prima di calcolarne l'hash (ASSETS è in
+ordine: prima i file a cui altri asset fanno riferimento). Le copie non più
+nel manifest vengono rimosse.
+
+L'ultimo asset è la lista di precache del service worker (sw.js),
+precache-manifest.json: {"urls": [...]} con le copie con hash di JS e CSS e
+l'ultima patch di ogni JSON di sezione (catalog_delta.py), scritta qui
+quando gli hash degli altri asset sono noti. sw.js la carica con il suo nome
+con hash: quando la lista cambia cambia anche sw.js e il browser installa la
+nuova versione del service worker, che scarica in anticipo i file nuovi.
+
+Copie, varianti compresse, manifest e riferimenti riscritti non sono nel
+repository (.gitignore): lo script è un passo di deploy di release.py e gira
+sul checkout del deploy (.github/workflows/pages.yml). Nella copia di lavoro
+gli HTML e i JS puntano agli originali; eseguito lì riscrive file versionati,
+da ripristinare con git checkout.
+
+Uso:
+  python3 fingerprint_assets.py [--check]
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import hashlib
+import argparse
+import posixpath
+
+try:
+    import brotli
+except ImportError:  # opzionale: senza brotli si scrive solo la copia .gz
+    brotli = None
+
+from asset_index import PROJECT_ROOT, build_asset_index, iter_files
+from output_files import dump, write_if_changed
+
+ASSETS = [
+    'regno/targhetteRegno.json',
+    'static/statistics/site_stats.json',
+    'destinazioni_data.json',
+    'destinazioni_clusters.json',
+    'catalog.css',
+    'catalog.js',
+    # dopo site_stats.json, che carica
+    'catalog-stats.js',
+    # per ultima: elenca le copie con hash degli asset precedenti
+    'precache-manifest.json',
+]
+MANIFEST = PROJECT_ROOT / 'asset-manifest.json'
+PRECACHE = 'precache-manifest.json'
+HASH_LEN = 10
+# file in cui cercare i riferimenti agli asset
+REFERRER_EXTENSIONS = {'.html', '.js', '.css'}
+
+_HASHED = re.compile(rf'^(.+)\.[0-9a-f]{{{HASH_LEN}}}(\.[^.]+)(\.gz|\.br)?$')
+_QUOTED = re.compile(r'''(["'])([^"'\s<>]+)\1''')
+_BASE = re.compile(r'''<base\s+href=["']([^"']*)["']''', re.IGNORECASE)
+
+
+def hashed_name(rel, data):
+    """Path della copia con hash di `rel` per il contenuto `data`."""
+    root, ext = posixpath.splitext(rel)
+    return f'{root}.{hashlib.sha256(data).hexdigest()[:HASH_LEN]}{ext}'
+
+
+def logical_path(rel):
+    """Path originale di una copia con hash (o `rel` stesso)."""
+    m = _HASHED.match(rel)
+    return f'{m.group(1)}{m.group(2)}' if m and not m.group(3) else rel
+
+
+def _base_dir(rel, text):
+    """Cartella rispetto a cui si risolvono i path relativi di un file."""
+    base = posixpath.dirname(rel)
+    if rel.endswith('.html'):
+        m = _BASE.search(text)
+        if m:
+            href = m.group(1)
+            base = href.strip('/') if href.startswith('/') else posixpath.normpath(posixpath.join(base, href))
+    return '' if base == '.' else base
+
+
+def rewrite_references(rel, text, manifest):
+    """Testo di `rel` con i riferimenti agli asset di `manifest` puntati alle
+    copie con hash; i riferimenti di un asset a se stesso restano invariati."""
+    base = _base_dir(rel, text)
+    self_path = logical_path(rel)
+
+    def sub(m):
+        url = m.group(2)
+        if '//' in url or url.startswith(('data:', '#')):
+            return m.group(0)
+        head, sep, name = url.rpartition('/')
+        if url.startswith('/'):
+            target = url.lstrip('/')
+        else:
+            target = posixpath.normpath(posixpath.join(base, url))
+        target = logical_path(target)
+        if target == self_path or target not in manifest:
+            return m.group(0)
+        return f'{m.group(1)}{head}{sep}{posixpath.basename(manifest[target])}{m.group(1)}'
+
+    return _QUOTED.sub(sub, text)
+
+
+def _read_text(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return f.read()
+
+
+def write_copies(rel, data):
+    """Scrive la copia con hash e le varianti compresse (se mancano: il
+    contenuto di un nome con hash non cambia). Ritorna i file scritti."""
+    hashed = hashed_name(rel, data)
+    path = PROJECT_ROOT / hashed
+    variants = [(path, lambda: data), (path.with_name(path.name + '.gz'),
+                                       lambda: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append((path.with_name(path.name + '.br'), lambda: brotli.compress(data, quality=11)))
+    written = 0
+    for out, make in variants:
+        if not out.exists():
+            out.write_bytes(make())
+            written += 1
+    return hashed, written
+
+
+def remove_stale(manifest):
+    """Rimuove le copie con hash (e varianti) degli asset non più nel manifest."""
+    current = set(manifest.values())
+    removed = 0
+    for rel in manifest:
+        folder = posixpath.dirname(rel)
+        for name in os.listdir(PROJECT_ROOT / folder):
+            m = _HASHED.match(name)
+            if not m or f'{m.group(1)}{m.group(2)}' != posixpath.basename(rel):
+                continue
+            copy = posixpath.join(folder, name[:len(name) - len(m.group(3) or '')])
+            if copy not in current:
+                os.remove(PROJECT_ROOT / folder / name)
+                removed += 1
+    return removed
+
+
+def precache_list(manifest):
+    """Contenuto della lista di precache: URL delle copie con hash di JS e CSS
+    già in `manifest` e delle ultime patch dei JSON di sezione."""
+    # import locale: catalog_delta importa questo modulo
+    from catalog_delta import latest_patches
+    urls = [f'/{hashed}' for rel, hashed in manifest.items() if rel.endswith(('.js', '.css'))]
+    return dump({"urls": urls + [f'/{rel}' for rel in latest_patches()]}) + '\n'
+
+
+def referrers(asset_index):
+    """HTML, JS e CSS del sito, escluse le copie con hash."""
+    return [rel for rel in iter_files(asset_index, REFERRER_EXTENSIONS) if logical_path(rel) == rel]
+
+
+def main():
+    p = argparse.ArgumentParser(description='Copie con hash degli asset e riscrittura dei riferimenti')
+    p.add_argument('--check', action='store_true',
+                   help='Non scrive nulla: esce con codice 1 se copie o riferimenti non sono aggiornati')
+    args = p.parse_args()
+
+    if brotli is None and not args.check:
+        print("ℹ modulo brotli non installato: copie .br non generate")
+
+    manifest = {}
+    updated = []    # asset JS/CSS con riferimenti riscritti, lista di precache, copie mancanti (--check)
+    copies = 0
+    for rel in ASSETS:
+        path = PROJECT_ROOT / rel
+        if rel == PRECACHE:
+            text = precache_list(manifest)
+            if not path.exists() or _read_text(path) != text:
+                updated.append(rel)
+                if not args.check:
+                    write_if_changed(path, text)
+            data = text.encode('utf-8')
+        elif not path.exists():
+            print(f"⚠ {rel} non trovato, saltato")
+            continue
+        elif rel.endswith(('.js', '.css')):
+            text = _read_text(path)
+            new = rewrite_references(rel, text, manifest)
+            if new != text:
+                updated.append(rel)
+                if not args.check:
+                    write_if_changed(path, new)
+            data = new.encode('utf-8')
+        else:
+            data = path.read_bytes()
+        manifest[rel] = hashed_name(rel, data)
+        if args.check:
+            if not (PROJECT_ROOT / manifest[rel]).exists():
+                updated.append(manifest[rel])
+            continue
+        copies += write_copies(rel, data)[1]
+
+    rewritten = []
+    for rel in referrers(build_asset_index()):
+        if rel in manifest:
+            continue
+        text = _read_text(PROJECT_ROOT / rel)
+        new = rewrite_references(rel, text, manifest)
+        if new != text:
+            rewritten.append(rel)
+            if not args.check:
+                write_if_changed(PROJECT_ROOT / rel, new)
+
+    if args.check:
+        try:
+            up_to_date = json.loads(MANIFEST.read_text(encoding='utf-8')) == manifest
+        except (OSError, ValueError):
+            up_to_date = False
+        problems = updated + rewritten + ([] if up_to_date else [MANIFEST.name])
+        for rel in problems:
+            print(f"✗ da aggiornare: {rel}")
+        if not problems:
+            print(f"✓ {len(manifest)} asset con hash aggiornati")
+        return 1 if problems else 0
+
+    write_if_changed(MANIFEST, dump(manifest) + '\n')
+    removed = remove_stale(manifest)
+    print(f"✓ {MANIFEST.name}: {len(manifest)} asset, {copies} file scritti (copie e varianti .gz/.br), "
+          f"{len(rewritten) + len(updated)} file con riferimenti aggiornati, {removed} copie vecchie rimosse")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Gazetteer locale (senza rete) per generate_destinazioni.py.
+
+Le sorgenti sono file nel formato dei dump GeoNames (allCountries.txt,
+cities15000.txt, ...: 19 colonne separate da tab) nella cartella gazetteer/;
+gazetteer/seed.txt copre le destinazioni già presenti nel sito e i nomi
+storici o italiani dei paesi. Per una copertura completa basta aggiungere in
+gazetteer/ un dump scaricato da https://download.geonames.org/export/dump/.
+
+Le sorgenti vengono caricate in un indice SQLite (.cache/gazetteer.sqlite),
+ricostruito solo quando un file sorgente cambia. Ogni nome (principale,
+ASCII e alternativo) è indicizzato in forma normalizzata: senza accenti,
+minuscolo e solo lettere/cifre ("Città del Capo" -> "cittadelcapo").
+
+La ricerca su un testo come "Belga_Elisabethville" prova tutte le sequenze di
+parole consecutive ("belgaelisabethville", "belga", "elisabethville"), prima
+in modo esatto e poi, se nulla corrisponde, con un confronto approssimato
+(difflib) tra i nomi con le stesse prime lettere. Tra i candidati si
+preferiscono località abitate, poi suddivisioni amministrative, poi paesi, e
+a parità la popolazione maggiore; se il paese è noto si accettano solo
+località di quel paese. Le risoluzioni (anche quelle fallite) sono salvate
+nell'indice, quindi le esecuzioni successive non ripetono la ricerca.
+
+Uso:
+  python3 gazetteer.py [--rebuild] [--country PAESE] NOME ...
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import difflib
+import argparse
+import unicodedata
+from pathlib import Path
+
+from asset_index import PROJECT_ROOT, CACHE_DIR
+
+SOURCE_DIR = PROJECT_ROOT / 'gazetteer'
+DB_PATH = CACHE_DIR / 'gazetteer.sqlite'
+SCHEMA_VERSION = 1
+
+# Colonne del formato GeoNames usate
+COL_ID, COL_NAME, COL_ASCII, COL_ALT, COL_LAT, COL_LON, COL_FCLASS, COL_FCODE, COL_CC = range(9)
+COL_POPULATION = 14
+
+MIN_FUZZY_LEN = 5        # testi più corti non vengono confrontati in modo approssimato
+FUZZY_CUTOFF = 0.85
+
+
+def normalize(text):
+    """Forma di confronto di un nome: senza accenti, minuscola, solo [a-z0-9]."""
+    s = unicodedata.normalize('NFKD', str(text))
+    s = ''.join(c for c in s if not unicodedata.combining(c)).lower()
+    return re.sub(r'[^a-z0-9]+', '', s)
+
+
+def _words(text):
+    """Parole significative di un testo (senza numeri, es. anni o progressivi)."""
+    words = [w for w in re.split(r'[^0-9A-Za-zÀ-ÿ]+', str(text)) if w]
+    return [w for w in (re.sub(r'^\d+|\d+$', '', w) for w in words) if w]
+
+
+def _ngrams(words):
+    """Sequenze di parole consecutive normalizzate, dalla più lunga."""
+    out = []
+    for size in range(len(words), 0, -1):
+        for i in range(len(words) - size + 1):
+            key = normalize(''.join(words[i:i + size]))
+            if key and key not in out:
+                out.append(key)
+    return out
+
+
+def _feature_rank(fclass, fcode):
+    if fclass == 'P':
+        return 0
+    if fclass == 'A' and not fcode.startswith('PCL'):
+        return 1
+    if fclass == 'A':
+        return 3
+    return 2
+
+
+def default_sources():
+    return sorted(SOURCE_DIR.glob('*.txt')) if SOURCE_DIR.is_dir() else []
+
+
+def _fingerprint(sources):
+    fp = [SCHEMA_VERSION]
+    for path in sources:
+        st = Path(path).stat()
+        fp.append([str(path), st.st_size, st.st_mtime_ns])
+    return json.dumps(fp)
+
+
+def build_index(sources, db_path=DB_PATH):
+    """Carica le sorgenti in un nuovo database SQLite (sostituito atomicamente)."""
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = db_path.with_name(f'{db_path.name}.{os.getpid()}.tmp')
+    if tmp.exists():
+        tmp.unlink()
+    con = sqlite3.connect(tmp)
+    con.executescript("""
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE places (id INTEGER PRIMARY KEY, name TEXT, lat REAL, lon REAL,
+                             fclass TEXT, fcode TEXT, country TEXT, population INTEGER);
+        CREATE TABLE names (norm TEXT, place_id INTEGER);
+        CREATE TABLE resolved (key TEXT PRIMARY KEY, place_id INTEGER);
+    """)
+    n_places = 0
+    for path in sources:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip() or line.startswith('#'):
+                    continue
+                cols = line.rstrip('\n').split('\t')
+                if len(cols) <= COL_CC:
+                    continue
+                try:
+                    pid = int(cols[COL_ID])
+                    lat, lon = float(cols[COL_LAT]), float(cols[COL_LON])
+                except ValueError:
+                    continue
+                pop = cols[COL_POPULATION] if len(cols) > COL_POPULATION else ''
+                con.execute('INSERT OR REPLACE INTO places VALUES (?,?,?,?,?,?,?,?)',
+                            (pid, cols[COL_NAME], lat, lon, cols[COL_FCLASS], cols[COL_FCODE],
+                             cols[COL_CC], int(pop) if pop.isdigit() else 0))
+                names = {cols[COL_NAME], cols[COL_ASCII], *cols[COL_ALT].split(',')}
+                con.executemany('INSERT INTO names VALUES (?,?)',
+                                {(normalize(n), pid) for n in names if normalize(n)})
+                n_places += 1
+    con.execute('CREATE INDEX names_norm ON names (norm)')
+    con.execute('INSERT INTO meta VALUES (?,?)', ('fingerprint', _fingerprint(sources)))
+    con.commit()
+    con.close()
+    os.replace(tmp, db_path)
+    return n_places
+
+
+class Gazetteer:
+    """Ricerca di coordinate per nome sull'indice SQLite (ricostruito se serve)."""
+
+    def __init__(self, sources=None, db_path=DB_PATH, rebuild=False):
+        self.sources = default_sources() if sources is None else [Path(s) for s in sources]
+        self.db_path = Path(db_path)
+        self.con = None
+        self.rebuilt = False
+        self.cache = {}
+        self.new = {}
+        if not self.sources:
+            return
+        fp = _fingerprint(self.sources)
+        if rebuild or not self._current(fp):
+            build_index(self.sources, self.db_path)
+            self.rebuilt = True
+        self.con = sqlite3.connect(self.db_path)
+        self.cache = dict(self.con.execute('SELECT key, place_id FROM resolved'))
+
+    def _current(self, fp):
+        try:
+            con = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True)
+            try:
+                row = con.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+            finally:
+                con.close()
+        except sqlite3.Error:
+            return False
+        return row is not None and row[0] == fp
+
+    def __bool__(self):
+        return self.con is not None
+
+    def _candidates(self, keys):
+        if not keys:
+            return []
+        marks = ','.join('?' * len(keys))
+        return self.con.execute(
+            f'SELECT DISTINCT p.id, p.fclass, p.fcode, p.country, p.population FROM names n '
+            f'JOIN places p ON p.id = n.place_id WHERE n.norm IN ({marks})', keys).fetchall()
+
+    def _fuzzy_keys(self, key):
+        prefix = key[:3]
+        rows = self.con.execute('SELECT DISTINCT norm FROM names WHERE norm >= ? AND norm < ?',
+                                (prefix, prefix + '\uffff')).fetchall()
+        return difflib.get_close_matches(key, [r[0] for r in rows], n=3, cutoff=FUZZY_CUTOFF)
+
+    def countries(self, text):
+        """Codici paese (ISO) di un nome di paese, anche storico o in italiano."""
+        if not self or not text:
+            return set()
+        return {c[3] for c in self._candidates([normalize(text)]) if c[1] == 'A' and c[2].startswith('PCL')}
+
+    def _best(self, candidates, countries):
+        if countries:
+            candidates = [c for c in candidates if c[3] in countries]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda c: (_feature_rank(c[1], c[2]), -c[4], c[0]))[0]
+
+    def _resolve(self, text, country):
+        keys = _ngrams(_words(text))
+        countries = self.countries(country)
+        best = self._best(self._candidates(keys), countries)
+        if best is None:
+            fuzzy = [k for key in keys if len(key) >= MIN_FUZZY_LEN for k in self._fuzzy_keys(key)]
+            best = self._best(self._candidates(fuzzy), countries)
+        return best
+
+    def lookup(self, text, country=None):
+        """Ritorna (lat, lon, nome) del luogo più probabile, oppure None."""
+        if not self or not text:
+            return None
+        key = f'{normalize(country or "")}|{normalize(text)}'
+        if key in self.cache:
+            pid = self.cache[key]
+        else:
+            pid = self.cache[key] = self.new[key] = self._resolve(text, country)
+        if pid is None:
+            return None
+        row = self.con.execute('SELECT lat, lon, name FROM places WHERE id = ?', (pid,)).fetchone()
+        return (row[0], row[1], row[2]) if row else None
+
+    def close(self):
+        """Salva le nuove risoluzioni nella cache e chiude l'indice."""
+        if self.con is None:
+            return
+        if self.new:
+            self.con.executemany('INSERT OR REPLACE INTO resolved VALUES (?,?)', self.new.items())
+            self.con.commit()
+            self.new = {}
+        self.con.close()
+        self.con = None
+
+
+def main():
+    p = argparse.ArgumentParser(description='Cerca luoghi nel gazetteer locale')
+    p.add_argument('names', nargs='*', help='Nomi da cercare')
+    p.add_argument('--country', help='Paese in cui cercare (nome, anche storico o in italiano)')
+    p.add_argument('--rebuild', action='store_true', help="Ricostruisce l'indice dalle sorgenti")
+    args = p.parse_args()
+
+    t0 = time.perf_counter()
+    gaz = Gazetteer(rebuild=args.rebuild)
+    if not gaz:
+        print(f"ℹ Nessuna sorgente in {SOURCE_DIR}: gazetteer non disponibile")
+        return 0
+    n = gaz.con.execute('SELECT COUNT(*) FROM places').fetchone()[0]
+    state = 'ricostruito' if gaz.rebuilt else 'aggiornato'
+    print(f"✓ Indice {state}: {n} luoghi da {len(gaz.sources)} sorgenti ({(time.perf_counter() - t0) * 1000:.1f} ms)")
+    for name in args.names:
+        t1 = time.perf_counter()
+        hit = gaz.lookup(name, args.country)
+        ms = (time.perf_counter() - t1) * 1000
+        print(f"  {name}: {hit[2]} ({hit[0]}, {hit[1]})" if hit else f"  {name}: non trovato", f"[{ms:.2f} ms]")
+    gaz.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,7 +6,12 @@ basandosi sulle immagini in static/jpeg/destinazioni
 
 import os
 import json
+import math
 import re
+import argparse
+
+from profiling import Profiler, add_profile_argument
+from gazetteer import Gazetteer
 
 # Database coordinate città principali
 COORDINATE_DB = {
@@ -184,8 +189,9 @@ def parse_filename(filename):
     
     return paese, citta
 
-def get_coordinate(paese, citta):
-    """Cerca le coordinate nel database"""
+def get_coordinate(paese, citta, gazetteer=None):
+    """Cerca le coordinate nel database (correzioni manuali) e poi, se
+    disponibile, nel gazetteer locale (gazetteer.py)"""
     # Casi speciali per parsing complesso
     special_cases = {
         '1938': 'Iraq',
@@ -199,14 +205,20 @@ def get_coordinate(paese, citta):
     
     # Prova prima con la città
     if citta:
+        if citta in COORDINATE_DB:
+            return COORDINATE_DB[citta]
+
+        # Gazetteer: la città (anche con nomi storici o refusi) nel paese indicato
+        if gazetteer:
+            hit = gazetteer.lookup(citta, country=paese)
+            if hit:
+                return [hit[0], hit[1]]
+
         # Controlla se citta contiene un caso speciale
         for key, value in special_cases.items():
             if key in str(citta):
                 if value in COORDINATE_DB:
                     return COORDINATE_DB[value]
-        
-        if citta in COORDINATE_DB:
-            return COORDINATE_DB[citta]
     
     # Controlla casi speciali nel paese
     if paese in special_cases:
@@ -217,10 +229,80 @@ def get_coordinate(paese, citta):
     # Poi col paese normale
     if paese in COORDINATE_DB:
         return COORDINATE_DB[paese]
+
+    if gazetteer:
+        hit = gazetteer.lookup(paese)
+        if hit:
+            return [hit[0], hit[1]]
     
     return None
 
+# Raggruppamento precalcolato dei marker per la mappa (destinazioni_clusters.json):
+# griglia in coordinate Web Mercator con celle di CLUSTER_CELL_PX pixel per ogni
+# livello di zoom. Le celle di uno zoom sono esattamente 4 celle dello zoom
+# successivo, quindi i livelli formano un quadtree.
+CLUSTER_CELL_PX = 64
+CLUSTER_MAX_ZOOM = 16
+MERCATOR_MAX_LAT = 85.05112878
+
+
+def _mercator(lat, lon):
+    """Coordinate normalizzate [0, 1) nella proiezione Web Mercator."""
+    lat = max(-MERCATOR_MAX_LAT, min(MERCATOR_MAX_LAT, lat))
+    s = math.sin(math.radians(lat))
+    x = (lon + 180.0) / 360.0
+    y = 0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)
+    return min(x, 1 - 1e-12), min(max(y, 0.0), 1 - 1e-12)
+
+
+def build_clusters(destinazioni):
+    """Cluster per livello di zoom, da 0 al primo livello in cui ogni cluster
+    contiene un solo punto (al più CLUSTER_MAX_ZOOM).
+
+    Ogni cluster: {"coords": media delle coordinate, "count", "rep": indice in
+    destinazioni_data.json della destinazione rappresentativa (la prima nel
+    punto con più destinazioni), "bbox": [[lat min, lon min], [lat max, lon max]]};
+    i cluster di un solo punto hanno anche "ids", gli indici di tutte le sue
+    destinazioni.
+    """
+    points = [_mercator(*d['coords']) for d in destinazioni]
+    zooms = []
+    for z in range(CLUSTER_MAX_ZOOM + 1):
+        cells_per_side = (256 << z) // CLUSTER_CELL_PX
+        cells = {}
+        for i, (x, y) in enumerate(points):
+            cells.setdefault((int(x * cells_per_side), int(y * cells_per_side)), []).append(i)
+        level = []
+        for key in sorted(cells):
+            ids = cells[key]
+            lats = [destinazioni[i]['coords'][0] for i in ids]
+            lons = [destinazioni[i]['coords'][1] for i in ids]
+            per_punto = {}
+            for i in ids:
+                per_punto.setdefault(tuple(destinazioni[i]['coords']), []).append(i)
+            rep = max(per_punto.values(), key=len)[0]
+            cluster = {
+                'coords': [round(sum(lats) / len(ids), 5), round(sum(lons) / len(ids), 5)],
+                'count': len(ids),
+                'rep': rep,
+                'bbox': [[min(lats), min(lons)], [max(lats), max(lons)]],
+            }
+            if len(per_punto) == 1:
+                cluster['ids'] = ids
+            level.append(cluster)
+        zooms.append(level)
+        if all('ids' in c for c in level):
+            break
+    return {'cellPx': CLUSTER_CELL_PX, 'maxZoom': len(zooms) - 1, 'zooms': zooms}
+
+
 def main():
+    p = argparse.ArgumentParser(description='Genera destinazioni_data.json dalle immagini delle destinazioni')
+    p.add_argument('--no-gazetteer', action='store_true', help='Usa solo COORDINATE_DB, senza il gazetteer locale')
+    add_profile_argument(p)
+    args = p.parse_args()
+    profiler = Profiler('generate_destinazioni', enabled=args.profile)
+
     base_path = 'static/jpeg/destinazioni'
     
     if not os.path.exists(base_path):
@@ -230,43 +312,62 @@ def main():
     destinazioni = []
     files_without_coords = []
     
-    # Leggi tutti i file
-    files = [f for f in os.listdir(base_path) 
-             if f.lower().endswith(('.jpeg', '.jpg', '.png')) and not f.startswith('.')]
-    
-    for filename in sorted(files):
-        paese, citta = parse_filename(filename)
-        coords = get_coordinate(paese, citta)
+    with profiler.phase('listing') as ph:
+        # Leggi tutti i file
+        files = [f for f in os.listdir(base_path) 
+                 if f.lower().endswith(('.jpeg', '.jpg', '.png')) and not f.startswith('.')]
+        ph['files'] = len(files)
+
+    with profiler.phase('gazetteer') as ph:
+        gazetteer = None if args.no_gazetteer else Gazetteer()
+        ph['files'] = len(gazetteer.sources) if gazetteer else 0
+
+    with profiler.phase('parse') as ph:
+        for filename in sorted(files):
+            paese, citta = parse_filename(filename)
+            coords = get_coordinate(paese, citta, gazetteer)
         
-        if coords is None:
-            files_without_coords.append(filename)
-            continue
+            if coords is None:
+                files_without_coords.append(filename)
+                continue
         
-        # Crea nome leggibile
-        if citta:
-            nome_display = citta.replace('_', ' ')
-            paese_display = paese.replace('_', ' ')
-        else:
-            nome_display = paese.replace('_', ' ')
-            paese_display = paese.replace('_', ' ')
+            # Crea nome leggibile
+            if citta:
+                nome_display = citta.replace('_', ' ')
+                paese_display = paese.replace('_', ' ')
+            else:
+                nome_display = paese.replace('_', ' ')
+                paese_display = paese.replace('_', ' ')
         
-        destinazione = {
-            'nome': nome_display,
-            'coords': coords,
-            'immagine': f'/static/jpeg/destinazioni/{filename}',
-            'paese': paese_display,
-            'citta': citta.replace('_', ' ') if citta else None
-        }
+            destinazione = {
+                'nome': nome_display,
+                'coords': coords,
+                'immagine': f'/static/jpeg/destinazioni/{filename}',
+                'paese': paese_display,
+                'citta': citta.replace('_', ' ') if citta else None
+            }
         
-        destinazioni.append(destinazione)
+            destinazioni.append(destinazione)
+        ph['files'] = len(files)
+    if gazetteer:
+        gazetteer.close()
     
     # Salva JSON
-    output_file = 'destinazioni_data.json'
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(destinazioni, f, indent=2, ensure_ascii=False)
+    with profiler.phase('write'):
+        output_file = 'destinazioni_data.json'
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(destinazioni, f, indent=2, ensure_ascii=False)
+
+    with profiler.phase('clusters'):
+        clusters = build_clusters(destinazioni)
+        clusters_file = 'destinazioni_clusters.json'
+        with open(clusters_file, 'w', encoding='utf-8') as f:
+            json.dump(clusters, f, ensure_ascii=False, separators=(',', ':'))
     
     print(f"✓ Generato {output_file} con {len(destinazioni)} destinazioni")
     print(f"✓ File mappati: {len(destinazioni)}/{len(files)}")
+    print(f"✓ Generato {clusters_file}: zoom 0-{clusters['maxZoom']}, "
+          f"{' / '.join(str(len(level)) for level in clusters['zooms'])} cluster per livello")
     
     if files_without_coords:
         print(f"\n⚠ {len(files_without_coords)} file senza coordinate:")
@@ -274,6 +375,7 @@ def main():
             print(f"  - {f}")
         if len(files_without_coords) > 10:
             print(f"  ... e altri {len(files_without_coords) - 10}")
+    profiler.finish()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Genera i file "shard" per le pagine di dettaglio del Regno
+(cittaDettaglio.html e ufficioDettaglio.html), che così non devono scaricare
+e filtrare l'intero targhetteRegno.json.
+
+Il catalogo viene letto una sola volta, in streaming (catalog_stream.iter_records),
+e vengono scritti:
+  shard/localita/<localita>.json            record di una Località
+  shard/ufficio/<localita>/<ufficio>.json   record di (Località, Denominazione ufficio)
+  shard/manifest.json                       chiavi -> path degli shard
+
+I record sono già nell'ordine delle pagine: Anno, poi Denominazione ufficio,
+poi Targhetta Ufficio. Uno shard viene riscritto solo se il contenuto cambia,
+quelli non più referenziati vengono rimossi.
+
+Uso:
+  python3 generate_shards.py [--json PATH] [--out DIR]
+"""
+
+import os
+import re
+import json
+import hashlib
+import argparse
+import unicodedata
+from pathlib import Path
+
+from catalog_stream import iter_records
+from output_files import dump, write_if_changed
+
+
+def slugify(text):
+    """Nome di file ASCII e minuscolo per una chiave (es. 'Città di Castello' -> 'citta-di-castello')."""
+    s = unicodedata.normalize('NFKD', str(text))
+    s = ''.join(c for c in s if not unicodedata.combining(c)).lower()
+    return re.sub(r'[^a-z0-9]+', '-', s).strip('-') or 'x'
+
+
+def collate_key(text):
+    """Approssima String.localeCompare('it'): prima senza accenti e maiuscole, poi esatta."""
+    s = unicodedata.normalize('NFKD', str(text or ''))
+    return (''.join(c for c in s if not unicodedata.combining(c)).casefold(), str(text or ''))
+
+
+def _num(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return float('inf')
+
+
+def sort_key(rec):
+    return (_num(rec.get('Anno')), collate_key(rec.get('Denominazione ufficio')), _num(rec.get('Targhetta Ufficio')))
+
+
+def assign_slugs(keys):
+    """Slug univoci per un insieme di chiavi; in caso di collisione si aggiunge un hash breve."""
+    by_slug = {}
+    for k in sorted(keys):
+        by_slug.setdefault(slugify(k), []).append(k)
+    slugs = {}
+    for slug, ks in by_slug.items():
+        for k in ks:
+            if len(ks) == 1:
+                slugs[k] = slug
+            else:
+                slugs[k] = f"{slug}-{hashlib.sha1(k.encode('utf-8')).hexdigest()[:6]}"
+    return slugs
+
+
+def build_shards(records):
+    """Ritorna (manifest, {path relativo: lista record ordinata})."""
+    by_loc = {}
+    by_uff = {}
+    for rec in records:
+        loc = rec.get('Località')
+        if not loc:
+            continue
+        by_loc.setdefault(loc, []).append(rec)
+        uff = rec.get('Denominazione ufficio')
+        if uff:
+            by_uff.setdefault(loc, {}).setdefault(uff, []).append(rec)
+
+    shards = {}
+    manifest = {'localita': {}, 'ufficio': {}}
+    loc_slugs = assign_slugs(by_loc)
+    for loc in sorted(by_loc):
+        rel = f'shard/localita/{loc_slugs[loc]}.json'
+        shards[rel] = sorted(by_loc[loc], key=sort_key)
+        manifest['localita'][loc] = rel
+    for loc in sorted(by_uff):
+        uff_slugs = assign_slugs(by_uff[loc])
+        manifest['ufficio'][loc] = {}
+        for uff in sorted(by_uff[loc]):
+            rel = f'shard/ufficio/{loc_slugs[loc]}/{uff_slugs[uff]}.json'
+            shards[rel] = sorted(by_uff[loc][uff], key=sort_key)
+            manifest['ufficio'][loc][uff] = rel
+    return manifest, shards
+
+
+def main():
+    p = argparse.ArgumentParser(description='Genera gli shard per Località e ufficio usati dalle pagine di dettaglio')
+    p.add_argument('--json', default='regno/targhetteRegno.json', help='Catalogo sorgente (default: regno/targhetteRegno.json)')
+    p.add_argument('--out', help='Cartella di base degli shard (default: cartella del catalogo)')
+    args = p.parse_args()
+
+    json_path = Path(args.json)
+    if not json_path.exists():
+        print(f"Errore: {json_path} non trovato")
+        return
+    base = Path(args.out) if args.out else json_path.parent
+
+    manifest, shards = build_shards(iter_records(json_path))
+    written = sum(write_if_changed(base / rel, dump(recs)) for rel, recs in shards.items())
+    written += write_if_changed(base / 'shard' / 'manifest.json', json.dumps(manifest, ensure_ascii=False, indent=2))
+
+    # rimuovi gli shard non più referenziati
+    removed = 0
+    shard_dir = base / 'shard'
+    for dirpath, dirnames, filenames in os.walk(shard_dir, topdown=False):
+        for name in filenames:
+            rel = (Path(dirpath) / name).relative_to(base).as_posix()
+            if name.endswith('.json') and rel not in shards and rel != 'shard/manifest.json':
+                os.remove(Path(dirpath) / name)
+                removed += 1
+        if dirpath != str(shard_dir) and not os.listdir(dirpath):
+            os.rmdir(dirpath)
+
+    print(f"✓ Shard: {len(manifest['localita'])} località, "
+          f"{sum(len(v) for v in manifest['ufficio'].values())} uffici "
+          f"({written} file aggiornati, {removed} rimossi)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Genera le immagini derivate delle scansioni prev_* usate da card e lista:
+per ogni sorgente una miniatura WebP per ciascuna larghezza di WIDTHS e una
+copia WebP a dimensione piena, più un manifest con le dimensioni in pixel.
+
+  <cartella>/thumbs/<larghezza>/<nome>.webp
+  <cartella>/thumbs/full/<nome>.webp
+  <cartella>/thumbs/manifest.json   {"widths": [...], "images": {"prev_1.jpeg": [w, h]}}
+
+Le miniature non vengono mai ingrandite: se la sorgente è più stretta della
+larghezza richiesta si salva alla dimensione originale, così tutte le varianti
+esistono sempre. L'elaborazione è incrementale: una sorgente viene rielaborata
+solo se dimensione/mtime sono cambiati e il suo hash SHA-256 è diverso da
+quello registrato in .cache/thumbnails_state.json. Le sorgenti vengono
+elaborate in parallelo su tutti i core.
+
+Le cartelle thumbs/ non sono nel repository (.gitignore): le genera il deploy
+(release.py --deploy, .github/workflows/pages.yml), che conserva tra un deploy
+e l'altro thumbs/ e .cache/thumbnails_state.json nella cache di GitHub Actions,
+così vengono elaborate solo le scansioni nuove o modificate. In locale si
+possono generare con questo script per provare le pagine; senza miniature
+catalog.js usa le scansioni originali.
+
+Richiede Pillow (pip install pillow); senza Pillow lo script non fa nulla.
+
+Uso:
+  python3 generate_thumbnails.py [--jobs N] [--force] [DIR ...]
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageFile
+    # alcune scansioni sono troncate: i browser le mostrano comunque, qui idem
+    ImageFile.LOAD_TRUNCATED_IMAGES = True
+except ImportError:  # opzionale: senza Pillow le derivate non vengono generate
+    Image = None
+
+from asset_index import PROJECT_ROOT, CACHE_DIR, DERIVED_DIR, build_asset_index, list_dir
+from sections import SECTIONS
+
+SOURCE_DIRS = [d for s in SECTIONS for d in s.image_dirs]
+WIDTHS = (160, 320, 640)
+WEBP_QUALITY = 80
+STATE_FILE = CACHE_DIR / 'thumbnails_state.json'
+SOURCE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _variant_paths(out_dir: Path, stem):
+    paths = {str(w): out_dir / str(w) / f'{stem}.webp' for w in WIDTHS}
+    paths['full'] = out_dir / 'full' / f'{stem}.webp'
+    return paths
+
+
+def render(src, out_dir, stem):
+    """Lavoro eseguito nei processi figli: ritorna le dimensioni della sorgente."""
+    with Image.open(src) as im:
+        size = im.size
+        # decodifica JPEG ridotta: molto più veloce quando serve solo una miniatura
+        w_max = max(WIDTHS)
+        im.draft('RGB', (w_max, max(1, size[1] * w_max // size[0])))
+        im = im.convert('RGBA' if im.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        paths = _variant_paths(Path(out_dir), stem)
+        for w in WIDTHS:
+            scaled = im
+            if im.width > w:
+                scaled = im.resize((w, max(1, round(im.height * w / im.width))), Image.LANCZOS)
+            paths[str(w)].parent.mkdir(parents=True, exist_ok=True)
+            scaled.save(paths[str(w)], 'WEBP', quality=WEBP_QUALITY, method=4)
+    with Image.open(src) as full:
+        paths['full'].parent.mkdir(parents=True, exist_ok=True)
+        full.save(paths['full'], 'WEBP', quality=WEBP_QUALITY, method=4)
+    return size
+
+
+def load_state():
+    try:
+        with open(STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state):
+    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = STATE_FILE.with_name(STATE_FILE.name + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, separators=(',', ':'))
+    os.replace(tmp, STATE_FILE)
+
+
+def main():
+    p = argparse.ArgumentParser(description='Genera miniature e versioni WebP delle scansioni')
+    p.add_argument('dirs', nargs='*', default=SOURCE_DIRS, help='Cartelle sorgente (default: cartelle immagini delle sezioni)')
+    p.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='Processi paralleli (default: numero di CPU)')
+    p.add_argument('--force', action='store_true', help='Rielabora tutte le sorgenti')
+    args = p.parse_args()
+
+    if Image is None:
+        print("ℹ Pillow non installato (pip install pillow): miniature non generate")
+        return 0
+
+    state = {} if args.force else load_state()
+    index = build_asset_index()
+    todo = []      # (rel, abs src, out dir, stem, size, mtime, sha)
+    manifests = {}
+    for d in args.dirs:
+        src_dir = PROJECT_ROOT / d
+        if not src_dir.is_dir():
+            continue
+        out_dir = src_dir / DERIVED_DIR
+        images = {}
+        for name in sorted(list_dir(index, d)):
+            if not name.startswith('prev_') or os.path.splitext(name)[1].lower() not in SOURCE_EXTENSIONS:
+                continue
+            rel = f'{d}/{name}'
+            src = src_dir / name
+            st = src.stat()
+            stem = os.path.splitext(name)[0]
+            prev = state.get(rel)
+            outputs_ok = all(pth.exists() for pth in _variant_paths(out_dir, stem).values())
+            if prev and outputs_ok and prev['size'] == st.st_size and prev['mtime'] == st.st_mtime_ns:
+                images[name] = prev['dim']
+                continue
+            sha = _sha256(src)
+            if prev and outputs_ok and prev['sha256'] == sha:
+                # contenuto invariato (es. file solo toccato): aggiorna la cache
+                prev.update(size=st.st_size, mtime=st.st_mtime_ns)
+                images[name] = prev['dim']
+                continue
+            todo.append((rel, str(src), str(out_dir), stem, st.st_size, st.st_mtime_ns, sha))
+            images[name] = None
+        manifests[d] = images
+
+    errors = 0
+    if todo:
+        with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+            futures = [(job, pool.submit(render, job[1], job[2], job[3])) for job in todo]
+            for (rel, _src, _out, _stem, size, mtime, sha), fut in futures:
+                d, name = rel.rsplit('/', 1)
+                try:
+                    dim = list(fut.result())
+                except Exception as e:
+                    print(f"⚠ {rel}: {e}")
+                    manifests[d].pop(name, None)
+                    state.pop(rel, None)
+                    errors += 1
+                    continue
+                state[rel] = {'size': size, 'mtime': mtime, 'sha256': sha, 'dim': dim}
+                manifests[d][name] = dim
+
+    removed = 0
+    for d, images in manifests.items():
+        out_dir = PROJECT_ROOT / d / DERIVED_DIR
+        # elimina le derivate di sorgenti non più presenti
+        live = {os.path.splitext(n)[0] for n in images}
+        for sub in [str(w) for w in WIDTHS] + ['full']:
+            sub_dir = out_dir / sub
+            if not sub_dir.is_dir():
+                continue
+            for f in sub_dir.iterdir():
+                if f.suffix == '.webp' and f.stem not in live:
+                    f.unlink()
+                    removed += 1
+        for rel in [r for r in state if r.startswith(f'{d}/') and r.rsplit('/', 1)[1] not in images]:
+            del state[rel]
+        out_dir.mkdir(parents=True, exist_ok=True)
+        manifest = {'widths': list(WIDTHS), 'images': {n: images[n] for n in sorted(images)}}
+        payload = json.dumps(manifest, separators=(',', ':'))
+        mpath = out_dir / 'manifest.json'
+        if not mpath.exists() or mpath.read_text(encoding='utf-8') != payload:
+            mpath.write_text(payload, encoding='utf-8')
+
+    save_state(state)
+    total = sum(len(v) for v in manifests.values())
+    print(f"✓ Miniature: {len(todo) - errors} sorgenti elaborate, {total - len(todo)} invariate, "
+          f"{removed} derivate rimosse")
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
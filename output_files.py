@@ -0,0 +1,32 @@
+"""
+Scrittura dei file generati dagli script di rilascio, condivisa da tutti gli
+script che producono JSON o CSV nel repository.
+
+  dump(obj)                        JSON compatto (UTF-8, separatori minimi)
+  write_if_changed(path, payload)  scrive solo se il contenuto è diverso
+
+Un file riscritto con lo stesso contenuto cambierebbe comunque mtime: gli
+indici per (dimensione, mtime) di release.py e asset_index.py lo
+rileggerebbero e i passi che lo usano non verrebbero saltati.
+"""
+
+import json
+from pathlib import Path
+
+
+def dump(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+
+def write_if_changed(path: Path, payload) -> bool:
+    """Scrive `payload` (str, in UTF-8, o bytes) in `path` se il contenuto è
+    diverso da quello su disco; ritorna True se ha scritto."""
+    data = payload.encode('utf-8') if isinstance(payload, str) else payload
+    try:
+        if path.read_bytes() == data:
+            return False
+    except OSError:
+        pass
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return True
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Misura per fasi degli script di rilascio (opzione --profile).
+
+Ogni fase registra durata, numero di file o record elaborati (se indicato) e
+picco di memoria residente (RSS) del processo al termine della fase. Alla
+fine dell'esecuzione il profilo viene stampato, scritto in
+.cache/profile/<script>.json (ultima esecuzione) e aggiunto come riga a
+.cache/profile/history.jsonl, da cui si possono tracciare gli andamenti tra
+un rilascio e l'altro. Gli output degli script non vengono toccati.
+
+Uso negli script:
+  profiler = Profiler('site_stats', enabled=args.profile)
+  with profiler.phase('image_index') as ph:
+      index = build_image_index(...)
+      ph['files'] = len(index)
+  profiler.finish()
+"""
+
+import sys
+import json
+import time
+from datetime import datetime, timezone
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # non disponibile su Windows: RSS non misurato
+    resource = None
+
+from asset_index import CACHE_DIR
+
+PROFILE_DIR = CACHE_DIR / 'profile'
+HISTORY_FILE = PROFILE_DIR / 'history.jsonl'
+
+
+def peak_rss_kb(children=False):
+    """Picco di memoria residente del processo (o del più grande dei processi
+    figli terminati) in KB; None se non misurabile."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # macOS riporta byte, Linux kilobyte
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def add_profile_argument(parser):
+    parser.add_argument('--profile', action='store_true',
+                        help='Misura durata, file elaborati e memoria di ogni fase (.cache/profile/)')
+
+
+class Profiler:
+    def __init__(self, script, enabled=False):
+        self.script = script
+        self.enabled = enabled
+        self.phases = []
+        self.started = datetime.now(timezone.utc)
+        self.t0 = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        """Misura il blocco; nel dict restituito si può impostare 'files'."""
+        info = {'name': name, 'files': None}
+        t0 = time.perf_counter()
+        try:
+            yield info
+        finally:
+            if self.enabled:
+                info['ms'] = round((time.perf_counter() - t0) * 1000, 2)
+                info['peak_rss_kb'] = peak_rss_kb()
+                self.phases.append(info)
+
+    def result(self):
+        return {
+            'script': self.script,
+            'started': self.started.isoformat(timespec='seconds'),
+            'total_ms': round((time.perf_counter() - self.t0) * 1000, 2),
+            'peak_rss_kb': peak_rss_kb(),
+            'peak_rss_children_kb': peak_rss_kb(children=True),
+            'phases': self.phases,
+        }
+
+    def finish(self):
+        """Stampa e salva il profilo (solo se abilitato); ritorna il record."""
+        if not self.enabled:
+            return None
+        record = self.result()
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(PROFILE_DIR / f'{self.script}.json', 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+        with open(HISTORY_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+
+        print(f"ℹ Profilo {self.script} ({record['total_ms']:.1f} ms):")
+        for ph in self.phases:
+            files = f"{ph['files']:>8} file" if ph['files'] is not None else ' ' * 13
+            rss = f"{ph['peak_rss_kb'] / 1024:8.1f} MB" if ph['peak_rss_kb'] is not None else ''
+            print(f"  {ph['name']:<22}{ph['ms']:10.1f} ms {files} {rss}")
+        return record
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Driver incrementale dei passi di rilascio (chiamato da release.sh).
+
+Per ogni passo si registra un'impronta dei suoi input e degli output prodotti;
+al rilascio successivo il passo viene saltato se input e output sono invariati.
+I passi indipendenti girano in parallelo e per ognuno viene stampata la durata.
+
+Gli input di un passo sono di due tipi:
+  inputs    file o cartelle di cui conta il contenuto (hash SHA-256), oppure
+            insiemi di estensioni (il contenuto di tutti i file indicizzati
+            con quelle estensioni)
+  listings  estensioni dei file di cui conta solo l'elenco dei path
+            (es. statistiche che contano pagine e immagini)
+
+Gli hash dei file sono messi in cache per (dimensione, mtime): un file già
+visto non viene riletto. Lo stato è in .cache/release_state.json.
+
+I passi con 'deploy' producono file che non sono nel repository (miniature
+delle scansioni, patch tra versioni pubblicate, copie con hash degli asset con
+riferimenti riscritti negli HTML/JS): un rilascio normale li salta, --deploy esegue solo quelli. Lo usa il deploy su GitHub
+Pages (.github/workflows/pages.yml) sul proprio checkout.
+
+Uso:
+  python3 release.py [--force] [--jobs N] [--only PASSO ...] [--profile] [--deploy]
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from asset_index import PROJECT_ROOT, CACHE_DIR, DERIVED_DIR, IMAGE_EXTENSIONS, build_asset_index, iter_files
+from sections import SECTIONS
+from catalog_delta import DELTA_JSONS, versions_path
+
+STATE_FILE = CACHE_DIR / 'release_state.json'
+STATE_VERSION = 1
+
+# sezioni del catalogo dal registro sections.json
+SECTION_JSONS = [s.json_path for s in SECTIONS]
+IMAGE_DIRS = [d for s in SECTIONS for d in s.image_dirs]
+# ogni passo che legge le sezioni dipende anche dal registro
+REGISTRY = ['sections.py', 'sections.json']
+# cartelle delle patch e dei manifest delle versioni (catalog_delta.py)
+DELTA_DIRS = [versions_path(j).rsplit('/', 1)[0] for j in DELTA_JSONS]
+
+# Passi di rilascio. `after` (opzionale) impone l'ordine tra passi.
+# `deploy` (opzionale): passo del solo deploy, eseguito solo con --deploy.
+# `rewrites_inputs` (opzionale): il passo riscrive file che sono tra i suoi
+# input; l'impronta degli input si registra dopo l'esecuzione, altrimenti il
+# rilascio successivo lo rieseguirebbe senza che nulla sia cambiato.
+# missing_images.csv, unreferenced_regno_images.csv, dangling_references.csv e
+# tipo_page_coverage.csv sono prodotti da site_stats insieme alle statistiche;
+# check_missing_images.py resta come strumento a parte.
+STEPS = [
+    {
+        'name': 'site_stats',
+        'cmd': ['static/statistics/site_stats.py'],
+        'inputs': ['static/statistics/site_stats.py', 'asset_index.py', 'profiling.py', 'file_watcher.py',
+                   'catalog_stream.py'] + REGISTRY + SECTION_JSONS,
+        'listings': [{'.html'} | IMAGE_EXTENSIONS],
+        'outputs': ['static/statistics/site_stats.json', 'missing_images.csv', 'unreferenced_regno_images.csv',
+                    'dangling_references.csv', 'tipo_page_coverage.csv']
+                   + [j.replace('.json', ext) for j in SECTION_JSONS for ext in ('.tipo.json', '.images.json', '.cube.json')],
+        'profile': True,
+    },
+    {
+        'name': 'generate_destinazioni',
+        'cmd': ['generate_destinazioni.py'],
+        'inputs': ['generate_destinazioni.py', 'asset_index.py', 'profiling.py', 'gazetteer.py', 'gazetteer'],
+        'listings': ['static/jpeg/destinazioni'],
+        'outputs': ['destinazioni_data.json', 'destinazioni_clusters.json'],
+        'profile': True,
+    },
+    {
+        'name': 'generate_shards',
+        'cmd': ['generate_shards.py'],
+        'inputs': ['generate_shards.py', 'output_files.py', 'catalog_stream.py', 'regno/targhetteRegno.json'],
+        'outputs': ['regno/shard'],
+    },
+    {
+        'name': 'render_detail_pages',
+        'cmd': ['render_detail_pages.py'],
+        'inputs': ['render_detail_pages.py', 'generate_shards.py', 'output_files.py', 'catalog_stream.py',
+                   'facet_bitsets.py', 'regno/targhetteRegno.json', 'regno/cittaDettaglio.html', 'regno/ufficioDettaglio.html'],
+        'outputs': ['regno/dettaglio'],
+    },
+    {
+        'name': 'catalog_columnar',
+        'cmd': ['catalog_columnar.py'],
+        'inputs': ['catalog_columnar.py', 'output_files.py', 'catalog_stream.py'] + REGISTRY + SECTION_JSONS,
+        'outputs': [j.replace('.json', '.cols.json') + ext for j in SECTION_JSONS for ext in ('', '.gz', '.br')],
+    },
+    {
+        'name': 'search_index',
+        'cmd': ['search_index.py'],
+        'inputs': ['search_index.py', 'output_files.py', 'catalog_stream.py'] + REGISTRY + SECTION_JSONS,
+        'outputs': [j.rsplit('/', 1)[0] + '/search' for j in SECTION_JSONS],
+    },
+    {
+        'name': 'facet_bitsets',
+        # la verifica (facet_bitsets.py --verify) si lancia a parte: richiede decine di secondi
+        'cmd': ['facet_bitsets.py'],
+        'inputs': ['facet_bitsets.py', 'output_files.py', 'catalog_stream.py'] + REGISTRY + SECTION_JSONS,
+        'outputs': [j.replace('.json', '.facets.json') for j in SECTION_JSONS],
+    },
+    {
+        'name': 'generate_thumbnails',
+        'cmd': ['generate_thumbnails.py'],
+        'inputs': ['generate_thumbnails.py'] + REGISTRY + IMAGE_DIRS,
+        'outputs': [f'{d}/{DERIVED_DIR}' for d in IMAGE_DIRS],
+        # thumbs/ è in .gitignore: le miniature si generano sul checkout del deploy
+        'deploy': True,
+    },
+    {
+        'name': 'duplicate_images',
+        'cmd': ['duplicate_images.py'],
+        'inputs': ['duplicate_images.py', 'asset_index.py', 'output_files.py'] + REGISTRY + IMAGE_DIRS
+                  + ['static/jpeg/falsi'],
+        'outputs': ['duplicate_images.csv'],
+    },
+    {
+        # prima di fingerprint_assets, che mette le ultime patch nella lista di precache
+        'name': 'catalog_delta',
+        'cmd': ['catalog_delta.py'],
+        'inputs': ['catalog_delta.py', 'fingerprint_assets.py', 'output_files.py', 'static/statistics/site_stats.py']
+                  + REGISTRY + DELTA_JSONS,
+        'outputs': DELTA_DIRS,
+        # patch tra versioni pubblicate: parte dal manifest del sito (SITE_URL)
+        'deploy': True,
+    },
+    {
+        # riscrive i riferimenti negli HTML/JS: gira dopo i passi che li producono
+        'name': 'fingerprint_assets',
+        'cmd': ['fingerprint_assets.py'],
+        'inputs': ['fingerprint_assets.py', 'catalog_delta.py', 'asset_index.py', 'output_files.py',
+                   {'.html', '.js', '.css'}, 'regno/targhetteRegno.json', 'static/statistics/site_stats.json',
+                   'destinazioni_data.json', 'destinazioni_clusters.json'] + DELTA_DIRS,
+        'outputs': ['asset-manifest.json', 'precache-manifest.json'],
+        'after': ['site_stats', 'generate_destinazioni', 'render_detail_pages', 'catalog_delta'],
+        'rewrites_inputs': True,
+        'deploy': True,
+    },
+]
+
+
+class FileHasher:
+    """Hash SHA-256 dei file con cache per (size, mtime_ns)."""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.seen = {}
+        self.lock = threading.Lock()
+
+    def hash(self, rel):
+        path = PROJECT_ROOT / rel
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        with self.lock:
+            cached = self.cache.get(rel)
+        if not (cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns):
+            h = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    h.update(chunk)
+            cached = [st.st_size, st.st_mtime_ns, h.hexdigest()]
+        with self.lock:
+            self.seen[rel] = cached
+        return cached[2]
+
+
+def _files_under(asset_index, rel):
+    """Path dei file indicizzati sotto `rel` (o `rel` stesso se è un file)."""
+    rel = rel.strip('/')
+    if rel in asset_index['dirs']:
+        prefix = f'{rel}/'
+        return [f for f in iter_files(asset_index) if f.startswith(prefix)]
+    return [rel]
+
+
+def input_fingerprint(step, asset_index, hasher):
+    h = hashlib.sha256()
+    for rel in step.get('inputs', []):
+        files = iter_files(asset_index, rel) if isinstance(rel, (set, frozenset)) else _files_under(asset_index, rel)
+        for f in files:
+            h.update(f'{f}\0{hasher.hash(f)}\n'.encode('utf-8'))
+    for listing in step.get('listings', []):
+        if isinstance(listing, str):
+            files = _files_under(asset_index, listing)
+        else:
+            files = iter_files(asset_index, listing)
+        for f in files:
+            h.update(f'{f}\n'.encode('utf-8'))
+    return h.hexdigest()
+
+
+def _walk_files(rel):
+    """Path relativi dei file sotto la cartella `rel`, letti ora dal disco
+    (gli output cambiano durante il rilascio, l'indice iniziale non basta)."""
+    out = []
+    for dirpath, dirnames, filenames in os.walk(PROJECT_ROOT / rel):
+        dirnames.sort()
+        base = os.path.relpath(dirpath, PROJECT_ROOT).replace(os.sep, '/')
+        out.extend(f'{base}/{name}' for name in sorted(filenames))
+    return out
+
+
+def output_hashes(step, hasher):
+    hashes = {}
+    for rel in step.get('outputs', []):
+        if (PROJECT_ROOT / rel).is_dir():
+            for f in _walk_files(rel):
+                hashes[f] = hasher.hash(f)
+        else:
+            hashes[rel] = hasher.hash(rel)
+    return hashes
+
+
+def run_step(step, profile=False):
+    script, *args = step['cmd']
+    if profile and step.get('profile'):
+        args.append('--profile')
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, script, *args], cwd=PROJECT_ROOT,
+                          capture_output=True, text=True)
+    return proc, time.perf_counter() - t0
+
+
+def load_state():
+    try:
+        with open(STATE_FILE, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    if state.get('version') != STATE_VERSION:
+        state = {'version': STATE_VERSION, 'hashes': {}, 'steps': {}}
+    return state
+
+
+def save_state(state):
+    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = STATE_FILE.with_name(STATE_FILE.name + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp, STATE_FILE)
+
+
+def main():
+    p = argparse.ArgumentParser(description='Esegue i passi di rilascio saltando quelli invariati')
+    p.add_argument('--force', action='store_true', help='Riesegue tutti i passi ignorando la cache')
+    p.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='Passi eseguiti in parallelo (default: numero di CPU)')
+    p.add_argument('--only', nargs='+', metavar='PASSO', help='Esegue solo i passi indicati')
+    p.add_argument('--profile', action='store_true',
+                   help='Passa --profile ai passi che lo supportano (tempi per fase in .cache/profile/)')
+    p.add_argument('--deploy', action='store_true',
+                   help='Esegue solo i passi del deploy (riscrivono i riferimenti negli HTML/JS: '
+                        'da usare sul checkout del deploy, non nella copia di lavoro)')
+    args = p.parse_args()
+
+    if args.only:
+        steps = [s for s in STEPS if s['name'] in args.only]
+    else:
+        steps = [s for s in STEPS if bool(s.get('deploy')) == args.deploy]
+    names = {s['name'] for s in steps}
+    unknown = set(args.only or []) - {s['name'] for s in STEPS}
+    if unknown:
+        p.error(f"passi sconosciuti: {', '.join(sorted(unknown))}")
+
+    print("========================================")
+    print("Esecuzione script di rilascio")
+    print("========================================")
+
+    t_start = time.perf_counter()
+    state = load_state()
+    hasher = FileHasher(state['hashes'])
+    asset_index = build_asset_index()
+
+    pending = {s['name']: s for s in steps}
+    done, failed = set(), set()
+    running = {}
+    rc = 0
+
+    def ready(step):
+        deps = [d for d in step.get('after', []) if d in names]
+        return all(d in done or d in failed for d in deps)
+
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        while pending or running:
+            for name, step in list(pending.items()):
+                if not ready(step):
+                    continue
+                del pending[name]
+                if any(d in failed for d in step.get('after', [])):
+                    print(f"✗ {name}: non eseguito (dipendenza fallita)")
+                    failed.add(name)
+                    continue
+                fp = input_fingerprint(step, asset_index, hasher)
+                prev = state['steps'].get(name)
+                if (not args.force and prev and prev.get('inputs') == fp
+                        and prev.get('outputs') == output_hashes(step, hasher)):
+                    print(f"– {name}: invariato, saltato")
+                    done.add(name)
+                    continue
+                running[pool.submit(run_step, step, args.profile)] = (name, step, fp)
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                name, step, fp = running.pop(fut)
+                proc, elapsed = fut.result()
+                print(f"\n▶ {name} ({elapsed:.2f} s)")
+                if proc.stdout.strip():
+                    print(proc.stdout.rstrip())
+                if proc.returncode != 0:
+                    if proc.stderr.strip():
+                        print(proc.stderr.rstrip(), file=sys.stderr)
+                    print(f"ERRORE: {step['cmd'][0]} fallito con codice {proc.returncode}")
+                    state['steps'].pop(name, None)
+                    failed.add(name)
+                    rc = rc or proc.returncode
+                    continue
+                if step.get('rewrites_inputs'):
+                    # indice dei file riletto: il passo può averne creati o rimossi
+                    fp = input_fingerprint(step, build_asset_index(), hasher)
+                state['steps'][name] = {'inputs': fp, 'outputs': output_hashes(step, hasher)}
+                done.add(name)
+
+    # conserva solo gli hash dei file ancora coinvolti in qualche passo
+    state['hashes'] = {**state['hashes'], **hasher.seen} if args.only else hasher.seen
+    save_state(state)
+    print("")
+    print("========================================")
+    if rc:
+        print(f"Rilascio interrotto: {len(failed)} passi falliti")
+    else:
+        print(f"Tutti gli script completati con successo! ({time.perf_counter() - t_start:.2f} s)")
+    print("========================================")
+    return rc
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Genera le pagine statiche di dettaglio del Regno: una per ogni Località e una
+per ogni (Località, Denominazione ufficio), a partire dalle pagine dinamiche
+cittaDettaglio.html e ufficioDettaglio.html usate come modelli.
+
+  dettaglio/localita/<localita>.html
+  dettaglio/ufficio/<localita>/<ufficio>.html
+  dettaglio/manifest.json                       chiavi -> path delle pagine, più
+                                                "catalog": versione del catalogo
+
+Raggruppamento, ordinamento e nomi dei file sono quelli degli shard di
+generate_shards.py. Nel modello si compilano titolo, intestazione, conteggio e
+righe della tabella, così la pagina si vede subito senza JavaScript. In
+<script id="datiPagina"> c'è solo quello che serve oltre all'HTML: chiavi
+della pagina, link alle pagine degli uffici, numero di record, path dello
+shard (generate_shards.py) e i primi 10 caratteri esadecimali del suo
+SHA-256. Grafico e datari si disegnano dopo, dai record dello shard: lo script
+della pagina lo usa solo se l'hash corrisponde (altrimenti lo riscarica una
+volta senza cache HTTP, poi rinuncia al grafico). Un <base> relativo fa
+puntare i link e lo shard alla cartella del catalogo.
+
+Le pagine sono generate in parallelo. In .cache/detail_pages_state.json si
+registra per ogni pagina un'impronta dei suoi record e del modello: una
+pagina viene generata di nuovo solo se cambia, e riscritta solo se il
+contenuto è diverso; le pagine non più referenziate vengono rimosse.
+
+Uso:
+  python3 render_detail_pages.py [--json PATH] [--jobs N] [--force]
+"""
+
+import os
+import sys
+import json
+import html
+import hashlib
+import argparse
+from pathlib import Path
+from urllib.parse import quote
+from concurrent.futures import ProcessPoolExecutor
+
+from asset_index import CACHE_DIR
+from catalog_stream import iter_records, catalog_version, version_of
+from facet_bitsets import js_string
+from generate_shards import build_shards
+from output_files import dump, write_if_changed
+
+PAGES_DIR = 'dettaglio'
+TEMPLATES = {'localita': 'cittaDettaglio.html', 'ufficio': 'ufficioDettaglio.html'}
+STATE_FILE = CACHE_DIR / 'detail_pages_state.json'
+# da cambiare quando cambia il modo di compilare i modelli
+RENDER_VERSION = 2
+
+
+def _text(v):
+    """Testo di una cella come td.textContent = v in JavaScript."""
+    return '' if v is None else html.escape(js_string(v), quote=False)
+
+
+def _attr(v):
+    return html.escape(v, quote=True)
+
+
+def _uri_component(v):
+    """encodeURIComponent di JavaScript."""
+    return quote(str(v), safe="!~*'()")
+
+
+def _fill(template, old, new):
+    if template.count(old) != 1:
+        raise ValueError(f'modello non riconosciuto: {old!r}')
+    return template.replace(old, new)
+
+
+def _embed(template, nl, base, data):
+    """<base> e dati incorporati (per lo script della pagina)."""
+    payload = json.dumps(data, ensure_ascii=False, separators=(',', ':')).replace('</', '<\\/')
+    template = _fill(template, '<meta charset="UTF-8" />',
+                     f'<meta charset="UTF-8" />{nl}    <base href="{base}" />')
+    return _fill(template, '      <script src="/navbar/navbar.js"></script>',
+                 f'      <script type="application/json" id="datiPagina">{payload}</script>{nl}'
+                 '      <script src="/navbar/navbar.js"></script>')
+
+
+def _shard_data(ctx):
+    """Riferimento allo shard della pagina: path, hash del contenuto (lo stesso
+    file scritto da generate_shards.py) e numero di record."""
+    return {'count': len(ctx['records']), 'shard': ctx['shard'],
+            'hash': version_of(dump(ctx['records']).encode('utf-8'))}
+
+
+def render_localita(template, ctx):
+    nl = '\r\n' if '\r\n' in template else '\n'
+    loc = ctx['localita']
+    rows = []
+    for r in ctx['records']:
+        office = r.get('Denominazione ufficio') or ''
+        href = ctx['uffici'].get(office) or (f'ufficioDettaglio.html?denominazione={_uri_component(office)}'
+                                             f'&localita={_uri_component(loc)}')
+        rows.append(f'<tr><td>{_text(r.get("Anno"))}</td><td><a href="{_attr(href)}">{_text(office)}</a></td>'
+                    f'<td>{_text(r.get("Targhetta Tipo"))}</td><td>{_text(r.get("Targhetta Ufficio"))}</td>'
+                    f'<td>{_text(r.get("Descrizione"))}</td></tr>')
+    out = _fill(template, '<title>Dettagli Località</title>', f'<title>{_text(loc)} - Dettagli Località</title>')
+    out = _fill(out, '<h1 id="localityTitle">Località</h1>', f'<h1 id="localityTitle">{_text(loc)}</h1>')
+    out = _fill(out, '<p id="localityInfo"></p>',
+                '<p id="localityInfo">Tutte le targhette di questa località, ordinate per anno</p>')
+    out = _fill(out, '<span id="statsCount">0</span>', f'<span id="statsCount">{len(ctx["records"])}</span>')
+    out = _fill(out, '<tbody id="tableBody"></tbody>', f'<tbody id="tableBody">{"".join(rows)}</tbody>')
+    return _embed(out, nl, ctx['base'], {'localita': loc, 'uffici': ctx['uffici'], **_shard_data(ctx)})
+
+
+def render_ufficio(template, ctx):
+    nl = '\r\n' if '\r\n' in template else '\n'
+    title = f"{ctx['denominazione']} - {ctx['localita']}"
+    rows = [f'<tr><td>{_text(r.get("Anno"))}</td><td>{_text(r.get("Targhetta Tipo"))}</td>'
+            f'<td>{_text(r.get("Targhetta Ufficio"))}</td><td>{_text(r.get("Descrizione"))}</td></tr>'
+            for r in ctx['records']]
+    out = _fill(template, '<title>Dettagli Ufficio</title>', f'<title>{_text(title)} - Dettagli Ufficio</title>')
+    out = _fill(out, '<h1 id="officeTitle">Ufficio</h1>', f'<h1 id="officeTitle">{_text(title)}</h1>')
+    out = _fill(out, '<p id="officeInfo"></p>', '<p id="officeInfo">Elenco targhette ordinate per anno</p>')
+    out = _fill(out, '<span id="statsCount">0</span>', f'<span id="statsCount">{len(ctx["records"])}</span>')
+    out = _fill(out, '<tbody id="tableBody"></tbody>', f'<tbody id="tableBody">{"".join(rows)}</tbody>')
+    return _embed(out, nl, ctx['base'], {'denominazione': ctx['denominazione'], 'localita': ctx['localita'],
+                                         **_shard_data(ctx)})
+
+
+RENDERERS = {'localita': render_localita, 'ufficio': render_ufficio}
+
+
+def page_path(shard_rel):
+    """Path della pagina (relativo alla cartella del catalogo) di uno shard."""
+    return f"{PAGES_DIR}/{shard_rel[len('shard/'):-len('.json')]}.html"
+
+
+def page_manifest(manifest, catalog=None):
+    """Manifest degli shard con i path delle pagine al posto di quelli degli
+    shard; `catalog` è la versione del catalogo da cui sono generate."""
+    return {
+        'catalog': catalog,
+        'localita': {loc: page_path(rel) for loc, rel in manifest['localita'].items()},
+        'ufficio': {loc: {uff: page_path(rel) for uff, rel in uffici.items()}
+                    for loc, uffici in manifest['ufficio'].items()},
+    }
+
+
+def page_contexts(manifest, shards):
+    """{path relativo della pagina: (tipo, contesto)} dagli shard di generate_shards."""
+    pages = {}
+    for loc, shard_rel in manifest['localita'].items():
+        uffici = {uff: page_path(rel) for uff, rel in manifest['ufficio'].get(loc, {}).items()}
+        rel = page_path(shard_rel)
+        pages[rel] = ('localita', {'localita': loc, 'records': shards[shard_rel], 'uffici': uffici,
+                                   'shard': shard_rel, 'base': '../' * rel.count('/')})
+    for loc, uffici in manifest['ufficio'].items():
+        for uff, shard_rel in uffici.items():
+            rel = page_path(shard_rel)
+            pages[rel] = ('ufficio', {'localita': loc, 'denominazione': uff, 'records': shards[shard_rel],
+                                      'shard': shard_rel, 'base': '../' * rel.count('/')})
+    return pages
+
+
+def fingerprint(kind, ctx, template):
+    h = hashlib.sha256(f'{RENDER_VERSION}\0{kind}\0'.encode('utf-8'))
+    h.update(template.encode('utf-8'))
+    h.update(dump(ctx).encode('utf-8'))
+    return h.hexdigest()
+
+
+# Modelli dei processi worker, ricevuti una sola volta all'avvio
+_worker_templates = None
+
+
+def _init_worker(templates):
+    global _worker_templates
+    _worker_templates = templates
+
+
+def _render_in_worker(job):
+    out_path, kind, ctx = job
+    return write_if_changed(Path(out_path), RENDERERS[kind](_worker_templates[kind], ctx))
+
+
+def load_state():
+    try:
+        with open(STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state):
+    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = STATE_FILE.with_name(STATE_FILE.name + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, separators=(',', ':'))
+    os.replace(tmp, STATE_FILE)
+
+
+def main():
+    p = argparse.ArgumentParser(description='Genera le pagine statiche di dettaglio per Località e ufficio')
+    p.add_argument('--json', default='regno/targhetteRegno.json', help='Catalogo sorgente (default: regno/targhetteRegno.json)')
+    p.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='Processi paralleli (default: numero di CPU)')
+    p.add_argument('--force', action='store_true', help='Rigenera tutte le pagine')
+    args = p.parse_args()
+
+    json_path = Path(args.json)
+    if not json_path.exists():
+        print(f"Errore: {json_path} non trovato")
+        return 1
+    base = json_path.parent
+    templates = {}
+    for kind, name in TEMPLATES.items():
+        with open(base / name, 'r', encoding='utf-8', newline='') as f:
+            templates[kind] = f.read()
+
+    manifest, shards = build_shards(iter_records(json_path))
+    pages = page_contexts(manifest, shards)
+
+    state = {} if args.force else load_state()
+    new_state = {}
+    todo = []
+    for rel, (kind, ctx) in pages.items():
+        key = new_state[rel] = fingerprint(kind, ctx, templates[kind])
+        if state.get(rel) != key or not (base / rel).exists():
+            todo.append((str(base / rel), kind, ctx))
+
+    written = 0
+    if todo:
+        jobs = max(1, min(args.jobs, len(todo)))
+        if jobs == 1:
+            _init_worker(templates)
+            written = sum(map(_render_in_worker, todo))
+        else:
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(templates,)) as pool:
+                written = sum(pool.map(_render_in_worker, todo, chunksize=8))
+
+    written += write_if_changed(base / PAGES_DIR / 'manifest.json', dump(page_manifest(manifest, catalog_version(json_path))))
+
+    # rimuovi le pagine non più referenziate
+    removed = 0
+    pages_dir = base / PAGES_DIR
+    for dirpath, dirnames, filenames in os.walk(pages_dir, topdown=False):
+        for name in filenames:
+            rel = (Path(dirpath) / name).relative_to(base).as_posix()
+            if name.endswith('.html') and rel not in pages:
+                os.remove(Path(dirpath) / name)
+                removed += 1
+        if dirpath != str(pages_dir) and not os.listdir(dirpath):
+            os.rmdir(dirpath)
+    save_state(new_state)
+
+    print(f"✓ Pagine di dettaglio: {len(manifest['localita'])} località, "
+          f"{len(pages) - len(manifest['localita'])} uffici ({len(todo)} generate, "
+          f"{written} file aggiornati, {removed} rimossi)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
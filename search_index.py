@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Indice di ricerca testuale per le pagine del catalogo (catalog.js).
+
+Per ogni sezione si indicizzano i campi di SEARCH_FIELDS di ogni record; il
+documento è la posizione del record nel JSON della sezione (la stessa di
+`data` in catalog.js, anche quando i dati arrivano dal formato colonnare).
+I termini sono normalizzati come in catalog.js: senza accenti, minuscoli,
+spezzati su tutto ciò che non è [a-z0-9]; i termini di una sola lettera non
+sono indicizzati.
+
+Struttura su disco (<cartella sezione>/search/<nome JSON>/):
+
+  manifest.json   {"format": "search-v1", "catalog": "<versione>", "count": N,
+                   "fields": [...], "prefix": 2, "shards": {"mo": "mo.json", ...}}
+  <xx>.json       {"catalog": "<versione>", "terms": [termini ordinati che iniziano con xx],
+                   "postings": [[d0, d1, ...], ...]}
+
+"catalog" è la versione del JSON indicizzato (catalog_stream.catalog_version),
+anche in ogni shard: catalog.js scarta manifest e shard di un'altra versione.
+
+Le liste di posting sono le posizioni ordinate dei record, codificate a
+differenze (d0 = prima posizione, poi incrementi). La ricerca è per prefisso
+(edge n-gram): una parola digitata di almeno `prefix` caratteri corrisponde a
+tutti i termini che iniziano con essa, che stanno tutti nello shard delle sue
+prime `prefix` lettere; più parole vanno tutte trovate (AND). Il client
+scarica quindi il manifest e solo gli shard delle parole digitate.
+
+Uno shard viene riscritto solo se il contenuto cambia, quelli non più usati
+vengono rimossi. Con --report l'indice viene confrontato con una scansione
+lineare dei record su un campione di ricerche (risultati identici, altrimenti
+codice 1) e vengono stampati dimensioni e tempi di ricerca.
+
+Uso:
+  python3 search_index.py [--report] [JSON ...]
+"""
+
+import os
+import re
+import sys
+import json
+import gzip
+import time
+import random
+import argparse
+import unicodedata
+from bisect import bisect_left
+from pathlib import Path
+
+from output_files import dump, write_if_changed
+from catalog_stream import iter_records, catalog_version
+from sections import SECTIONS
+
+SECTION_JSONS = [s.json_path for s in SECTIONS]
+SEARCH_FIELDS = ['Descrizione', 'Località', 'Denominazione ufficio', 'Anno']
+
+FORMAT = 'search-v1'
+PREFIX = 2              # lunghezza minima di una parola cercata e della chiave degli shard
+REPORT_QUERIES = 300
+
+
+def fold(text):
+    """Come piega() in catalog.js: NFD, senza segni diacritici (U+0300-U+036F), minuscolo."""
+    return re.sub('[\u0300-\u036f]', '', unicodedata.normalize('NFD', str(text))).lower()
+
+
+def tokens(text):
+    return [t for t in re.split(r'[^a-z0-9]+', fold(text)) if t]
+
+
+def record_terms(rec):
+    terms = set()
+    for field in SEARCH_FIELDS:
+        v = rec.get(field)
+        if v is None:
+            continue
+        for x in (v if isinstance(v, list) else [v]):
+            terms.update(t for t in tokens(x) if len(t) >= PREFIX)
+    return terms
+
+
+def build_index(records, catalog=None):
+    """Ritorna (manifest, {nome shard: contenuto}); `records` può essere un
+    iteratore (es. catalog_stream.iter_records), letto una sola volta.
+    `catalog` è la versione del JSON da cui vengono i record."""
+    postings = {}
+    count = 0
+    for pos, rec in enumerate(records):
+        count = pos + 1
+        for term in record_terms(rec):
+            postings.setdefault(term, []).append(pos)
+
+    shards = {}
+    for term in sorted(postings):
+        shard = shards.setdefault(term[:PREFIX], {'catalog': catalog, 'terms': [], 'postings': []})
+        ids = postings[term]
+        shard['terms'].append(term)
+        shard['postings'].append([ids[0]] + [b - a for a, b in zip(ids, ids[1:])])
+
+    manifest = {
+        'format': FORMAT,
+        'catalog': catalog,
+        'count': count,
+        'fields': SEARCH_FIELDS,
+        'prefix': PREFIX,
+        'shards': {key: f'{key}.json' for key in shards},
+    }
+    return manifest, {f'{key}.json': shard for key, shard in shards.items()}
+
+
+def search(manifest, load_shard, text):
+    """Posizioni (ordinate) dei record che contengono tutte le parole di `text`
+    come prefissi di un termine; None se nessuna parola è abbastanza lunga.
+    `load_shard(nome)` ritorna il contenuto di uno shard."""
+    words = [w for w in tokens(text) if len(w) >= manifest['prefix']]
+    if not words:
+        return None
+    result = None
+    for word in words:
+        name = manifest['shards'].get(word[:manifest['prefix']])
+        found = set()
+        if name:
+            shard = load_shard(name)
+            terms = shard['terms']
+            i = bisect_left(terms, word)
+            while i < len(terms) and terms[i].startswith(word):
+                pos = 0
+                for d in shard['postings'][i]:
+                    pos += d
+                    found.add(pos)
+                i += 1
+        result = found if result is None else result & found
+        if not result:
+            break
+    return sorted(result)
+
+
+def linear_search(terms_per_record, text):
+    """Riferimento: scansione di tutti i record (termini già calcolati con
+    record_terms), come un filtro lato client."""
+    words = [w for w in tokens(text) if len(w) >= PREFIX]
+    if not words:
+        return None
+    out = []
+    for pos, terms in enumerate(terms_per_record):
+        if all(any(t.startswith(w) for t in terms) for w in words):
+            out.append(pos)
+    return out
+
+
+def sample_queries(manifest, shards, records, n, seed=1):
+    """Prefissi di termini reali (2-5 caratteri) e coppie di parole di uno stesso record."""
+    rng = random.Random(seed)
+    terms = [t for shard in shards.values() for t in shard['terms']]
+    queries = []
+    for _ in range(n // 2):
+        t = rng.choice(terms)
+        queries.append(t[:rng.randint(PREFIX, max(PREFIX, min(5, len(t))))])
+    for _ in range(n - len(queries)):
+        words = sorted(record_terms(rng.choice(records))) or ['zz']
+        queries.append(' '.join(rng.sample(words, min(2, len(words)))))
+    return queries
+
+
+def write_index(out_dir: Path, manifest, shards):
+    """Scrive manifest e shard; ritorna (file aggiornati, file rimossi)."""
+    written = sum(write_if_changed(out_dir / name, dump(shard)) for name, shard in shards.items())
+    written += write_if_changed(out_dir / 'manifest.json', dump(manifest))
+    removed = 0
+    for name in os.listdir(out_dir):
+        if name.endswith('.json') and name != 'manifest.json' and name not in shards:
+            os.remove(out_dir / name)
+            removed += 1
+    return written, removed
+
+
+def report(records, manifest, shards, out_dir: Path):
+    sizes = {name: len(dump(shard).encode('utf-8')) for name, shard in shards.items()}
+    gz = sum(len(gzip.compress(dump(shard).encode('utf-8'), mtime=0)) for shard in shards.values())
+    n_terms = sum(len(shard['terms']) for shard in shards.values())
+    biggest = max(sizes, key=sizes.get) if sizes else None
+    print(f"  termini {n_terms}, shard {len(shards)}, totale {sum(sizes.values()) / 1024:.1f} KB "
+          f"(gzip {gz / 1024:.1f} KB)" + (f", shard più grande {biggest} {sizes[biggest] / 1024:.1f} KB" if biggest else ''))
+
+    queries = sample_queries(manifest, shards, records, REPORT_QUERIES)
+    terms_per_record = [record_terms(rec) for rec in records]
+
+    def load_shard(name):
+        # come il client: lettura e parsing dello shard a ogni ricerca
+        with open(out_dir / name, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    indexed_ms, linear_ms, mismatches = [], [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        hits = search(manifest, load_shard, q)
+        indexed_ms.append((time.perf_counter() - t0) * 1000)
+        t0 = time.perf_counter()
+        expected = linear_search(terms_per_record, q)
+        linear_ms.append((time.perf_counter() - t0) * 1000)
+        if hits != expected:
+            mismatches.append(q)
+
+    def stats(ms):
+        ms = sorted(ms)
+        return f"media {sum(ms) / len(ms):7.2f} ms, p95 {ms[int(len(ms) * 0.95)]:7.2f} ms"
+
+    print(f"  ricerca indicizzata  {stats(indexed_ms)}  ({len(queries)} ricerche, shard letti dal disco)")
+    print(f"  scansione lineare    {stats(linear_ms)}  (termini dei record precalcolati)")
+    if mismatches:
+        print(f"✗ {len(mismatches)} ricerche con risultati diversi dalla scansione lineare, es. {mismatches[:5]}")
+        return False
+    print("  ✓ risultati identici alla scansione lineare")
+    return True
+
+
+def main():
+    p = argparse.ArgumentParser(description='Genera gli indici di ricerca testuale delle sezioni del catalogo')
+    p.add_argument('json', nargs='*', default=SECTION_JSONS, help='JSON da indicizzare (default: tutte le sezioni)')
+    p.add_argument('--report', action='store_true',
+                   help='Verifica i risultati con una scansione lineare e misura dimensioni e tempi di ricerca')
+    args = p.parse_args()
+
+    ok = True
+    for path in args.json:
+        json_path = Path(path)
+        if not json_path.exists():
+            continue
+        if args.report:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                records = json.load(f)
+        else:
+            # senza report i record servono una volta sola: lettura in streaming
+            records = iter_records(json_path)
+        manifest, shards = build_index(records, catalog_version(json_path))
+        out_dir = json_path.parent / 'search' / json_path.stem
+        out_dir.mkdir(parents=True, exist_ok=True)
+        written, removed = write_index(out_dir, manifest, shards)
+        print(f"✓ {out_dir.as_posix()}: {manifest['count']} record, {len(shards)} shard "
+              f"({written} file aggiornati, {removed} rimossi)")
+        if args.report:
+            ok = report(records, manifest, shards, out_dir) and ok
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
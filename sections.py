@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Registro delle sezioni del catalogo (sections.json), condiviso dagli script
+di rilascio. Una sezione nuova (es. un'altra colonia) è una voce del file:
+
+  name                    nome della sezione (chiave in site_stats.json)
+  folder                  cartella della sezione (pagina catalogo e file derivati)
+  json                    JSON dei record, nella cartella della sezione
+  image_dirs              cartelle delle scansioni, dalla radice, dentro `folder`
+  images                  nomi dell'immagine di un record, in ordine di preferenza:
+                            {ufficio}  Targhetta Ufficio
+                            {_extra}   "_" + extra, oppure vuoto se il record non ha extra
+                            {a|b}      alternative: vince la prima immagine in ordine di path
+                            *          (in fondo) qualunque seguito: il nome è un prefisso
+                          i nomi iniziano con prev_ (le immagini indicizzate da site_stats)
+  expected_image          (opzionale) nome atteso riportato in missing_images.csv,
+                          come CATALOG_CONFIG.getImgPath (default: il primo di `images`)
+  reserve_expected_names  (opzionale) i nomi attesi dai record contano come usati
+                          in unreferenced_regno_images.csv
+
+I pattern sono compilati una volta sola al caricamento in template; per un
+indice immagini (basename minuscolo -> path, vedi site_stats.build_image_index)
+Section.matcher() prepara il piano di ricerca: un nome esatto è una lettura
+del dict, un prefisso una ricerca con bisect nell'elenco ordinato dei nomi.
+L'elenco è tenuto dall'indice (site_stats.ImageIndex.with_prefix), costruito
+una volta e condiviso da tutte le sezioni; con un dict semplice il matcher ne
+ordina una copia propria.
+
+Uso:
+  python3 sections.py      stampa il registro e i pattern compilati
+"""
+
+import re
+import sys
+import bisect
+import json
+import string
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+REGISTRY_FILE = PROJECT_ROOT / 'sections.json'
+
+_ALTERNATIVES = re.compile(r'\{([^{}]*\|[^{}]*)\}')
+_FIELDS = {'ufficio', '_extra'}
+_IMAGE_PREFIX = 'prev_'
+
+
+def path_order(rel):
+    """Ordine di un path nell'indice dei file: prima la cartella, poi il nome."""
+    folder, _, name = rel.rpartition('/')
+    return (folder, name)
+
+
+def extra_part(extra):
+    """Valore di {_extra}: "_" + extra senza spazi, vuoto se assente."""
+    return f"_{str(extra).strip()}" if extra and str(extra).strip() != "" else ""
+
+
+class ImagePattern:
+    """Un pattern di `images`, con le alternative espanse in template
+    str.format e, se è un prefisso, la parte fissa di ogni alternativa."""
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.prefix = pattern.endswith('*')
+        body = pattern[:-1] if self.prefix else pattern
+        templates, pos = [''], 0
+        for m in _ALTERNATIVES.finditer(body):
+            literal = body[pos:m.start()]
+            templates = [t + literal + choice for t in templates for choice in m.group(1).split('|')]
+            pos = m.end()
+        self.templates = [t + body[pos:] for t in templates]
+        for t in self.templates:
+            try:
+                fields = {f for _, f, _, _ in string.Formatter().parse(t) if f is not None}
+            except ValueError as e:
+                raise ValueError(f"pattern non valido {pattern!r}: {e}") from None
+            if fields - _FIELDS or not t.lower().startswith(_IMAGE_PREFIX):
+                raise ValueError(f"pattern non valido {pattern!r}: campi ammessi {sorted(_FIELDS)}, "
+                                 f"nome che inizia con {_IMAGE_PREFIX}")
+        self.heads = tuple(t.split('{', 1)[0].lower() for t in self.templates)
+
+    def names(self, item):
+        """Nomi (minuscoli) di un record, uno per alternativa; vuoto senza ufficio."""
+        uff = item.get("Targhetta Ufficio")
+        if uff is None:
+            return []
+        fields = {'ufficio': uff, '_extra': extra_part(item.get("extra", ""))}
+        return [t.format(**fields).lower() for t in self.templates]
+
+
+class Section:
+    """Una voce del registro, con i pattern già compilati."""
+
+    def __init__(self, entry):
+        self.name = entry['name']
+        self.folder = entry['folder'].strip('/')
+        self.json = entry['json']
+        self.json_path = f"{self.folder}/{self.json}"
+        self.image_dirs = [d.strip('/') for d in entry['image_dirs']]
+        for d in self.image_dirs:
+            if not d.startswith(f"{self.folder}/"):
+                raise ValueError(f"sezione {self.name}: {d} non è dentro {self.folder}")
+        self.images = [ImagePattern(p) for p in entry['images']]
+        expected = ImagePattern(entry.get('expected_image', entry['images'][0]))
+        if expected.prefix or len(expected.templates) != 1:
+            raise ValueError(f"sezione {self.name}: expected_image deve essere un nome esatto")
+        self.expected = expected.templates[0]
+        self.reserve_expected_names = bool(entry.get('reserve_expected_names', False))
+
+    def expected_name(self, item):
+        """Nome dell'immagine atteso per un record (lo stesso di CATALOG_CONFIG.getImgPath)."""
+        return self.expected.format(ufficio=item.get("Targhetta Ufficio"), _extra=extra_part(item.get("extra", "")))
+
+    def matcher(self, image_index):
+        return ImageMatcher(self, image_index)
+
+
+def keys_with_prefix(sorted_keys, prefix):
+    """Chiavi di `sorted_keys` (lista ordinata) che iniziano con `prefix`."""
+    i = bisect.bisect_left(sorted_keys, prefix)
+    while i < len(sorted_keys) and sorted_keys[i].startswith(prefix):
+        yield sorted_keys[i]
+        i += 1
+
+
+class ImageMatcher:
+    """Piano di ricerca delle immagini di una sezione su un indice immagini.
+    Con un ImageIndex di site_stats segue le modifiche dell'indice (add/discard);
+    con un dict semplice va ricreato quando l'indice cambia."""
+
+    def __init__(self, section, image_index):
+        self.index = image_index
+        self.dirs = tuple(f"{d}/" for d in section.image_dirs)
+        self.patterns = section.images
+        self._sorted = None
+
+    def _first_in_dirs(self, paths):
+        return next((p for p in paths if p.startswith(self.dirs)), None)
+
+    def _with_prefix(self, prefix):
+        with_prefix = getattr(self.index, 'with_prefix', None)
+        if with_prefix is not None:
+            return with_prefix(prefix)
+        if self._sorted is None:
+            self._sorted = sorted(self.index)
+        return keys_with_prefix(self._sorted, prefix)
+
+    def find(self, item):
+        """Path relativo dell'immagine di un record secondo i pattern della sezione, o None."""
+        for pattern in self.patterns:
+            best = None
+            for name in pattern.names(item):
+                keys = self._with_prefix(name) if pattern.prefix else (name,)
+                for key in keys:
+                    hit = self._first_in_dirs(self.index.get(key, ()))
+                    if hit is not None and (best is None or path_order(hit) < path_order(best)):
+                        best = hit
+            if best is not None:
+                return best
+        return None
+
+
+def load_sections(path=REGISTRY_FILE):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [Section(entry) for entry in json.load(f)]
+
+
+SECTIONS = load_sections()
+
+
+def section_for(folder):
+    """Sezione con la cartella indicata (path relativo), o None."""
+    folder = Path(folder).as_posix().strip('/')
+    return next((s for s in SECTIONS if s.folder == folder), None)
+
+
+def main():
+    for s in SECTIONS:
+        print(f"✓ {s.name}: {s.json_path}, immagini in {', '.join(s.image_dirs)}")
+        for p in s.images:
+            kind = 'prefisso' if p.prefix else 'esatto'
+            print(f"    {kind:9} {' | '.join(p.templates)}")
+        print(f"    atteso    {s.expected}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
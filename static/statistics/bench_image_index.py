@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark della ricerca immagini di site_stats.py su un indice sintetico:
+confronta una scansione lineare delle chiavi, che applica i pattern di
+sections.json record per record, con il piano compilato di
+sections.ImageMatcher sull'ImageIndex di site_stats (elenco ordinato dei nomi
+e bisect) e verifica che i risultati coincidano.
+
+L'indice contiene N immagini prev_* distribuite tra Regno, Trieste A e Libia;
+i record di Trieste A e Libia sono scelti in modo che la maggior parte non
+abbia il nome esatto e passi quindi dal confronto per prefisso.
+
+Uso:
+  python3 static/statistics/bench_image_index.py [--images N] [--records N] [--seed N]
+"""
+
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from site_stats import ImageIndex, section_for, path_order  # noqa: E402
+
+SECTIONS = [
+    ("regno", "regno/jpg", "prev_{}"),
+    ("triestea", "triestea/img", "prev_trieste_{}"),
+    ("colonie/libia", "colonie/libia/img", "prev_tripoli_{}"),
+]
+
+
+def synthetic_index(n_images, rng):
+    """dict basename -> [path], nello stesso ordine di build_image_index."""
+    rels = set()
+    per_section = n_images // len(SECTIONS)
+    for _, img_dir, pattern in SECTIONS:
+        target = len(rels) + per_section
+        while len(rels) < target:
+            uff = rng.randrange(1, per_section)
+            suffix = rng.choice(["", "_a", "_b", "_bis", "_2"])
+            rels.add(f"{img_dir}/{pattern.format(uff)}{suffix}.jpeg")
+    index = {}
+    for rel in sorted(rels):
+        name = rel.rsplit("/", 1)[-1]
+        index.setdefault(name.lower(), []).append(rel)
+    return index
+
+
+def synthetic_records(n_records, n_images, rng):
+    per_section = n_images // len(SECTIONS)
+    records = []
+    for _ in range(n_records):
+        folder = rng.choice(["triestea", "colonie/libia"])
+        extra = rng.choice(["", "", "a", "x"])
+        records.append((folder, {"Targhetta Ufficio": rng.randrange(1, per_section), "extra": extra}))
+    return records
+
+
+def linear_find(section, image_index, item):
+    """Riferimento: ogni pattern della sezione confrontato con tutte le chiavi."""
+    dirs = tuple(f"{d}/" for d in section.image_dirs)
+    for pattern in section.images:
+        names = tuple(pattern.names(item))
+        hits = [p for k, paths in image_index.items()
+                if (k.startswith(names) if pattern.prefix else k in names)
+                for p in [next((p for p in paths if p.startswith(dirs)), None)] if p is not None]
+        if hits:
+            return min(hits, key=path_order)
+    return None
+
+
+def run_linear(image_index, records):
+    t0 = time.perf_counter()
+    hits = [linear_find(section_for(folder), image_index, item) for folder, item in records]
+    return hits, time.perf_counter() - t0
+
+
+def run_compiled(image_index, records):
+    """Come resolve_section: un piano per sezione, poi una ricerca per record
+    (il tempo comprende la costruzione dell'ImageIndex e del suo elenco ordinato)."""
+    t0 = time.perf_counter()
+    image_index = ImageIndex(image_index)
+    matchers = {folder: section_for(folder).matcher(image_index) for folder in {f for f, _ in records}}
+    hits = [matchers[folder].find(item) for folder, item in records]
+    return hits, time.perf_counter() - t0
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark della ricerca per prefisso delle immagini")
+    p.add_argument("--images", type=int, default=100_000, help="Immagini sintetiche (default: 100000)")
+    p.add_argument("--records", type=int, default=500, help="Record Trieste A/Libia cercati (default: 500)")
+    p.add_argument("--seed", type=int, default=1, help="Seme del generatore casuale")
+    args = p.parse_args()
+
+    rng = random.Random(args.seed)
+    plain = synthetic_index(args.images, rng)
+    records = synthetic_records(args.records, args.images, rng)
+
+    linear_hits, linear_s = run_linear(plain, records)
+    compiled_hits, compiled_s = run_compiled(plain, records)
+    if linear_hits != compiled_hits:
+        print("✗ I risultati del piano compilato differiscono da quelli lineari")
+        return 1
+
+    found = sum(h is not None for h in compiled_hits)
+    print(f"✓ {len(plain)} immagini, {len(records)} record ({found} con immagine)")
+    print(f"  scansione lineare   {linear_s * 1000:10.1f} ms")
+    print(f"  piano compilato     {compiled_s * 1000:10.1f} ms  (costruzione dell'indice compresa)")
+    print(f"  speedup             {linear_s / max(compiled_s, 1e-9):10.0f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,18 +5,43 @@ Aggiornato per calcolare, per sezione, numero catalogati, immagini presenti
 e percentuale di completamento immagini.
 """
 
+import os
+import re
+import sys
 import json
 import csv
+import time
+import argparse
+from bisect import bisect_left, insort
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 
+# asset_index.py vive nella radice del progetto, condiviso con gli altri script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from asset_index import build_asset_index, iter_files, file_set, IMAGE_EXTENSIONS  # noqa: E402
+from profiling import Profiler, add_profile_argument  # noqa: E402
+from file_watcher import open_watcher, batches  # noqa: E402
+from catalog_stream import iter_records, catalog_version  # noqa: E402
+from sections import SECTIONS, section_for, path_order, keys_with_prefix  # noqa: E402
 
-def count_html_pages(root_dir):
-    html_files = []
-    for file_path in Path(root_dir).rglob("*.html"):
-        rel_path = file_path.relative_to(root_dir)
-        html_files.append(str(rel_path))
+STATS_FILE = Path(__file__).parent / "site_stats.json"
+# pagine di dettaglio pre-generate (render_detail_pages.py): non sono pagine a sé
+GENERATED_PAGES_DIR = "regno/dettaglio/"
+
+
+def count_html_pages(root_dir, asset_index=None):
+    if asset_index is None:
+        asset_index = build_asset_index(root_dir)
+    return count_pages(f for f in iter_files(asset_index) if f.endswith(".html"))
+
+
+def count_pages(html_files):
+    """Pagine del sito tra i path .html indicati (senza navbar/footer né le
+    pagine pre-generate da render_detail_pages.py, e contando una volta sola
+    le due pagine di dettaglio del Regno)."""
     excluded = {"navbar.html", "footer.html"}
-    filtered_files = [f for f in html_files if Path(f).name not in excluded]
+    filtered_files = [f for f in html_files
+                      if Path(f).name not in excluded and not f.startswith(GENERATED_PAGES_DIR)]
     total_count = len(filtered_files)
     has_citta = any("cittaDettaglio.html" in f for f in filtered_files)
     has_ufficio = any("ufficioDettaglio.html" in f for f in filtered_files)
@@ -25,27 +50,71 @@ def count_html_pages(root_dir):
     return total_count
 
 
-def count_images(root_dir):
-    image_extensions = {".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".bmp", ".tiff", ".tif"}
-    image_count = 0
-    for file_path in Path(root_dir).rglob("*"):
-        if file_path.suffix.lower() in image_extensions:
-            image_count += 1
-    return image_count
+def count_images(root_dir, asset_index=None):
+    if asset_index is None:
+        asset_index = build_asset_index(root_dir)
+    return sum(1 for _ in iter_files(asset_index, IMAGE_EXTENSIONS))
+
+
+class ImageIndex(dict):
+    """dict basename minuscolo -> [path relativi], con i path di ogni nome
+    nell'ordine di iter_files (come li inserisce build_image_index).
+
+    Accanto al dict tiene l'elenco ordinato dei basename: with_prefix() trova
+    con bisect le chiavi che iniziano con un prefisso, invece di scorrere tutte
+    le chiavi. L'elenco si costruisce una volta ed è condiviso dai piani di
+    ricerca di tutte le sezioni (sections.ImageMatcher). Per --watch va
+    modificato solo con add() e discard(), che mantengono entrambi gli ordini.
+    """
+
+    def __init__(self, entries=()):
+        super().__init__(entries)
+        self._sorted = sorted(self)
+
+    def add(self, rel):
+        """Aggiunge un'immagine (path relativo); ritorna False se già presente."""
+        key = rel.rsplit("/", 1)[-1].lower()
+        paths = self.get(key)
+        if paths is None:
+            self[key] = [rel]
+            insort(self._sorted, key)
+        elif rel in paths:
+            return False
+        else:
+            orders = [path_order(p) for p in paths]
+            paths.insert(bisect_left(orders, path_order(rel)), rel)
+        return True
+
+    def discard(self, rel):
+        """Rimuove un'immagine; ritorna False se non era presente."""
+        key = rel.rsplit("/", 1)[-1].lower()
+        paths = self.get(key)
+        if not paths or rel not in paths:
+            return False
+        paths.remove(rel)
+        if not paths:
+            del self[key]
+            self._sorted.pop(bisect_left(self._sorted, key))
+        return True
 
+    def with_prefix(self, prefix):
+        """Chiavi che iniziano con `prefix`, in ordine alfabetico."""
+        return keys_with_prefix(self._sorted, prefix)
 
-def build_image_index(root_dir: Path):
-    """Scansiona il filesystem una sola volta e costruisce un indice delle immagini.
-    Ritorna un dict: basename -> list of relative paths (as Posix strings).
+
+def build_image_index(root_dir: Path, asset_index=None):
+    """Costruisce l'indice delle immagini prev_* a partire dall'indice dei file
+    (asset_index.py), senza visitare di nuovo il filesystem.
+    Ritorna un ImageIndex: basename -> list of relative paths (as Posix strings).
     """
-    image_extensions = {".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".bmp", ".tiff", ".tif"}
+    if asset_index is None:
+        asset_index = build_asset_index(root_dir)
     index = {}
-    for p in root_dir.rglob("prev_*"):
-        if p.suffix.lower() in image_extensions and p.is_file():
-            name = p.name.lower()
-            rel = str(p.relative_to(root_dir))
-            index.setdefault(name, []).append(rel)
-    return index
+    for rel in iter_files(asset_index, IMAGE_EXTENSIONS):
+        name = rel.rsplit("/", 1)[-1]
+        if name.startswith("prev_"):
+            index.setdefault(name.lower(), []).append(rel)
+    return ImageIndex(index)
 
 
 def exists_anywhere(root_dir: Path, filename: str) -> bool:
@@ -55,261 +124,629 @@ def exists_anywhere(root_dir: Path, filename: str) -> bool:
     return False
 
 
-def compute_section_stats(root_dir: Path, folder: str, json_filename: str, image_index: dict = None):
+def find_record_image(root_dir: Path, folder, item: dict, image_index: dict = None):
+    """Ritorna il path relativo (Posix) dell'immagine di un record, cercata
+    nelle cartelle immagini della sezione di `folder` secondo i suoi nomi in
+    sections.json, oppure None. Per molti record conviene section.matcher()
+    (vedi resolve_section), che prepara la ricerca una volta sola."""
+    if image_index is None:
+        image_index = build_image_index(root_dir)
+    return section_for(folder).matcher(image_index).find(item)
+
+
+def datario_filename(link):
+    """Immagine del datario mostrata da ufficioDettaglio.html (renderDatari):
+    il nome di linkDatario con _circle prima dell'estensione."""
+    m = re.match(r"^(.*)\.(jpeg|jpg|png)$", link, re.IGNORECASE)
+    return f"{m.group(1)}_circle.{m.group(2)}" if m else f"{link}_circle"
+
+
+# Riferimenti dei record ad altri file: campo -> (cartella relativa a quella
+# della sezione, nome del file dal valore del campo), come nelle pagine
+LINK_FIELDS = {
+    "linkTarghetta": ("targhetteTipo", lambda link: link),
+    "linkDatario": ("imgDatariRegno", datario_filename),
+}
+
+
+# Dimensioni del cubo di aggregazione (<json>.cube.json)
+CUBE_DIMS = ("Anno", "Località", "Denominazione ufficio", "Targhetta Tipo")
+
+
+def link_dirs(sections=SECTIONS):
+    """Cartelle (path relativi) a cui puntano i campi di LINK_FIELDS."""
+    return [f"{s.folder}/{d}" for s in sections for d, _ in LINK_FIELDS.values()]
+
+
+def build_link_index(root_dir: Path, asset_index=None, sections=SECTIONS):
+    """Set dei file (path relativi) delle cartelle di link_dirs, dall'indice
+    dei file: ogni riferimento dei record si risolve con una ricerca nel set."""
+    if asset_index is None:
+        asset_index = build_asset_index(root_dir)
+    return file_set(asset_index, link_dirs(sections))
+
+
+def iter_section(root_dir: Path, folder, json_filename: str):
+    """Record del JSON di una sezione, letti uno alla volta
+    (catalog_stream.py); None se il JSON non esiste."""
     json_path = root_dir / folder / json_filename
     if not json_path.exists():
-        return {"total_catalogati": 0, "images_present": 0, "images_pct": 0.0}
-    with open(json_path, "r", encoding="utf-8") as f:
-        try:
-            data = json.load(f)
-        except Exception:
-            data = []
-    total = len(data)
-    images_present = 0
-    for item in data:
-        uff = item.get("Targhetta Ufficio")
-        extra = item.get("extra", "")
-        if uff is None:
-            continue
-        extra_part = f"_{str(extra).strip()}" if extra and str(extra).strip() != "" else ""
-        filename = f"prev_{uff}{extra_part}.jpeg"
-        filename_l = filename.lower()
-        # usa l'indice se disponibile per evitare ripetute rglob()
-        found = False
-        if image_index is not None:
-            # ensure folder is a posix path string for prefix checks
-            folder_prefix = Path(folder).as_posix()
-            # Normal lookup by expected filename limited to this folder
-            entries = image_index.get(filename_l, [])
-            if folder_prefix == 'triestea':
-                # First try exact trieste filename: prev_trieste_{uff}{extra}.jpeg
-                fname_tri = f"prev_trieste_{uff}{extra_part}.jpeg".lower()
-                entries_tri = image_index.get(fname_tri, [])
-                if entries_tri:
-                    found = any(p.startswith(f"{folder_prefix}/") for p in entries_tri)
-                else:
-                    # Fallback: look for any image basename that starts with prev_trieste_{uff}
-                    prefix = f"prev_trieste_{uff}"
-                    if extra and str(extra).strip() != "":
-                        prefix = f"{prefix}_{str(extra).strip()}"
-                    prefix = prefix.lower()
-                    for k, paths in image_index.items():
-                        if k.startswith(prefix):
-                            if any(p.startswith(f"{folder_prefix}/") for p in paths):
-                                found = True
-                                break
-            elif Path(folder_prefix).name == 'libia':
-                # Libia: supporta nomi prev_libia_{uff} o prev_tripoli_{uff}, con fallback per prefisso
-                fname_libia = f"prev_libia_{uff}{extra_part}.jpeg".lower()
-                fname_trip = f"prev_tripoli_{uff}{extra_part}.jpeg".lower()
-                entries_lib = image_index.get(fname_libia, [])
-                entries_trip = image_index.get(fname_trip, [])
-                if entries_lib:
-                    found = any(p.startswith(f"{folder_prefix}/") for p in entries_lib)
-                elif entries_trip:
-                    found = any(p.startswith(f"{folder_prefix}/") for p in entries_trip)
-                else:
-                    # fallback: search any basename starting with prev_libia_{uff} or prev_tripoli_{uff}
-                    prefixes = [f"prev_libia_{uff}", f"prev_tripoli_{uff}"]
-                    if extra and str(extra).strip() != "":
-                        prefixes = [p + f"_{str(extra).strip()}" for p in prefixes]
-                    for k, paths in image_index.items():
-                        for pref in prefixes:
-                            if k.startswith(pref.lower()):
-                                if any(p.startswith(f"{folder_prefix}/") for p in paths):
-                                    found = True
-                                    break
-                        if found:
-                            break
-            else:
-                if entries:
-                    # ensure at least one entry resides under the target folder
-                    found = any(p.startswith(f"{folder_prefix}/") for p in entries)
-        else:
-            # fallback: ricerca filesystem (più lenta)
-            search_root = root_dir / folder
-            found = any(search_root.rglob(filename))
+        return None
+    return iter_records(json_path)
 
-        if found:
-            images_present += 1
-    pct = round((images_present / total) * 100, 1) if total > 0 else 0.0
-    return {"total_catalogati": total, "images_present": images_present, "images_pct": pct}
 
+def expected_filename(folder, item: dict) -> str:
+    """Nome dell'immagine atteso per un record secondo la convenzione della
+    sezione (lo stesso di CATALOG_CONFIG.getImgPath nelle pagine catalogo)."""
+    return section_for(folder).expected_name(item)
 
-def write_missing_images_report(root_dir: Path, out_csv: Path, image_index: dict = None):
-    """Scrive un CSV con le immagini attese dai JSON ma mancanti sul file system."""
-    rows = []
-    # Per ogni sezione JSON
-    for folder, json_file, section_name in [ ("regno", "targhetteRegno.json", "Regno"), ("triestea", "targhetteTriesteA.json", "Trieste A"), ("colonie/libia", "targhetteLibia.json", "Libia") ]:
-        p = root_dir / folder / json_file
-        if not p.exists():
-            continue
-        try:
-            with open(p, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        except Exception:
-            data = []
-
-        for item in data:
+
+def _cube_value(v):
+    """Valore di una dimensione del cubo come chiave di dict (liste -> tuple)."""
+    return tuple(v) if isinstance(v, list) else v
+
+
+def _empty_summary(name, folder, json_file, exists):
+    return {
+        "name": name, "folder": folder, "json": json_file, "exists": exists, "catalog": None,
+        "total": 0, "images_present": 0,
+        "record_images": {}, "tipo_groups": {}, "missing": [],
+        "localita": set(), "referenced": set(), "expected": set(),
+        "links": {}, "tipo_links": {}, "cube": {},
+    }
+
+
+def resolve_section(root_dir: Path, section, image_index: dict = None, records=None, link_index=None):
+    """Legge una sezione (sections.Section) in un solo passaggio e risolve
+    l'immagine e i riferimenti (LINK_FIELDS) di ogni record, tenendo solo ciò
+    che serve ai prodotti dello script: conteggi, immagine per chiave di
+    record (.images.json), gruppi per Targhetta Tipo con il loro
+    rappresentante (.tipo.json), righe delle immagini mancanti, località,
+    immagini usate, nomi attesi (con reserve_expected_names), riferimenti distinti con il loro
+    esito, pagine collegate per Targhetta Tipo e conteggi (record, con
+    immagine) per combinazione dei valori di CUBE_DIMS.
+    I record non restano in memoria; `records` (un iterabile) sostituisce la
+    lettura del JSON. `link_index` è il set di build_link_index; senza, ogni
+    riferimento distinto viene controllato una volta sul filesystem."""
+    name, folder, json_file = section.name, section.folder, section.json
+    catalog = None
+    if records is None:
+        records = iter_section(root_dir, folder, json_file)
+        if records is not None:
+            # versione del JSON letto, riportata nei file derivati (catalog_stream.catalog_version)
+            catalog = catalog_version(root_dir / folder / json_file)
+    summary = _empty_summary(name, folder, json_file, records is not None)
+    summary["catalog"] = catalog
+    if records is None:
+        return summary
+    if image_index is None:
+        image_index = build_image_index(root_dir)
+    # piano di ricerca delle immagini preparato una volta per sezione
+    matcher = section.matcher(image_index)
+    prefix = f"{folder}/"
+    links = summary["links"]
+    cube = summary["cube"]
+    try:
+        for item in records:
+            hit = matcher.find(item)
+            summary["total"] += 1
+            summary["record_images"][record_key(item)] = hit[len(prefix):] if hit else None
+
+            tipo = item.get("Targhetta Tipo")
+            g = summary["tipo_groups"].get(tipo)
+            if g is None:
+                g = summary["tipo_groups"][tipo] = {"Targhetta Tipo": tipo, "count": 0, "hasImage": False, "record": item}
+            g["count"] += 1
+            if not g["hasImage"] and hit is not None:
+                g["hasImage"] = True
+                g["record"] = item
+
+            cell = tuple(_cube_value(item.get(d)) for d in CUBE_DIMS)
+            c = cube.get(cell)
+            if c is None:
+                c = cube[cell] = [0, 0]
+            c[0] += 1
+            if hit is not None:
+                c[1] += 1
+
+            loc = item.get("Località")
+            if loc:
+                summary["localita"].add(loc)
             uff = item.get("Targhetta Ufficio")
-            extra = item.get("extra", "")
-            if uff is None:
-                continue
-            extra_part = f"_{str(extra).strip()}" if extra and str(extra).strip() != "" else ""
-            filename = f"prev_{uff}{extra_part}.jpeg"
-            filename_l = filename.lower()
-            # usa l'indice se disponibile per evitare ripetute rglob()
-            if image_index is not None:
-                folder_prefix = Path(folder).as_posix()
-                # Try exact expected filename first
-                entries = image_index.get(filename_l, [])
-                if folder_prefix == 'triestea':
-                    # supporta nomi del tipo prev_trieste_{uff}[_{extra}].jpeg
-                    fname_tri = f"prev_trieste_{uff}{extra_part}.jpeg".lower()
-                    entries_tri = image_index.get(fname_tri, [])
-                    if entries_tri:
-                        found = any(p.startswith(f"{folder_prefix}/") for p in entries_tri)
-                    else:
-                        # fallback: match per prefisso (prev_trieste_{uff}...)
-                        prefix = f"prev_trieste_{uff}"
-                        if extra and str(extra).strip() != "":
-                            prefix = f"{prefix}_{str(extra).strip()}"
-                        prefix = prefix.lower()
-                        for k, paths in image_index.items():
-                            if k.startswith(prefix):
-                                if any(p.startswith(f"{folder_prefix}/") for p in paths):
-                                    found = True
-                                    break
-                else:
-                    # ensure match is inside the target folder
-                    if entries:
-                        found = any(p.startswith(f"{folder_prefix}/") for p in entries)
-            else:
-                search_root = root_dir / folder if folder == 'triestea' else root_dir
-                found = any(search_root.rglob(filename))
-            if not found:
-                rows.append({
-                    'section': section_name,
-                    'expected_filename': filename,
+            if hit is not None:
+                summary["images_present"] += 1
+                summary["referenced"].add(hit)
+            elif uff is not None:
+                summary["missing"].append({
+                    'section': name,
+                    'expected_filename': section.expected_name(item),
                     'Targhetta Ufficio': uff,
-                    'extra': extra,
+                    'extra': item.get("extra", ""),
                     'Descrizione': item.get('Descrizione',''),
                     'Località': item.get('Località','')
                 })
+            if section.reserve_expected_names and uff is not None:
+                summary["expected"].add(section.expected_name(item).lower())
 
-    # Scrivi CSV
-    if rows:
-        with open(out_csv, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['section','expected_filename','Targhetta Ufficio','extra','Descrizione','Località']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            for r in rows:
-                writer.writerow(r)
-    else:
-        # crea file vuoto con header
-        with open(out_csv, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['section','expected_filename','Targhetta Ufficio','extra','Descrizione','Località']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-
-
-def write_unreferenced_regno_images(root_dir: Path, out_csv: Path, image_index: dict = None):
-    """Scrive un CSV con immagini presenti nel progetto che non sono referenziate da targhetteRegno.json."""
-    # raccogli nomi attesi da regno
-    expected = set()
-    p = root_dir / 'regno' / 'targhetteRegno.json'
-    if p.exists():
-        try:
-            with open(p, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        except Exception:
-            data = []
-        for item in data:
-            uff = item.get('Targhetta Ufficio')
-            extra = item.get('extra','')
-            if uff is None:
-                continue
-            extra_part = f"_{str(extra).strip()}" if extra and str(extra).strip() != "" else ""
-            filename = f"prev_{uff}{extra_part}.jpeg"
-            expected.add(filename.lower())
-
-    # trova file immagine prev_*.jpeg: preferisci l'indice se presente
-    found_images = []
-    if image_index is not None:
-        for basename, paths in image_index.items():
-            for rel in paths:
-                found_images.append(rel)
-    else:
-        for p in root_dir.rglob('prev_*.jpeg'):
-            found_images.append(str(p.relative_to(root_dir)))
-    # Filtra quelli non in expected (usa basename case-insensitive)
-    unreferenced = [fp for fp in found_images if Path(fp).name.lower() not in expected]
+            # riferimenti: un solo controllo per valore distinto
+            for field, (subdir, to_name) in LINK_FIELDS.items():
+                value = item.get(field)
+                value = value.strip() if isinstance(value, str) else ""
+                if not value:
+                    continue
+                ref = links.get((field, value))
+                if ref is None:
+                    target = f"{prefix}{subdir}/{to_name(value)}"
+                    exists = (target in link_index if link_index is not None
+                              else (root_dir / target).is_file())
+                    ref = links[(field, value)] = {"target": target, "exists": exists, "records": 0,
+                                                   "first": record_key(item)}
+                ref["records"] += 1
+            t = summary["tipo_links"].get(tipo)
+            if t is None:
+                t = summary["tipo_links"][tipo] = {"records": 0, "linked": 0, "pages": {}}
+            t["records"] += 1
+            page = item.get("linkTarghetta")
+            page = page.strip() if isinstance(page, str) else ""
+            if page:
+                t["linked"] += 1
+                t["pages"][page] = t["pages"].get(page, 0) + 1
+    except ValueError:
+        # JSON non valido: la sezione conta come vuota
+        return _empty_summary(name, folder, json_file, True)
+    return summary
 
-    # Scrivi CSV
-    with open(out_csv, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ['image_path','basename']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for fp in sorted(unreferenced):
-            writer.writerow({'image_path': fp, 'basename': Path(fp).name})
 
+# Indici (immagini, riferimenti) dei processi worker, ricevuti una sola volta all'avvio
+_worker_index = None
+_worker_links = None
 
-def main():
-    project_dir = Path(__file__).parent.parent.parent
-    total_pages = count_html_pages(project_dir)
-    total_images = count_images(project_dir)
-    # costruisci un indice delle immagini una sola volta
-    image_index = build_image_index(project_dir)
-
-    regno_stats = compute_section_stats(project_dir, "regno", "targhetteRegno.json", image_index=image_index)
-    trieste_stats = compute_section_stats(project_dir, "triestea", "targhetteTriesteA.json", image_index=image_index)
-    libia_stats = compute_section_stats(project_dir, Path("colonie") / "libia", "targhetteLibia.json", image_index=image_index) if True else compute_section_stats(project_dir, "colonie/libia", "targhetteLibia.json", image_index=image_index)
+
+def _init_worker(image_index, link_index=None):
+    global _worker_index, _worker_links
+    _worker_index = image_index
+    _worker_links = link_index
+
+
+def _resolve_in_worker(root_dir, section):
+    return resolve_section(root_dir, section, _worker_index, link_index=_worker_links)
+
+
+def resolve_sections(root_dir: Path, image_index: dict = None, sections=SECTIONS, jobs=1, link_index=None):
+    """Carica ogni sezione una sola volta e risolve l'immagine di ogni record.
+
+    Ritorna una lista di riepiloghi (vedi resolve_section) nell'ordine di
+    `sections`; "exists" è False se il JSON non esiste. Tutti i prodotti di
+    questo script (statistiche, report CSV, file .tipo/.images) derivano da
+    qui.
+
+    Con jobs > 1 le sezioni sono risolte in parallelo in processi separati, che
+    ricevono gli indici di immagini e riferimenti una volta sola (in sola
+    lettura); il risultato è identico all'esecuzione seriale.
+    """
+    jobs = min(jobs, len(sections))
+    if jobs <= 1:
+        return [resolve_section(root_dir, s, image_index, link_index=link_index) for s in sections]
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(image_index, link_index)) as pool:
+        return list(pool.map(_resolve_in_worker, [root_dir] * len(sections), sections))
+
+
+def section_stats(section: dict):
+    if not section["exists"]:
+        return {"total_catalogati": 0, "images_present": 0, "images_pct": 0.0}
+    total = section["total"]
+    images_present = section["images_present"]
+    pct = round((images_present / total) * 100, 1) if total > 0 else 0.0
+    return {"total_catalogati": total, "images_present": images_present, "images_pct": pct}
+
+
+def build_stats(resolved, total_pages, total_images):
+    """Contenuto di site_stats.json."""
     stats = {
         "total_pages": total_pages,
         "total_images": total_images,
-        "sections": {
-            "Regno": regno_stats,
-            "Trieste A": trieste_stats,
-            "Libia": libia_stats,
-        },
+        "sections": {s["name"]: section_stats(s) for s in resolved},
     }
     # Retrocompatibilità: totale targhette = somma delle sezioni
     total_targhette = 0
     for s in stats["sections"].values():
         total_targhette += s.get("total_catalogati", 0)
 
-    # Conta località uniche leggendo i JSON delle sezioni (se esistono)
+    # Località uniche tra tutte le sezioni
     localita_set = set()
-    for folder, json_file in [("regno", "targhetteRegno.json"), ("triestea", "targhetteTriesteA.json"), ("colonie/libia", "targhetteLibia.json")]:
-        p = project_dir / folder / json_file
-        if p.exists():
-            try:
-                with open(p, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                for item in data:
-                    loc = item.get("Località")
-                    if loc:
-                        localita_set.add(loc)
-            except Exception:
-                pass
+    for s in resolved:
+        localita_set |= s["localita"]
 
     stats["total_targhette"] = total_targhette
     stats["total_localita"] = len(localita_set)
-    output_file = Path(__file__).parent / "site_stats.json"
+    return stats
+
+
+def write_stats(stats, output_file: Path):
     with open(output_file, "w", encoding="utf-8") as f:
         json.dump(stats, f, indent=2, ensure_ascii=False)
+
+
+def compute_section_stats(root_dir: Path, folder: str, json_filename: str, image_index: dict = None):
+    section = section_for(folder)
+    records = iter_section(root_dir, section.folder, json_filename)
+    if records is None:
+        return section_stats({"exists": False})
+    return section_stats(resolve_section(root_dir, section, image_index, records=records))
+
+
+def record_key(item: dict) -> str:
+    """Chiave Tipo/Ufficio/extra di un record (la stessa usata da catalog.js)."""
+    extra = item.get("extra", "")
+    return f"{item.get('Targhetta Tipo')}/{item.get('Targhetta Ufficio')}/{str(extra or '').strip()}"
+
+
+def write_record_images(root_dir: Path, section: dict):
+    """Scrive <json>.images.json accanto al JSON della sezione,
+    {"catalog": versione, "images": {...}}: per ogni record (chiave
+    Tipo/Ufficio/extra) il path dell'immagine relativo alla cartella della
+    sezione, oppure null se manca. catalog.js lo usa al posto di
+    CATALOG_CONFIG.getImgPath, senza richieste a vuoto per le immagini assenti.
+    """
+    if not section["exists"]:
+        return None
+    images = {"catalog": section["catalog"], "images": section["record_images"]}
+    out_path = root_dir / section["folder"] / section["json"].replace(".json", ".images.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(images, f, ensure_ascii=False, separators=(",", ":"))
+    return out_path
+
+
+def tipo_key(t):
+    """Ordine delle Targhetta Tipo: prima i numeri, poi il resto come testo."""
+    return (0, t, "") if isinstance(t, (int, float)) else (1, 0, str(t))
+
+
+def write_tipo_representatives(root_dir: Path, section: dict):
+    """Scrive <json>.tipo.json accanto al JSON della sezione,
+    {"catalog": versione, "tipi": [...]}: per ogni Targhetta Tipo (in ordine
+    numerico) il primo record con immagine presente, oppure il primo record del
+    gruppo se nessuno ha immagine, e il numero di targhette. Serve alla vista
+    "Ornaghi Tipo" di catalog.js per non sondare le immagini.
+    """
+    if not section["exists"]:
+        return None
+    gruppi = section["tipo_groups"]
+    out = {"catalog": section["catalog"], "tipi": [gruppi[t] for t in sorted(gruppi, key=tipo_key)]}
+    out_path = root_dir / section["folder"] / section["json"].replace(".json", ".tipo.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(out, f, ensure_ascii=False, separators=(",", ":"))
+    return out_path
+
+
+def _cube_order(v):
+    """Ordine dei valori del cubo: null, numeri, testo, liste."""
+    if v is None:
+        return (0, 0, "")
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return (1, v, "")
+    if isinstance(v, tuple):
+        return (3, 0, json.dumps(v, ensure_ascii=False))
+    return (2, 0, str(v))
+
+
+def build_cube(section: dict):
+    """Cubo di aggregazione di una sezione (contenuto di <json>.cube.json).
+
+      {
+        "format": "cube-v1",
+        "catalog": "<versione>",                      versione del JSON della sezione
+        "dims":   ["Anno", "Località", ...],          CUBE_DIMS
+        "values": {"<dim>": [v0, v1, ...]},            valori distinti, in ordine
+        "cells":  {"<dim>": [codici], "count": [...], "images": [...]}
+                  una colonna per dimensione (valore della cella = values[dim][codice])
+                  più record e record con immagine di ogni cella non vuota
+        "totals": {"<dim>": {"count": [...], "images": [...]}}
+                  somme per valore di ogni dimensione (una per elemento di values)
+        "count": N, "images": M                        totali della sezione
+      }
+
+    Le celle sono ordinate per codici; un valore assente è null, un valore
+    lista resta una lista.
+    """
+    cells = section["cube"]
+    values = {}
+    codes = {}
+    for i, dim in enumerate(CUBE_DIMS):
+        distinct = sorted({cell[i] for cell in cells}, key=_cube_order)
+        values[dim] = [list(v) if isinstance(v, tuple) else v for v in distinct]
+        codes[dim] = {v: k for k, v in enumerate(distinct)}
+    keys = sorted(cells, key=lambda cell: [codes[d][cell[i]] for i, d in enumerate(CUBE_DIMS)])
+    out_cells = {d: [codes[d][cell[i]] for cell in keys] for i, d in enumerate(CUBE_DIMS)}
+    out_cells["count"] = [cells[cell][0] for cell in keys]
+    out_cells["images"] = [cells[cell][1] for cell in keys]
+    totals = {}
+    for i, dim in enumerate(CUBE_DIMS):
+        count = [0] * len(values[dim])
+        images = [0] * len(values[dim])
+        for cell in keys:
+            k = codes[dim][cell[i]]
+            count[k] += cells[cell][0]
+            images[k] += cells[cell][1]
+        totals[dim] = {"count": count, "images": images}
+    return {
+        "format": "cube-v1", "catalog": section["catalog"],
+        "dims": list(CUBE_DIMS), "values": values, "cells": out_cells, "totals": totals,
+        "count": section["total"], "images": section["images_present"],
+    }
+
+
+def write_cube(root_dir: Path, section: dict):
+    """Scrive <json>.cube.json accanto al JSON della sezione (vedi
+    build_cube): grafico per anno e coperture immagini senza scorrere i record."""
+    if not section["exists"]:
+        return None
+    out_path = root_dir / section["folder"] / section["json"].replace(".json", ".cube.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(build_cube(section), f, ensure_ascii=False, separators=(",", ":"))
+    return out_path
+
+
+def write_missing_images_report(resolved, out_csv: Path):
+    """Scrive un CSV con le immagini attese dai JSON ma mancanti sul file system."""
+    rows = [r for section in resolved for r in section["missing"]]
+
+    with open(out_csv, 'w', newline='', encoding='utf-8') as csvfile:
+        fieldnames = ['section','expected_filename','Targhetta Ufficio','extra','Descrizione','Località']
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+        for r in rows:
+            writer.writerow(r)
+
+
+def write_unreferenced_regno_images(resolved, out_csv: Path, image_index: dict):
+    """Scrive un CSV con le immagini prev_* del progetto non usate da nessun
+    record: né risolte per una sezione, né col nome atteso da targhetteRegno.json."""
+    referenced = set().union(*(section["referenced"] for section in resolved))
+    expected = set().union(*(section["expected"] for section in resolved))
+
+    unreferenced = [rel for basename, paths in image_index.items() if basename not in expected
+                    for rel in paths if rel not in referenced]
+
+    with open(out_csv, 'w', newline='', encoding='utf-8') as csvfile:
+        fieldnames = ['image_path','basename']
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+        for fp in sorted(unreferenced):
+            writer.writerow({'image_path': fp, 'basename': Path(fp).name})
+
+
+def write_dangling_references_report(resolved, out_csv: Path):
+    """Scrive un CSV con i riferimenti dei record (LINK_FIELDS) a file che non
+    esistono: una riga per valore distinto, con il numero di record che lo
+    usano e la chiave del primo. Ritorna (riferimenti distinti, mancanti)."""
+    rows = []
+    total = 0
+    for section in resolved:
+        total += len(section["links"])
+        for (field, value), ref in sorted(section["links"].items()):
+            if not ref["exists"]:
+                rows.append([section["name"], field, value, ref["target"], ref["records"], ref["first"]])
+    with open(out_csv, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['section', 'field', 'link', 'expected_path', 'records', 'first_record'])
+        writer.writerows(rows)
+    return total, len(rows)
+
+
+def write_tipo_page_coverage(resolved, out_csv: Path):
+    """Scrive un CSV con la copertura delle pagine di Targhetta Tipo
+    (linkTarghetta): per ogni tipo quanti record hanno la pagina, quali pagine
+    e quante di queste mancano."""
+    with open(out_csv, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['section', 'Targhetta Tipo', 'records', 'with_page', 'page_pct', 'pages', 'missing_pages'])
+        for section in resolved:
+            tipi = section["tipo_links"]
+            for tipo in sorted(tipi, key=tipo_key):
+                t = tipi[tipo]
+                pages = sorted(t["pages"])
+                missing = [p for p in pages if not section["links"][("linkTarghetta", p)]["exists"]]
+                writer.writerow([section["name"], tipo, t["records"], t["linked"],
+                                 round(t["linked"] / t["records"] * 100, 1), ";".join(pages), ";".join(missing)])
+
+
+class LiveStats:
+    """Stato in memoria per --watch: file HTML e immagini contati, indice
+    immagini e dei riferimenti, sezioni risolte. apply() aggiorna solo ciò
+    che le modifiche toccano: un'immagine prev_* o un file puntato dai
+    riferimenti (datari, pagine dei tipi) cambia il relativo indice (in
+    memoria, senza visitare il filesystem) e fa risolvere di nuovo le sole
+    sezioni della sua cartella, il cui JSON viene riletto in streaming; lo
+    stesso per un JSON di sezione cambiato."""
+
+    def __init__(self, root_dir: Path, jobs=1):
+        self.root = root_dir
+        self.jobs = jobs
+        self.sync()
+
+    def sync(self):
+        """Riallineamento completo: all'avvio o dopo un evento resync."""
+        asset_index = build_asset_index(self.root)
+        self.html = {f for f in iter_files(asset_index) if f.endswith(".html")}
+        self.images = set(iter_files(asset_index, IMAGE_EXTENSIONS))
+        self.image_index = build_image_index(self.root, asset_index=asset_index)
+        self.link_dirs = set(link_dirs())
+        self.link_index = build_link_index(self.root, asset_index=asset_index)
+        self.resolved = resolve_sections(self.root, self.image_index, jobs=self.jobs, link_index=self.link_index)
+        self.write(range(len(self.resolved)))
+
+    def apply(self, changes):
+        """Applica un dict path -> tipo (vedi file_watcher.py). Ritorna i nomi
+        delle sezioni aggiornate, oppure None se nessun prodotto cambia."""
+        if "resync" in changes.values():
+            self.sync()
+            return [s["name"] for s in self.resolved]
+        dirty = set()
+        counted = reports = False
+        for rel, kind in changes.items():
+            exists = kind != "deleted"
+            json_changed = [i for i, s in enumerate(self.resolved) if rel == f"{s['folder']}/{s['json']}"]
+            dirty.update(json_changed)
+            reports |= bool(json_changed)
+            if rel.rpartition("/")[0] in self.link_dirs and _update_set(self.link_index, rel, exists):
+                reports = True
+                dirty.update(i for i, s in enumerate(self.resolved) if rel.startswith(f"{s['folder']}/"))
+            ext = os.path.splitext(rel)[1].lower()
+            if ext == ".html":
+                counted |= _update_set(self.html, rel, exists)
+            if ext not in IMAGE_EXTENSIONS or not _update_set(self.images, rel, exists):
+                continue
+            counted = True
+            if rel.rsplit("/", 1)[-1].startswith("prev_"):
+                if exists:
+                    self.image_index.add(rel)
+                else:
+                    self.image_index.discard(rel)
+                reports = True
+                dirty.update(i for i, s in enumerate(SECTIONS)
+                             if rel.startswith(tuple(f"{d}/" for d in s.image_dirs)))
+        if not (dirty or counted):
+            return None
+        for i in dirty:
+            self.resolved[i] = resolve_section(self.root, SECTIONS[i], self.image_index, link_index=self.link_index)
+        self.write(dirty, reports=reports)
+        return [self.resolved[i]["name"] for i in sorted(dirty)]
+
+    def write(self, sections, reports=True):
+        """Scrive site_stats.json, i report CSV (se `reports`) e i file
+        .tipo/.images/.cube delle sezioni indicate (indici in self.resolved)."""
+        self.stats = build_stats(self.resolved, count_pages(self.html), len(self.images))
+        write_stats(self.stats, STATS_FILE)
+        if reports:
+            write_missing_images_report(self.resolved, self.root / "missing_images.csv")
+            write_unreferenced_regno_images(self.resolved, self.root / "unreferenced_regno_images.csv", self.image_index)
+            write_dangling_references_report(self.resolved, self.root / "dangling_references.csv")
+            write_tipo_page_coverage(self.resolved, self.root / "tipo_page_coverage.csv")
+        for i in sections:
+            write_tipo_representatives(self.root, self.resolved[i])
+            write_record_images(self.root, self.resolved[i])
+            write_cube(self.root, self.resolved[i])
+
+
+def _update_set(items, rel, exists):
+    if exists == (rel in items):
+        return False
+    if exists:
+        items.add(rel)
+    else:
+        items.discard(rel)
+    return True
+
+
+def watch(project_dir: Path, jobs=1, polling=False, debounce=0.2, interval=1.0):
+    """Aggiorna statistiche e report a ogni modifica di immagini, pagine o
+    JSON delle sezioni, finché non viene interrotto (Ctrl+C)."""
+    t0 = time.perf_counter()
+    # il watcher parte prima della lettura iniziale: nessuna modifica va persa
+    json_files = [s.json_path for s in SECTIONS]
+    image_dirs = [d for s in SECTIONS for d in s.image_dirs]
+    watcher = open_watcher(project_dir, files=json_files, dirs=image_dirs, polling=polling, interval=interval)
+    live = LiveStats(project_dir, jobs=jobs)
+    print(f"✓ Statistiche e report aggiornati ({(time.perf_counter() - t0) * 1000:.0f} ms); "
+          f"in ascolto ({watcher.kind}), Ctrl+C per terminare")
+    try:
+        for changes, first in batches(watcher, debounce):
+            t1 = time.perf_counter()
+            updated = live.apply(changes)
+            if updated is None:
+                continue
+            done = time.perf_counter()
+            sections = live.stats["sections"]
+            summary = ", ".join(f"{name} {sections[name]['images_present']}/{sections[name]['total_catalogati']} "
+                                f"({sections[name]['images_pct']}%)" for name in updated)
+            print(f"✓ {time.strftime('%H:%M:%S')} {len(changes)} modifiche: "
+                  f"{summary or 'pagine ' + str(live.stats['total_pages'])}, immagini {live.stats['total_images']} "
+                  f"[aggiornamento {(done - t1) * 1000:.0f} ms, {(time.monotonic() - first) * 1000:.0f} ms dal primo evento]")
+    except KeyboardInterrupt:
+        print("ℹ Watch terminato")
+    finally:
+        watcher.close()
+    return 0
+
+
+def main():
+    p = argparse.ArgumentParser(description="Statistiche del sito e report sulle immagini del catalogo")
+    p.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                   help="Sezioni elaborate in parallelo (default: numero di CPU; 1 = seriale)")
+    p.add_argument("--watch", action="store_true",
+                   help="Resta in ascolto e aggiorna statistiche e report a ogni modifica")
+    p.add_argument("--polling", action="store_true",
+                   help="Con --watch: usa il polling anche se inotify è disponibile (controlla ogni secondo "
+                        "i JSON delle sezioni e i file delle cartelle immagini, per le riscritture sul posto)")
+    p.add_argument("--debounce", type=float, default=0.2,
+                   help="Con --watch: secondi senza nuovi eventi prima di aggiornare (default: 0.2)")
+    add_profile_argument(p)
+    args = p.parse_args()
+
+    if args.watch:
+        return watch(Path(__file__).resolve().parent.parent.parent, jobs=args.jobs,
+                     polling=args.polling, debounce=args.debounce)
+    profiler = Profiler("site_stats", enabled=args.profile)
+
+    project_dir = Path(__file__).parent.parent.parent
+    # una sola visita del filesystem (incrementale grazie alla cache su disco)
+    with profiler.phase("asset_index") as ph:
+        asset_index = build_asset_index(project_dir)
+        ph["files"] = sum(len(d["files"]) for d in asset_index["dirs"].values())
+        ph["dirs_rescanned"] = asset_index["rescanned"]
+    with profiler.phase("html_pages") as ph:
+        total_pages = ph["files"] = count_html_pages(project_dir, asset_index=asset_index)
+    with profiler.phase("image_count") as ph:
+        total_images = ph["files"] = count_images(project_dir, asset_index=asset_index)
+    with profiler.phase("image_index") as ph:
+        image_index = build_image_index(project_dir, asset_index=asset_index)
+        ph["files"] = sum(len(paths) for paths in image_index.values())
+    with profiler.phase("link_index") as ph:
+        link_index = build_link_index(project_dir, asset_index=asset_index)
+        ph["files"] = len(link_index)
+
+    # ogni sezione viene letta e confrontata con l'indice immagini una sola volta
+    with profiler.phase("resolve_sections") as ph:
+        resolved = resolve_sections(project_dir, image_index, jobs=args.jobs, link_index=link_index)
+        ph["files"] = sum(1 for s in resolved if s["exists"])
+        ph["records"] = sum(s["total"] for s in resolved)
+    stats = build_stats(resolved, total_pages, total_images)
+    with profiler.phase("write_stats"):
+        write_stats(stats, STATS_FILE)
     print("✓ Conteggio completato!")
     print(f"✓ Pagine totali: {stats['total_pages']}")
     print(f"✓ Immagini totali: {stats['total_images']}")
     print("✓ Sezioni:")
     for name, s in stats["sections"].items():
         print(f"  - {name}: catalogati={s['total_catalogati']}, immagini={s['images_present']}, {s['images_pct']}%")
-    # Genera report CSV per immagini mancanti e non referenziate (Regno)
+    # Genera report CSV per immagini mancanti e non referenziate
     missing_csv = project_dir / 'missing_images.csv'
     unref_csv = project_dir / 'unreferenced_regno_images.csv'
-    write_missing_images_report(project_dir, missing_csv, image_index=image_index)
-    write_unreferenced_regno_images(project_dir, unref_csv, image_index=image_index)
-    print(f"✓ Report creati: {missing_csv.name}, {unref_csv.name}")
+    dangling_csv = project_dir / 'dangling_references.csv'
+    coverage_csv = project_dir / 'tipo_page_coverage.csv'
+    with profiler.phase("write_reports"):
+        write_missing_images_report(resolved, missing_csv)
+        write_unreferenced_regno_images(resolved, unref_csv, image_index)
+        n_links, n_dangling = write_dangling_references_report(resolved, dangling_csv)
+        write_tipo_page_coverage(resolved, coverage_csv)
+    print(f"✓ Report creati: {missing_csv.name}, {unref_csv.name}, {dangling_csv.name}, {coverage_csv.name}")
+    print(f"✓ Riferimenti (linkTarghetta, linkDatario): {n_links} distinti, {n_dangling} a file mancanti")
+    # Rappresentante per Targhetta Tipo (vista "Ornaghi Tipo" del catalogo)
+    # immagine risolta per ogni record e cubo di aggregazione
+    with profiler.phase("write_sidecars"):
+        for section in resolved:
+            out = write_tipo_representatives(project_dir, section)
+            if out is not None:
+                print(f"✓ Rappresentanti per tipo: {out.relative_to(project_dir).as_posix()}")
+            out = write_record_images(project_dir, section)
+            if out is not None:
+                print(f"✓ Immagini per record: {out.relative_to(project_dir).as_posix()}")
+            out = write_cube(project_dir, section)
+            if out is not None:
+                print(f"✓ Cubo di aggregazione: {out.relative_to(project_dir).as_posix()}")
+    profiler.finish()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,62 @@
+/**
+ * sw.js — Service worker delle pagine catalogo (registrato da catalog.js).
+ *
+ * All'installazione scarica la lista di precache (precache-manifest.json,
+ * scritta da fingerprint_assets.py: copie con hash di JS/CSS e ultime patch
+ * dei JSON delle sezioni) e mette in cache i file elencati. Il nome della
+ * lista qui sotto viene riscritto con il suo hash a ogni deploy: se la lista
+ * cambia cambia anche questo file e il browser installa il nuovo service
+ * worker, che rimuove le cache delle versioni precedenti.
+ *
+ * Solo i file immutabili (nomi con hash, patch in delta/) passano dalla
+ * cache; tutte le altre richieste, compresi i manifest delle versioni, vanno
+ * in rete come senza service worker.
+ */
+
+const PRECACHE = "/precache-manifest.json";
+const CACHE = "precache-" + PRECACHE;
+const IMMUTABILE = /\.[0-9a-f]{10}\.[a-z]+$|\/delta\/[^/]+\.[0-9a-f]{10}-[0-9a-f]{10}\.json$/;
+
+self.addEventListener("install", (event) => {
+  event.waitUntil(
+    fetch(PRECACHE)
+      .then((res) => {
+        if (!res.ok) throw new Error(res.status);
+        return res.json();
+      })
+      .then((lista) => caches.open(CACHE).then((cache) => cache.addAll(lista.urls)))
+      .then(() => self.skipWaiting()),
+  );
+});
+
+self.addEventListener("activate", (event) => {
+  event.waitUntil(
+    caches
+      .keys()
+      .then((nomi) =>
+        Promise.all(
+          nomi.filter((n) => n.startsWith("precache-") && n !== CACHE).map((n) => caches.delete(n)),
+        ),
+      )
+      .then(() => self.clients.claim()),
+  );
+});
+
+self.addEventListener("fetch", (event) => {
+  const req = event.request;
+  const url = new URL(req.url);
+  if (req.method !== "GET" || url.origin !== self.location.origin || !IMMUTABILE.test(url.pathname)) return;
+  event.respondWith(
+    caches.match(req).then(
+      (hit) =>
+        hit ||
+        fetch(req).then((res) => {
+          if (res.ok) {
+            const copia = res.clone();
+            caches.open(CACHE).then((cache) => cache.put(req, copia));
+          }
+          return res;
+        }),
+    ),
+  );
+});